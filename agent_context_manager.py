@@ -168,6 +168,14 @@ class AgentContextManager:
             limit=100
         )
         
+        return self._merge_context(agent_id, agent_memories, shared_contexts, context_keys)
+    
+    @staticmethod
+    def _merge_context(agent_id: str,
+                       agent_memories: List[Dict[str, Any]],
+                       shared_contexts: List[Dict[str, Any]],
+                       context_keys: List[str]) -> Dict[str, Any]:
+        """Merge shared context and the agent's own memories, restricted to context_keys"""
         # Merge contexts with priority to most recent data
         merged_context = {}
         
@@ -193,6 +201,36 @@ class AgentContextManager:
             "shared_context_count": len(shared_contexts)
         }
     
+    async def get_context_snapshot(self,
+                                   company_id: str,
+                                   agent_keys: Dict[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get synchronized context for several agents of a company in one batched fetch
+        
+        Args:
+            company_id: Company identifier
+            agent_keys: Agent identifier -> context keys that agent's consumers need
+            
+        Returns:
+            Agent identifier -> same structure as get_synchronized_context
+        """
+        batch = await self.memory_manager.get_context_batch(
+            company_id=company_id,
+            agent_ids=list(agent_keys),
+            memory_limit=50,
+            shared_limit=100
+        )
+        
+        return {
+            agent_id: self._merge_context(
+                agent_id,
+                batch.get(agent_id, {}).get("memories", []),
+                batch.get(agent_id, {}).get("shared", []),
+                context_keys if context_keys is not None else self.shared_context_keys
+            )
+            for agent_id, context_keys in agent_keys.items()
+        }
+    
     async def push_context_update(self,
                                  from_agent_id: str,
                                  to_agent_ids: List[str],
@@ -5,6 +5,7 @@ Provides persistent memory for AI marketing agents without Redis dependency
 
 import os
 import json
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional
 from datetime import datetime
@@ -28,6 +29,7 @@ class AgentMemoryManager:
         self.memory_table = os.getenv("MCP_MEMORY_TABLE", "agent_memories")
         self.context_table = os.getenv("MCP_CONTEXT_TABLE", "cross_agent_context")
         self.max_memories = int(os.getenv("MCP_MAX_MEMORIES_PER_AGENT", "50"))
+        self.batch_supported = os.getenv("MCP_BATCH_CONTEXT", "true").lower() == "true"
     
     async def store_memory(self, agent_id: str, company_id: str, memory_data: Dict[str, Any]) -> Dict[str, Any]:
         """Store agent memory in Supabase via MCP"""
@@ -128,6 +130,65 @@ class AgentMemoryManager:
             logger.error(f"Failed to retrieve shared context: {str(e)}")
             return []
     
+    async def get_context_batch(self,
+                                company_id: str,
+                                agent_ids: List[str],
+                                memory_limit: int = 50,
+                                shared_limit: int = 100) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+        """
+        Fetch memories and shared context for several agents of a company at once
+        
+        Uses one MCP batch request; if the MCP server has no batch endpoint (404/405), falls
+        back to fetching every agent concurrently from then on. Other failures fall back for
+        this call only.
+        
+        Returns:
+            agent_id -> {"memories": [...], "shared": [...]}
+        """
+        if not self.enabled:
+            logger.info("MCP memory management disabled")
+            return {agent_id: {"memories": [], "shared": []} for agent_id in agent_ids}
+        
+        if self.batch_supported:
+            queries = []
+            for agent_id in agent_ids:
+                queries.append({"kind": "memories", "agent_id": agent_id,
+                                "company_id": company_id, "limit": memory_limit})
+                queries.append({"kind": "shared", "agent_id": agent_id, "limit": shared_limit})
+            
+            response = await self.mcp.batch_retrieve_contexts(queries)
+            results = response.get("results")
+            if isinstance(results, list) and len(results) == len(queries):
+                return {
+                    agent_id: {
+                        "memories": (results[2 * i] or {}).get("contexts", []),
+                        "shared": (results[2 * i + 1] or {}).get("contexts", [])
+                    }
+                    for i, agent_id in enumerate(agent_ids)
+                }
+            if response.get("status") == "disabled":
+                return {agent_id: {"memories": [], "shared": []} for agent_id in agent_ids}
+            if response.get("status") == "error" and response.get("http_status") in (404, 405):
+                # Not available on this MCP server; stop trying for this process
+                logger.warning("MCP batch context endpoint unavailable, fetching agents concurrently")
+                self.batch_supported = False
+            elif response.get("status") == "error":
+                # Timeout, 5xx or connection reset: fetch per agent this time only
+                logger.warning(f"MCP batch context request failed ({response.get('message')}), "
+                               f"fetching agents concurrently")
+        
+        fetched = await asyncio.gather(*(
+            asyncio.gather(
+                self.get_memories(agent_id, company_id, limit=memory_limit),
+                self.get_shared_context(agent_id, limit=shared_limit)
+            )
+            for agent_id in agent_ids
+        ))
+        return {
+            agent_id: {"memories": memories, "shared": shared}
+            for agent_id, (memories, shared) in zip(agent_ids, fetched)
+        }
+    
     async def trim_old_memories(self, agent_id: str, company_id: str) -> None:
         """Ensure we don't exceed maximum memories per agent"""
         try:
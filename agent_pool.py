@@ -0,0 +1,141 @@
+"""
+Agent Pool for Morvo AI Marketing Platform
+Keeps warm CrewAI agents per (agent type, model) so requests stop rebuilding LLM clients and tools
+"""
+
+from typing import Dict, List, Any, Callable, Optional, Tuple
+from contextlib import contextmanager
+import logging
+import os
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Per-run state CrewAI attaches to an agent while it executes a crew
+_RUN_STATE_DEFAULTS = {
+    "crew": None,
+    "tools_results": [],
+    "_times_executed": 0,
+}
+
+# Per-run state of the agent executor (conversation so far, bound task and crew)
+_EXECUTOR_STATE_DEFAULTS = {
+    "messages": [],
+    "iterations": 0,
+    "task": None,
+    "crew": None,
+    "have_forced_answer": False,
+}
+
+def _reset_attributes(target: Any, defaults: Dict[str, Any]) -> None:
+    for attribute, default in defaults.items():
+        if hasattr(target, attribute):
+            try:
+                setattr(target, attribute, list(default) if isinstance(default, list) else default)
+            except Exception as e:
+                logger.debug(f"Could not reset {attribute} on pooled agent: {e}")
+
+def reset_agent(agent: Any) -> None:
+    """
+    Clear per-run state so a pooled agent does not leak context between requests
+
+    The agent executor is rebuilt, which drops its messages and the task it was bound to;
+    if the installed CrewAI cannot rebuild it without a task, its per-run fields are cleared.
+    """
+    _reset_attributes(agent, _RUN_STATE_DEFAULTS)
+    if getattr(agent, "agent_executor", None) is None:
+        return
+    try:
+        agent.create_agent_executor()
+    except Exception as e:
+        logger.debug(f"Could not rebuild the executor of a pooled agent, clearing it instead: {e}")
+        _reset_attributes(agent.agent_executor, _EXECUTOR_STATE_DEFAULTS)
+
+class AgentPool:
+    """
+    Pool of pre-built agents keyed by (agent type, model)
+    Agents are built lazily per key, checked out exclusively and reset on return
+    """
+
+    def __init__(self,
+                 builder: Callable[[str, str], Any],
+                 max_idle_per_key: Optional[int] = None,
+                 reset: Callable[[Any], None] = reset_agent):
+        """
+        Initialize the pool
+
+        Args:
+            builder: Function that builds a new agent for (agent_type, model)
+            max_idle_per_key: How many idle agents to keep per key
+            reset: Function that clears per-run state before an agent is reused
+        """
+        self.builder = builder
+        self.max_idle_per_key = max_idle_per_key or int(os.getenv("AGENT_POOL_MAX_IDLE", "4"))
+        self.reset = reset
+        self._idle: Dict[Tuple[str, str], List[Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "in_use": 0, "discarded": 0}
+
+    def acquire(self, agent_type: str, model: str) -> Any:
+        """Take an idle agent for the key or build a new one"""
+        key = (agent_type, model)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.stats["reused"] += 1
+                self.stats["in_use"] += 1
+                return idle.pop()
+
+        # Build outside the lock; construction can be slow
+        agent = self.builder(agent_type, model)
+        with self._lock:
+            self.stats["created"] += 1
+            self.stats["in_use"] += 1
+        return agent
+
+    def release(self, agent_type: str, model: str, agent: Any, healthy: bool = True) -> None:
+        """Reset an agent and return it to the pool"""
+        key = (agent_type, model)
+        if healthy:
+            try:
+                self.reset(agent)
+            except Exception as e:
+                logger.warning(f"Dropping pooled agent {agent_type}: reset failed ({e})")
+                healthy = False
+
+        with self._lock:
+            self.stats["in_use"] -= 1
+            idle = self._idle.setdefault(key, [])
+            if healthy and len(idle) < self.max_idle_per_key:
+                idle.append(agent)
+            else:
+                self.stats["discarded"] += 1
+
+    @contextmanager
+    def checkout(self, agent_type: str, model: str):
+        """Context manager that lends an agent for the duration of one run"""
+        agent = self.acquire(agent_type, model)
+        healthy = True
+        try:
+            yield agent
+        except BaseException:
+            # An agent that failed mid-run may hold half-written state
+            healthy = False
+            raise
+        finally:
+            self.release(agent_type, model, agent, healthy=healthy)
+
+    def warm(self, agent_types: List[str], model: str) -> None:
+        """Pre-build one agent per type, e.g. at startup"""
+        for agent_type in agent_types:
+            agent = self.acquire(agent_type, model)
+            self.release(agent_type, model, agent)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return pool counters and idle agents per key"""
+        with self._lock:
+            return {
+                **self.stats,
+                "idle": {f"{t}:{m}": len(agents) for (t, m), agents in self._idle.items()}
+            }
@@ -0,0 +1,204 @@
+"""
+Alert Fingerprints for Morvo AI Marketing Platform
+Deduplicates repeated alerts by (type, company, key entity) with suppression windows and escalation
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Decisions returned by FingerprintIndex.admit
+NEW = "new"              # never seen (or its window and record are gone)
+REPEAT = "repeat"        # seen before, window over
+ESCALATED = "escalated"  # inside the window but higher priority or clearly larger magnitude
+SUPPRESSED = "suppressed"
+
+def fingerprint(alert_type: str, company_id: str, entity: Any = "") -> int:
+    """64-bit fingerprint of an alert's identity (signed, so it fits an SQLite INTEGER)"""
+    digest = hashlib.blake2b(f"{alert_type}\x1f{company_id}\x1f{entity}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+class FingerprintIndex:
+    """
+    Which alerts were sent recently, keyed by fingerprint
+    Hot fingerprints live in a bounded LRU; every emitted alert is written through to SQLite,
+    suppressed repeats cost no write at all.
+    """
+
+    def __init__(self,
+                 db_path: Optional[str] = None,
+                 cache_size: Optional[int] = None,
+                 escalation_ratio: Optional[float] = None,
+                 retention_seconds: float = 7 * 86400):
+        """
+        Initialize the index
+
+        Args:
+            db_path: SQLite file (shared with the alert store by default)
+            cache_size: Fingerprints kept in memory
+            escalation_ratio: Relative growth of the magnitude that breaks through a suppression window
+            retention_seconds: How long records are kept after their window ends
+        """
+        self.db_path = db_path or os.getenv("ALERTS_DB", "alerts.db")
+        self.cache_size = cache_size or int(os.getenv("ALERT_FINGERPRINT_CACHE", "50000"))
+        self.escalation_ratio = escalation_ratio or float(os.getenv("ALERT_ESCALATION_RATIO", "0.5"))
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # fingerprint -> (suppress_until, priority, magnitude, sent_count)
+        self._cache: "OrderedDict[int, Tuple[float, int, float, int]]" = OrderedDict()
+        self._writes = 0
+        self.stats = {NEW: 0, REPEAT: 0, ESCALATED: 0, SUPPRESSED: 0}
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS alert_fingerprints (
+                fingerprint INTEGER PRIMARY KEY,
+                suppress_until REAL NOT NULL,
+                priority INTEGER NOT NULL,
+                magnitude REAL NOT NULL,
+                sent_count INTEGER NOT NULL
+            )
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get a connection for the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _lookup(self, key: int) -> Optional[Tuple[float, int, float, int]]:
+        """Record of a fingerprint from the LRU, else SQLite"""
+        record = self._cache.get(key)
+        if record is not None:
+            self._cache.move_to_end(key)
+            return record
+        row = self._connect().execute(
+            "SELECT suppress_until, priority, magnitude, sent_count FROM alert_fingerprints WHERE fingerprint = ?",
+            (key,)
+        ).fetchone()
+        if row is not None:
+            self._remember(key, tuple(row))
+        return tuple(row) if row else None
+
+    def _remember(self, key: int, record: Tuple[float, int, float, int]):
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def check(self, key: int, priority: int, magnitude: float, now: Optional[float] = None) -> str:
+        """
+        Decide whether an alert should go out, without recording it
+
+        Callers that persist the alert first (see record_many) use this so a failed write
+        does not leave the alert suppressed.
+
+        Args:
+            key: fingerprint() of the alert
+            priority: Priority rank (higher is more urgent)
+            magnitude: Size of what was detected (opportunity score, |z|, growth ...)
+            now: Epoch seconds (defaults to the current time)
+
+        Returns:
+            NEW, REPEAT or ESCALATED (send it) or SUPPRESSED (drop it)
+        """
+        now = now or time.time()
+        with self._lock:
+            record = self._lookup(key)
+            if record is None:
+                decision = NEW
+            elif now >= record[0]:
+                decision = REPEAT
+            elif priority > record[1] or magnitude > record[2] * (1 + self.escalation_ratio):
+                decision = ESCALATED
+            else:
+                decision = SUPPRESSED
+            self.stats[decision] += 1
+        return decision
+
+    def record_many(self, sent: List[Tuple[int, int, float, float, float]]) -> None:
+        """
+        Record alerts that went out, in one transaction
+
+        Args:
+            sent: (key, priority, magnitude, window_seconds, now) per alert
+        """
+        if not sent:
+            return
+        rows = []
+        with self._lock:
+            for key, priority, magnitude, window_seconds, now in sent:
+                record = self._lookup(key)
+                new_record = (now + window_seconds, priority, magnitude, (record[3] if record else 0) + 1)
+                self._remember(key, new_record)
+                rows.append((key, *new_record))
+            purge = self._writes // 1000 != (self._writes + len(rows)) // 1000
+            self._writes += len(rows)
+
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO alert_fingerprints (fingerprint, suppress_until, priority, magnitude, sent_count) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+            if purge:
+                conn.execute("DELETE FROM alert_fingerprints WHERE suppress_until < ?",
+                             (time.time() - self.retention_seconds,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            # The LRU must not claim what SQLite does not have
+            with self._lock:
+                for key, *_ in sent:
+                    self._cache.pop(key, None)
+            raise
+
+    def admit(self, key: int, priority: int, magnitude: float, window_seconds: float,
+              now: Optional[float] = None) -> str:
+        """
+        Decide whether an alert should go out, and record it if so
+
+        Args:
+            key: fingerprint() of the alert
+            priority: Priority rank (higher is more urgent)
+            magnitude: Size of what was detected (opportunity score, |z|, growth ...)
+            window_seconds: How long repeats are suppressed once this alert is sent
+            now: Epoch seconds (defaults to the current time)
+
+        Returns:
+            NEW, REPEAT or ESCALATED (send it) or SUPPRESSED (drop it)
+        """
+        now = now or time.time()
+        decision = self.check(key, priority, magnitude, now)
+        if decision != SUPPRESSED:
+            self.record_many([(key, priority, magnitude, window_seconds, now)])
+        return decision
+
+    def metrics(self) -> Dict[str, Any]:
+        """Fingerprints in memory and decision counters"""
+        with self._lock:
+            return {"cached": len(self._cache), **self.stats}
+
+_fingerprint_index: Optional[FingerprintIndex] = None
+_fingerprint_index_lock = threading.Lock()
+
+def get_fingerprint_index() -> FingerprintIndex:
+    """Get the process-wide fingerprint index, creating it on first use"""
+    global _fingerprint_index
+    if _fingerprint_index is None:
+        with _fingerprint_index_lock:
+            if _fingerprint_index is None:
+                _fingerprint_index = FingerprintIndex()
+    return _fingerprint_index
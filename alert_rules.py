@@ -0,0 +1,219 @@
+"""
+Alert Rules for Morvo AI Marketing Platform
+Threshold rules evaluated as NumPy masks over the metrics of many companies at once
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from operator import itemgetter
+import logging
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def _context_data(context: Optional[Dict[str, Any]], *keys: str) -> Optional[List[Any]]:
+    """The requested context sections, or None when any of them is missing or empty"""
+    if not context or not context.get("data"):
+        return None
+    sections = [context["data"].get(key) for key in keys]
+    return sections if all(sections) else None
+
+def _is_number(value: Any) -> bool:
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def _columns(items: List[Dict[str, Any]], fields: List[str]) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    Indices of the usable items and one float vector per field over those items
+
+    The common case (every item has every field as a number) is read at C speed via
+    map/itemgetter; only a batch with a malformed item falls back to checking item by item.
+    Items with a missing, non-numeric or non-finite field are left out.
+    """
+    try:
+        columns = [np.fromiter(map(itemgetter(field), items), dtype=np.float64, count=len(items))
+                   for field in fields]
+        keep = np.arange(len(items))
+    except (KeyError, TypeError, ValueError):
+        keep = np.array([n for n, item in enumerate(items)
+                         if all(field in item and _is_number(item[field]) for field in fields)], dtype=np.int64)
+        columns = [np.fromiter((float(items[n][field]) for n in keep.tolist()), dtype=np.float64, count=len(keep))
+                   for field in fields]
+
+    # None reads as NaN on the fast path
+    finite = np.logical_and.reduce([np.isfinite(column) for column in columns])
+    if not finite.all():
+        keep, columns = keep[finite], [column[finite] for column in columns]
+    return keep, columns
+
+def _group_by_company(company: np.ndarray, score: np.ndarray, mask: np.ndarray) -> Dict[int, List[int]]:
+    """
+    Positions that passed the mask, grouped per company and ordered by score (highest first)
+    Ties keep their order in the context, like a stable list sort would
+    """
+    hits = np.flatnonzero(mask)
+    if hits.size == 0:
+        return {}
+    order = hits[np.lexsort((hits, -score[hits], company[hits]))]
+    companies, starts = np.unique(company[order], return_index=True)
+    order, bounds = order.tolist(), starts.tolist() + [len(order)]
+    return {c: order[bounds[n]:bounds[n + 1]] for n, c in enumerate(companies.tolist())}
+
+def _percent_change(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """(current - previous) / previous in percent, 0 where previous is not positive"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(previous > 0, (current - previous) / previous * 100, 0.0)
+
+def _flatten(contexts: List[Optional[Dict[str, Any]]], *keys: str) -> Tuple[np.ndarray, List[Any], List[Any]]:
+    """
+    Items of the last of the context sections of every company, in one flat list
+
+    Returns:
+        Company index per item, item names (dict keys) and the items themselves
+    """
+    *required, key = keys
+    counts, names, items = [], [], []
+    for context in contexts:
+        # Same test as _context_data, inlined: this loop runs once per company
+        data = context.get("data") if context else None
+        section = data.get(key) if data else None
+        if not section or not isinstance(section, dict) or not all(data.get(k) for k in required):
+            counts.append(0)
+            continue
+        names.extend(section)
+        items.extend(section.values())
+        counts.append(len(section))
+    return np.repeat(np.arange(len(contexts)), counts), names, items
+
+# ----------------------------------------------------------------------
+# Rules
+# ----------------------------------------------------------------------
+
+def traffic_opportunities(contexts: List[Optional[Dict[str, Any]]],
+                          thresholds: Dict[str, Any]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Traffic sources that grew past the traffic_spike thresholds
+
+    Args:
+        contexts: M5 context (analytics_data, traffic_sources) per company
+        thresholds: alert_thresholds["traffic_spike"]
+
+    Returns:
+        Index into contexts -> opportunities, highest score first (companies without any are omitted)
+    """
+    company, names, items = _flatten(contexts, "analytics_data", "traffic_sources")
+    keep, (current, previous) = _columns(items, ["current", "previous"])
+
+    change = _percent_change(current, previous)
+    mask = ((previous > 0) & (current >= thresholds["minimum_volume"])
+            & (change >= thresholds["percentage_change"]))
+    score = np.minimum(100, np.trunc(change))
+    groups = _group_by_company(company[keep], score, mask)
+
+    # Only the hits are turned back into dicts, read from plain Python lists
+    keep, change, score = keep.tolist(), change.tolist(), score.astype(np.int64).tolist()
+    return {
+        i: [{
+            "source": names[keep[p]],
+            "current_traffic": items[keep[p]]["current"],
+            "previous_traffic": items[keep[p]]["previous"],
+            "percentage_change": round(change[p], 1),
+            "opportunity_score": score[p]
+        } for p in hits]
+        for i, hits in groups.items()
+    }
+
+def keyword_opportunities(contexts: List[Optional[Dict[str, Any]]],
+                          thresholds: Dict[str, Any]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Relevant, low-competition keywords whose search volume grew past the keyword_opportunity thresholds
+
+    Args:
+        contexts: M1 context (seo_data, keyword_rankings) per company
+        thresholds: alert_thresholds["keyword_opportunity"]
+
+    Returns:
+        Index into contexts -> opportunities, highest score first
+    """
+    company, names, items = _flatten(contexts, "seo_data", "keyword_rankings")
+    keep, (current, previous, competition, relevance) = _columns(
+        items, ["current_volume", "previous_volume", "competition", "relevance"]
+    )
+
+    increase = _percent_change(current, previous)
+    mask = ((previous > 0) & (competition <= thresholds["competition_max"])
+            & (relevance >= thresholds["relevance_min"])
+            & (increase >= thresholds["search_volume_increase"]))
+    score = np.minimum(100, np.trunc(increase * 0.4 + (1 - competition) * 30 + relevance * 30))
+    groups = _group_by_company(company[keep], score, mask)
+
+    keep, increase, score = keep.tolist(), increase.tolist(), score.astype(np.int64).tolist()
+    return {
+        i: [{
+            "keyword": names[keep[p]],
+            "current_volume": items[keep[p]]["current_volume"],
+            "volume_increase": round(increase[p], 1),
+            "competition": items[keep[p]]["competition"],
+            "relevance": items[keep[p]]["relevance"],
+            "current_rank": items[keep[p]].get("current_rank", 100),
+            "opportunity_score": score[p]
+        } for p in hits]
+        for i, hits in groups.items()
+    }
+
+def engagement_opportunities(contexts: List[Optional[Dict[str, Any]]],
+                             thresholds: Dict[str, Any]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Social posts engaging well above their average, per the engagement_spike thresholds
+
+    Args:
+        contexts: M2 context (social_analytics, engagement_metrics) per company
+        thresholds: alert_thresholds["engagement_spike"]
+
+    Returns:
+        Index into contexts -> opportunities, highest score first
+    """
+    counts, platforms, posts = [], [], []
+    for context in contexts:
+        sections = _context_data(context, "social_analytics", "engagement_metrics")
+        count = 0
+        if sections is not None:
+            for platform, data in sections[0].get("platforms", {}).items():
+                recent_posts = data.get("recent_posts", [])
+                platforms.extend([platform] * len(recent_posts))
+                posts.extend(recent_posts)
+                count += len(recent_posts)
+        counts.append(count)
+    company = np.repeat(np.arange(len(contexts)), counts)
+
+    keep, (rate, average, engagements) = _columns(
+        posts, ["engagement_rate", "average_engagement_rate", "total_engagements"]
+    )
+    has_id = np.fromiter(("post_id" in posts[n] for n in keep.tolist()), dtype=bool, count=len(keep))
+
+    increase = _percent_change(rate, average)
+    mask = (has_id & (average > 0) & (engagements >= thresholds["minimum_engagements"])
+            & (increase >= thresholds["percentage_increase"]))
+    score = np.minimum(100, np.trunc(increase))
+    groups = _group_by_company(company[keep], score, mask)
+
+    keep, rate, average = keep.tolist(), rate.tolist(), average.tolist()
+    increase, score = increase.tolist(), score.astype(np.int64).tolist()
+    return {
+        i: [{
+            "platform": platforms[keep[p]],
+            "post_id": posts[keep[p]]["post_id"],
+            "post_type": posts[keep[p]].get("type", "unknown"),
+            "content_snippet": posts[keep[p]].get("content_snippet", ""),
+            "current_engagement_rate": round(rate[p], 2),
+            "average_engagement_rate": round(average[p], 2),
+            "total_engagements": posts[keep[p]]["total_engagements"],
+            "percentage_increase": round(increase[p], 1),
+            "opportunity_score": score[p]
+        } for p in hits]
+        for i, hits in groups.items()
+    }
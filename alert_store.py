@@ -0,0 +1,229 @@
+"""
+Alert Store for Morvo AI Marketing Platform
+SQLite alert table indexed by (company, expires_at, priority) with an in-process expiry heap
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime, timezone
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Sort rank of alert priorities (higher first)
+PRIORITY_RANK = {"critical": 4, "high": 3, "medium": 2, "low": 1}
+
+def to_epoch(value: Any, default: Optional[float] = None) -> Optional[float]:
+    """Convert an ISO timestamp (naive values are UTC, as written by utcnow()) or a number to epoch seconds"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+class AlertStore:
+    """
+    Alerts stored once per company instead of once per agent memory
+    Active alerts are one indexed range read; expired rows are swept from a min-heap of expiry times
+    """
+
+    INSERT_SQL = """INSERT OR REPLACE INTO alerts
+        (id, company_id, alert_type, priority, created_at, expires_at, notified_agents, payload)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+
+    def __init__(self, db_path: Optional[str] = None, default_ttl_seconds: Optional[float] = None):
+        """Open (and create if needed) the alert database"""
+        self.db_path = db_path or os.getenv("ALERTS_DB", "alerts.db")
+        self.default_ttl_seconds = default_ttl_seconds or float(os.getenv("ALERT_DEFAULT_TTL_HOURS", "24")) * 3600
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (expires_at, alert_id) for every alert this process knows to be live
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self.stats = {"stored": 0, "swept": 0}
+        self._init_schema()
+        self._load_heap()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get a connection for the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        """Create tables and indexes"""
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id TEXT PRIMARY KEY,
+                company_id TEXT NOT NULL,
+                alert_type TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                notified_agents TEXT NOT NULL DEFAULT '[]',
+                payload TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_alerts_company_expires_priority
+                ON alerts (company_id, expires_at, priority);
+            CREATE INDEX IF NOT EXISTS idx_alerts_expires
+                ON alerts (expires_at);
+        """)
+
+    def _load_heap(self):
+        """Seed the expiry heap with alerts that are still live"""
+        rows = self._connect().execute(
+            "SELECT id, expires_at FROM alerts WHERE expires_at > ?", (time.time(),)
+        ).fetchall()
+        with self._lock:
+            self._expiry_heap = [(row["expires_at"], row["id"]) for row in rows]
+            heapq.heapify(self._expiry_heap)
+
+    def _row(self, alert_data: Dict[str, Any], notified_agents: Optional[List[str]], now: float) -> Tuple:
+        """Table row for an alert"""
+        company_id = alert_data["company_id"]
+        alert_type = alert_data["alert_type"]
+        timestamp = alert_data.get("timestamp") or datetime.utcnow().isoformat()
+        alert_id = alert_data.get("alert_id") or f"{company_id}_{alert_type}_{timestamp}"
+        created_at = to_epoch(timestamp, now)
+        expires_at = to_epoch(alert_data.get("expires_at"), created_at + self.default_ttl_seconds)
+        priority = PRIORITY_RANK.get(alert_data.get("alert_priority", "low"), 0)
+        return (alert_id, company_id, alert_type, priority, created_at, expires_at,
+                json.dumps(notified_agents or []),
+                json.dumps({**alert_data, "alert_id": alert_id}, ensure_ascii=False, default=str))
+
+    def add(self, alert_data: Dict[str, Any], notified_agents: Optional[List[str]] = None) -> str:
+        """
+        Store an alert (idempotent per company, type and timestamp)
+
+        Args:
+            alert_data: Alert with at least company_id and alert_type
+            notified_agents: Agents the alert is relevant to
+
+        Returns:
+            Alert id
+        """
+        row = self._row(alert_data, notified_agents, time.time())
+        self._connect().execute(self.INSERT_SQL, row)
+        with self._lock:
+            heapq.heappush(self._expiry_heap, (row[5], row[0]))
+            self.stats["stored"] += 1
+        return row[0]
+
+    def add_many(self, alerts: List[Tuple[Dict[str, Any], Optional[List[str]]]]) -> int:
+        """
+        Store (alert_data, notified_agents) pairs in a single transaction
+
+        Returns:
+            Number of alerts stored
+        """
+        now = time.time()
+        rows = [self._row(alert_data, agents, now) for alert_data, agents in alerts]
+        if not rows:
+            return 0
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(self.INSERT_SQL, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            for row in rows:
+                heapq.heappush(self._expiry_heap, (row[5], row[0]))
+            self.stats["stored"] += len(rows)
+        return len(rows)
+
+    def get_active(self, company_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Live alerts of a company, highest priority and newest first (one indexed read)"""
+        rows = self._connect().execute(
+            """SELECT payload, notified_agents FROM alerts
+               WHERE company_id = ? AND expires_at > ?
+               ORDER BY priority DESC, created_at DESC
+               LIMIT ?""",
+            (company_id, time.time(), limit)
+        ).fetchall()
+        alerts = []
+        for row in rows:
+            alert = json.loads(row["payload"])
+            agents = json.loads(row["notified_agents"])
+            alert["notified_agents"] = agents
+            if agents:
+                alert["source_agent"] = agents[0]
+            alerts.append(alert)
+        return alerts
+
+    def get(self, alert_id: str) -> Optional[Dict[str, Any]]:
+        """One alert by id, expired or not"""
+        row = self._connect().execute("SELECT payload FROM alerts WHERE id = ?", (alert_id,)).fetchone()
+        return json.loads(row["payload"]) if row else None
+
+    def delete(self, alert_id: str) -> bool:
+        """Remove an alert (e.g. dismissed); its heap entry is skipped when it comes up"""
+        return self._connect().execute("DELETE FROM alerts WHERE id = ?", (alert_id,)).rowcount > 0
+
+    def next_expiry(self) -> Optional[float]:
+        """Epoch time at which the next known alert expires"""
+        with self._lock:
+            return self._expiry_heap[0][0] if self._expiry_heap else None
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Delete expired alerts
+
+        Pops only the expired entries off the heap (O(log n) each) and deletes them by primary key.
+        A re-stored alert with a later expiry is protected by the expires_at check in the DELETE.
+        """
+        now = now or time.time()
+        expired = []
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expired.append(heapq.heappop(self._expiry_heap)[1])
+        if not expired:
+            return 0
+        conn = self._connect()
+        deleted = 0
+        for start in range(0, len(expired), 500):
+            chunk = expired[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            deleted += conn.execute(
+                f"DELETE FROM alerts WHERE id IN ({placeholders}) AND expires_at <= ?", (*chunk, now)
+            ).rowcount
+        with self._lock:
+            self.stats["swept"] += deleted
+        return deleted
+
+    def metrics(self) -> Dict[str, Any]:
+        """Row counts and counters"""
+        row = self._connect().execute(
+            "SELECT COUNT(*) AS n, COALESCE(SUM(expires_at > ?), 0) AS active FROM alerts", (time.time(),)
+        ).fetchone()
+        with self._lock:
+            return {"alerts": row["n"], "active": row["active"],
+                    "heap_size": len(self._expiry_heap), **self.stats}
+
+_alert_store: Optional[AlertStore] = None
+_alert_store_lock = threading.Lock()
+
+def get_alert_store() -> AlertStore:
+    """Get the process-wide alert store, creating it on first use"""
+    global _alert_store
+    if _alert_store is None:
+        with _alert_store_lock:
+            if _alert_store is None:
+                _alert_store = AlertStore()
+                logger.info(f"Alert store at {_alert_store.db_path}")
+    return _alert_store
@@ -0,0 +1,293 @@
+"""
+Anomaly Detector for Morvo AI Marketing Platform
+Online per-(company, metric) detector: EWMA level and variance with day-of-week seasonality, O(1) state in SQLite
+"""
+
+from typing import Dict, List, Any, Optional, Tuple, Iterable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import logging
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# (company_id, metric, value, epoch seconds)
+Point = Tuple[str, str, float, float]
+
+# Series read from external data results:
+# (source, data_type) -> (list key, where the values are, {field: (metric, alert_type)})
+SERIES = {
+    ("google_analytics", "visitors"): ("daily_data", "metrics", {
+        "sessions": ("sessions", "traffic_anomaly"),
+        "activeUsers": ("active_users", "traffic_anomaly"),
+        "engagementRate": ("engagement_rate", "engagement_anomaly")
+    }),
+    ("brand24", "sentiment"): ("daily_sentiment", None, {
+        "total": ("mentions", "engagement_anomaly"),
+        "negative": ("negative_mentions", "sentiment_shift"),
+        "sentiment_score": ("sentiment_score", "sentiment_shift")
+    })
+}
+
+# metric -> alert type
+METRIC_ALERT_TYPES = {metric: alert_type
+                      for _, _, fields in SERIES.values()
+                      for metric, alert_type in fields.values()}
+
+def parse_date(value: Any) -> Optional[float]:
+    """Epoch seconds of a GA4 (YYYYMMDD) or ISO date; naive values are UTC"""
+    if not value:
+        return None
+    text = str(value)
+    try:
+        parsed = datetime.strptime(text, "%Y%m%d") if text.isdigit() else datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def extract_points(company_id: str, source: str, data_type: str, data: Dict[str, Any],
+                   now: Optional[float] = None) -> List[Point]:
+    """
+    Time series points contained in one external data result, oldest first
+
+    Days that are not over yet (dated on or after the current UTC day) are left out: sources
+    report today's partial value, and once folded in, the complete value of that day would be
+    skipped as stale on the next fetch.
+
+    Args:
+        company_id: Company the data belongs to
+        source: Data source name (google_analytics, brand24, ...)
+        data_type: Data type fetched from the source
+        data: ExternalDataResult.data
+        now: Epoch seconds (defaults to the current time)
+
+    Returns:
+        Points for the metrics in SERIES (empty for results without a daily series)
+    """
+    spec = SERIES.get((source, data_type))
+    if spec is None or not data:
+        return []
+    list_key, values_key, fields = spec
+    now = time.time() if now is None else now
+    today = now - now % 86400
+
+    points = []
+    for item in data.get(list_key) or []:
+        timestamp = parse_date(item.get("date"))
+        values = item.get(values_key, {}) if values_key else item
+        if timestamp is None or timestamp >= today or not isinstance(values, dict):
+            continue
+        for source_field, (metric, _) in fields.items():
+            value = values.get(source_field)
+            if isinstance(value, (int, float)) and math.isfinite(value):
+                points.append((company_id, metric, float(value), timestamp))
+    points.sort(key=lambda point: point[3])
+    return points
+
+@dataclass
+class MetricState:
+    """
+    Detector state of one series: additive level + day-of-week offset, EWMA residual variance
+    Packs into STATE_FORMAT (84 bytes) whatever the length of the history
+    """
+    last_ts: float = 0.0
+    level: float = 0.0
+    variance: float = 0.0
+    count: int = 0
+    seasonal: List[float] = field(default_factory=lambda: [0.0] * 7)
+
+    STATE_FORMAT = struct.Struct("<dddI7d")
+
+    def pack(self) -> bytes:
+        return self.STATE_FORMAT.pack(self.last_ts, self.level, self.variance, self.count, *self.seasonal)
+
+    @classmethod
+    def unpack(cls, blob: bytes) -> "MetricState":
+        last_ts, level, variance, count, *seasonal = cls.STATE_FORMAT.unpack(blob)
+        return cls(last_ts, level, variance, count, list(seasonal))
+
+class AnomalyDetector:
+    """
+    Streaming anomaly detector
+    Each new point is scored against its series' expected value for that weekday, then folded
+    into the state; history is never re-read. States are cached in memory and written through to SQLite.
+    """
+
+    def __init__(self,
+                 db_path: Optional[str] = None,
+                 alpha: Optional[float] = None,
+                 gamma: Optional[float] = None,
+                 beta: Optional[float] = None,
+                 z_threshold: Optional[float] = None,
+                 warmup: Optional[int] = None,
+                 relative_floor: float = 0.05):
+        """
+        Initialize the detector
+
+        Args:
+            db_path: SQLite file for the states
+            alpha: Smoothing of the level
+            gamma: Smoothing of the day-of-week offsets
+            beta: Smoothing of the residual variance
+            z_threshold: |z| at which a point is an anomaly
+            warmup: Points a series needs before it can raise anomalies
+            relative_floor: Smallest standard deviation as a share of the expected value (keeps flat series quiet)
+        """
+        self.db_path = db_path or os.getenv("ANOMALY_DB", "anomaly_state.db")
+        self.alpha = alpha or float(os.getenv("ANOMALY_ALPHA", "0.3"))
+        self.gamma = gamma or float(os.getenv("ANOMALY_SEASON_GAMMA", "0.1"))
+        self.beta = beta or float(os.getenv("ANOMALY_VARIANCE_BETA", "0.1"))
+        self.z_threshold = z_threshold or float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+        self.warmup = warmup or int(os.getenv("ANOMALY_WARMUP_POINTS", "14"))
+        self.relative_floor = relative_floor
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._states: Dict[Tuple[str, str], MetricState] = {}
+        self.stats = {"points": 0, "stale_points": 0, "anomalies": 0}
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS metric_state (
+                company_id TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                state BLOB NOT NULL,
+                PRIMARY KEY (company_id, metric)
+            ) WITHOUT ROWID
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get a connection for the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _state(self, company_id: str, metric: str) -> MetricState:
+        """Cached state of a series, loaded from SQLite on first use"""
+        key = (company_id, metric)
+        state = self._states.get(key)
+        if state is None:
+            row = self._connect().execute(
+                "SELECT state FROM metric_state WHERE company_id = ? AND metric = ?", key
+            ).fetchone()
+            state = MetricState.unpack(row[0]) if row else MetricState()
+            self._states[key] = state
+        return state
+
+    def _update(self, state: MetricState, value: float, timestamp: float) -> Optional[Dict[str, Any]]:
+        """Score a point against the state, then fold it in; returns the anomaly if there is one"""
+        if state.count == 0:
+            state.level, state.last_ts, state.count = value, timestamp, 1
+            return None
+
+        day = datetime.fromtimestamp(timestamp, tz=timezone.utc).weekday()
+        expected = state.level + state.seasonal[day]
+        residual = value - expected
+        scale = max(math.sqrt(state.variance), self.relative_floor * abs(expected), 1e-9)
+        z_score = residual / scale
+
+        anomaly = None
+        if state.count >= self.warmup:
+            if abs(z_score) >= self.z_threshold:
+                anomaly = {
+                    "value": value,
+                    "expected": round(expected, 4),
+                    "z_score": round(z_score, 2),
+                    "direction": "spike" if residual > 0 else "drop",
+                    "observed_at": timestamp
+                }
+            # Clip the residual so one outlier does not drag the baseline along with it
+            limit = self.z_threshold * scale
+            residual = min(max(residual, -limit), limit)
+
+        level = state.level + self.alpha * residual
+        state.seasonal[day] += self.gamma * (expected + residual - level - state.seasonal[day])
+        state.level = level
+        state.variance = (1 - self.beta) * (state.variance + self.beta * residual * residual)
+        state.count += 1
+        state.last_ts = timestamp
+        return anomaly
+
+    def observe_many(self, points: Iterable[Point]) -> List[Dict[str, Any]]:
+        """
+        Fold new points into their series and persist the touched states in one transaction
+        Points not newer than the last one seen for their series (e.g. the overlap of two
+        30-day GA4 windows) are skipped.
+
+        Args:
+            points: (company_id, metric, value, epoch seconds), oldest first per series
+
+        Returns:
+            Anomalies, each with company_id and metric
+        """
+        anomalies = []
+        touched = {}
+        with self._lock:
+            for company_id, metric, value, timestamp in points:
+                state = self._state(company_id, metric)
+                self.stats["points"] += 1
+                if state.count and timestamp <= state.last_ts:
+                    self.stats["stale_points"] += 1
+                    continue
+                anomaly = self._update(state, value, timestamp)
+                touched[(company_id, metric)] = state
+                if anomaly:
+                    anomalies.append({"company_id": company_id, "metric": metric, **anomaly})
+            self.stats["anomalies"] += len(anomalies)
+            rows = [(company_id, metric, state.pack()) for (company_id, metric), state in touched.items()]
+
+        if rows:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO metric_state (company_id, metric, state) VALUES (?, ?, ?)", rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return anomalies
+
+    def observe(self, company_id: str, metric: str, value: float, timestamp: float) -> Optional[Dict[str, Any]]:
+        """Fold one point into its series; returns the anomaly if there is one"""
+        anomalies = self.observe_many([(company_id, metric, value, timestamp)])
+        return anomalies[0] if anomalies else None
+
+    def get_state(self, company_id: str, metric: str) -> Dict[str, Any]:
+        """Current baseline of a series"""
+        with self._lock:
+            state = self._state(company_id, metric)
+            return {
+                "count": state.count,
+                "level": state.level,
+                "std": math.sqrt(state.variance),
+                "seasonal": list(state.seasonal),
+                "last_ts": state.last_ts,
+                "warmed_up": state.count >= self.warmup
+            }
+
+    def metrics(self) -> Dict[str, Any]:
+        """Series held in memory and counters"""
+        with self._lock:
+            return {"series": len(self._states), **self.stats}
+
+_anomaly_detector: Optional[AnomalyDetector] = None
+_anomaly_detector_lock = threading.Lock()
+
+def get_anomaly_detector() -> AnomalyDetector:
+    """Get the process-wide anomaly detector, creating it on first use"""
+    global _anomaly_detector
+    if _anomaly_detector is None:
+        with _anomaly_detector_lock:
+            if _anomaly_detector is None:
+                _anomaly_detector = AnomalyDetector()
+                logger.info(f"Anomaly detector state at {_anomaly_detector.db_path}")
+    return _anomaly_detector
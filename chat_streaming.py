@@ -0,0 +1,294 @@
+"""
+Chat Streaming for Morvo AI Marketing Platform
+Streams LLM tokens from crew worker threads to chat WebSockets as message_start/delta/message_end frames
+"""
+
+from typing import Dict, Any, Awaitable, Callable, Optional
+from contextlib import contextmanager
+from datetime import datetime
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class StreamCancelled(Exception):
+    """Raised inside a worker thread when the client stopped listening to its stream"""
+    pass
+
+class TokenSink:
+    """
+    Thread-safe bridge from LLM token callbacks (worker threads) to the event loop
+    One sink per streamed response
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Bind the sink to the loop that will consume its tokens"""
+        self._loop = loop or asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._cancelled = threading.Event()
+        self.tokens = 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        """Stop the stream; the producing thread fails at its next token"""
+        self._cancelled.set()
+
+    def push(self, text: str) -> None:
+        """Queue a token from any thread"""
+        if self.cancelled:
+            raise StreamCancelled("Client stopped listening")
+        if text:
+            self.tokens += 1
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, text)
+
+    def bind(self, func: Callable) -> Callable:
+        """Wrap a blocking callable so tokens emitted while it runs go to this sink"""
+        def bound(*args, **kwargs):
+            with stream_to(self):
+                return func(*args, **kwargs)
+        return bound
+
+    async def deltas(self, producer: asyncio.Task):
+        """Yield queued text, coalescing whatever arrived since the last send, until the producer is done"""
+        while True:
+            if self._queue.empty():
+                if producer.done():
+                    return
+                getter = asyncio.ensure_future(self._queue.get())
+                await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                chunks = [getter.result()]
+            else:
+                chunks = []
+            while not self._queue.empty():
+                chunks.append(self._queue.get_nowait())
+            yield "".join(chunks)
+
+# ----------------------------------------------------------------------
+# Token sources
+# ----------------------------------------------------------------------
+
+_current = threading.local()
+
+@contextmanager
+def stream_to(sink: Optional[TokenSink]):
+    """Route tokens emitted on this thread to a sink"""
+    previous = getattr(_current, "sink", None)
+    _current.sink = sink
+    try:
+        yield sink
+    finally:
+        _current.sink = previous
+
+def emit_token(text: str) -> None:
+    """Forward a token to the sink bound to the current thread, if any"""
+    sink = getattr(_current, "sink", None)
+    if sink is not None:
+        sink.push(text)
+
+_token_handler = None
+
+def get_token_handler():
+    """
+    LangChain callback handler that forwards streamed tokens to the current thread's sink
+    Attach it to a LangChain chat model created with streaming=True
+    """
+    global _token_handler
+    if _token_handler is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class TokenStreamHandler(BaseCallbackHandler):
+            # Let StreamCancelled abort the LLM call instead of being logged and ignored
+            raise_error = True
+
+            def on_llm_new_token(self, token: str, **kwargs) -> None:
+                emit_token(token)
+
+        _token_handler = TokenStreamHandler()
+    return _token_handler
+
+_crewai_listener_installed = False
+
+def install_crewai_stream_listener() -> bool:
+    """Forward CrewAI LLM stream chunk events to the current thread's sink (CrewAI versions with an event bus)"""
+    global _crewai_listener_installed
+    if _crewai_listener_installed:
+        return True
+    try:
+        from crewai.utilities.events import crewai_event_bus, LLMStreamChunkEvent
+    except ImportError:
+        logger.info("CrewAI event bus without stream events; responses are sent when complete")
+        return False
+
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def _forward_chunk(source, event):
+        emit_token(event.chunk)
+
+    _crewai_listener_installed = True
+    return True
+
+def streaming_llm(model_name: Optional[str] = None):
+    """CrewAI LLM with streaming enabled, or None to keep CrewAI's default LLM"""
+    try:
+        import crewai
+        install_crewai_stream_listener()
+        return crewai.LLM(model=model_name or os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini"), stream=True)
+    except Exception as e:
+        logger.info(f"Streaming LLM not available, using default LLM: {e}")
+        return None
+
+# ----------------------------------------------------------------------
+# WebSocket session
+# ----------------------------------------------------------------------
+
+# Producer signature: (sink or None) -> response dict with at least "content"
+ResponseProducer = Callable[[Optional[TokenSink]], Awaitable[Dict[str, Any]]]
+
+class ChatSocketSession:
+    """
+    Reads a chat WebSocket in the background and streams responses to it
+    A client disconnect or a {"type": "cancel"} frame cancels the response in progress;
+    {"type": "pong"} heartbeat replies are consumed here
+    """
+
+    def __init__(self, websocket, stream: bool = False, on_frame: Optional[Callable[[], None]] = None,
+                 on_pong: Optional[Callable[[], None]] = None):
+        """
+        Wrap an accepted WebSocket
+
+        Args:
+            websocket: Accepted Starlette/FastAPI WebSocket
+            stream: Stream responses by default (clients can override per message with "stream")
+            on_frame: Called for every frame received, e.g. to mark the connection alive
+            on_pong: Called for every heartbeat reply, e.g. to mark the client as answering pings
+        """
+        self.websocket = websocket
+        self.stream = stream
+        self.on_frame = on_frame
+        self.on_pong = on_pong
+        self._incoming: asyncio.Queue = asyncio.Queue()
+        self._reader: Optional[asyncio.Task] = None
+        self._current: Optional[asyncio.Task] = None
+        self._current_sink: Optional[TokenSink] = None
+        self.disconnected = False
+
+    async def __aenter__(self):
+        self._reader = asyncio.create_task(self._read_loop())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.cancel_current()
+        if self._reader:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+        return False
+
+    async def _read_loop(self):
+        """Receive frames until the client disconnects"""
+        try:
+            while True:
+                data = json.loads(await self.websocket.receive_text())
+                if self.on_frame:
+                    self.on_frame()
+                if isinstance(data, dict) and data.get("type") == "pong":
+                    if self.on_pong:
+                        self.on_pong()
+                    continue
+                if isinstance(data, dict) and data.get("type") == "cancel":
+                    self.cancel_current()
+                    continue
+                await self._incoming.put(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # WebSocketDisconnect, closed transport or malformed JSON all end the session
+            logger.debug(f"Chat socket reader stopped: {e}")
+        finally:
+            self.disconnected = True
+            self.cancel_current()
+            self._incoming.put_nowait(None)
+
+    async def receive(self) -> Optional[Dict[str, Any]]:
+        """Next client message, or None once the client is gone"""
+        return await self._incoming.get()
+
+    def cancel_current(self) -> None:
+        """Cancel the response being produced, including its crew run"""
+        if self._current_sink:
+            self._current_sink.cancel()
+        if self._current and not self._current.done():
+            self._current.cancel()
+
+    async def respond(self,
+                      produce: ResponseProducer,
+                      message_frame: Callable[[Dict[str, Any]], Dict[str, Any]],
+                      stream: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+        """
+        Produce a response and send it, streamed or as a single frame
+
+        Args:
+            produce: Coroutine function building the response; it receives a TokenSink when streaming
+            message_frame: Builds the server's non-streaming frame from the response
+            stream: Override the session default for this message
+
+        Returns:
+            The response, or None if it was cancelled
+        """
+        streaming = self.stream if stream is None else stream
+        sink = TokenSink() if streaming else None
+        self._current_sink = sink
+        self._current = asyncio.create_task(produce(sink))
+        try:
+            if streaming:
+                return await self._stream(sink, self._current)
+            response = await self._current
+            await self.websocket.send_json(message_frame(response))
+            return response
+        except (asyncio.CancelledError, StreamCancelled):
+            # Our own task being cancelled must propagate; a cancelled response just ends quietly
+            if asyncio.current_task().cancelling():
+                raise
+            logger.info("Chat response cancelled")
+            return None
+        except Exception:
+            self.cancel_current()
+            raise
+        finally:
+            self._current = None
+            self._current_sink = None
+
+    async def _stream(self, sink: TokenSink, producer: asyncio.Task) -> Dict[str, Any]:
+        """Send message_start, deltas as tokens arrive, then message_end with the final frame"""
+        message_id = f"msg_{uuid.uuid4().hex[:12]}"
+        await self.websocket.send_json({
+            "type": "message_start",
+            "message_id": message_id,
+            "timestamp": datetime.now().isoformat()
+        })
+
+        async for text in sink.deltas(producer):
+            await self.websocket.send_json({"type": "delta", "message_id": message_id, "content": text})
+
+        response = producer.result()
+        if sink.tokens == 0 and response.get("content"):
+            # Nothing was streamed (keyword reply, cache hit, non-streaming LLM): send it as one delta
+            await self.websocket.send_json({"type": "delta", "message_id": message_id, "content": response["content"]})
+
+        # message_end repeats the full content so clients can replace the streamed draft
+        await self.websocket.send_json({
+            **response,
+            "type": "message_end",
+            "message_id": message_id,
+            "timestamp": datetime.now().isoformat()
+        })
+        return response
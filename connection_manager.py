@@ -0,0 +1,452 @@
+"""
+Connection Manager for Morvo AI Marketing Platform
+WebSocket registry indexed by user, organization and topic, with a bounded send queue per connection
+"""
+
+from typing import Dict, List, Any, Iterable, Optional, Set
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def encode_frame(message: Dict[str, Any]) -> str:
+    """
+    Serialize a frame once for every recipient
+    Arabic text is written as UTF-8, not \\uXXXX escapes (smaller frames, no escaping work)
+    """
+    if orjson is not None:
+        return orjson.dumps(message, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def per_message_deflate_enabled() -> bool:
+    """Whether the server offers permessage-deflate (WS_PER_MESSAGE_DEFLATE) to clients that ask for it"""
+    return os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"
+
+# What to do when a connection's queue is full
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "drop_newest")
+
+# Close codes sent to clients removed by the server
+CLOSE_IDLE = 4000
+CLOSE_REPLACED = 4001
+CLOSE_TRY_AGAIN_LATER = 1013
+
+class ConnectionLimitExceeded(Exception):
+    """Raised by connect() when an organization already holds its maximum number of connections"""
+    pass
+
+class SendQueue:
+    """
+    Bounded outbound queue of one connection, holding already serialized frames
+    Frames with a coalesce key replace the pending frame with the same key instead of queueing behind it
+    """
+
+    def __init__(self, maxsize: int, policy: str = "drop_oldest"):
+        self.maxsize = maxsize
+        self.policy = policy
+        self._frames: "OrderedDict[Any, str]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._sequence = itertools.count()
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def put(self, frame: str, coalesce_key: Optional[str] = None) -> bool:
+        """Queue a frame without blocking; returns False if it was dropped"""
+        if coalesce_key is not None and ("key", coalesce_key) in self._frames:
+            # Keep the original position so a busy key cannot starve the rest of the queue
+            self._frames[("key", coalesce_key)] = frame
+            self.coalesced += 1
+            return True
+        if len(self._frames) >= self.maxsize:
+            self.dropped += 1
+            if self.policy == "drop_newest":
+                return False
+            self._frames.popitem(last=False)
+        key = ("key", coalesce_key) if coalesce_key is not None else ("seq", next(self._sequence))
+        self._frames[key] = frame
+        self._ready.set()
+        return True
+
+    async def get(self) -> str:
+        """Wait for the oldest pending frame"""
+        while not self._frames:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._frames.popitem(last=False)[1]
+
+@dataclass
+class Connection:
+    """One open WebSocket (a browser tab), what it is subscribed to and its outbound queue"""
+    connection_id: str
+    websocket: Any
+    user_id: Optional[str] = None
+    org_id: Optional[str] = None
+    topics: Set[str] = field(default_factory=set)
+    connected_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    queue: Optional[SendQueue] = None
+    writer: Optional[asyncio.Task] = None
+    # Monotonic time of the last frame received from the client (messages and pongs)
+    last_seen: float = field(default_factory=time.monotonic)
+    # Whether the client ever answered an app-level ping; only such clients are reaped when silent
+    answers_pings: bool = False
+
+class ConnectionManager:
+    """
+    Registry of open WebSockets with secondary indexes
+    Every lookup by user, organization or topic is a dict access; a user can hold several connections (tabs).
+    Sending only enqueues: each connection has a writer task, so a slow client never delays the caller
+    or the other recipients. A heartbeat task pings every connection and reaps the ones that answered
+    pings before and then went silent. Clients that never answer (passive tabs, older clients) are not
+    reaped: uvicorn's protocol-level pings (--ws-ping-interval/--ws-ping-timeout, 20s each by default)
+    close their socket if the peer is gone, which ends the endpoint and disconnects them.
+    """
+
+    def __init__(self,
+                 queue_size: Optional[int] = None,
+                 policy: Optional[str] = None,
+                 ping_interval: Optional[float] = None,
+                 idle_timeout: Optional[float] = None,
+                 max_per_user: Optional[int] = None,
+                 max_per_org: Optional[int] = None):
+        """
+        Initialize the registry
+
+        Args:
+            queue_size: Pending frames allowed per connection (WS_SEND_QUEUE_SIZE)
+            policy: drop_oldest or drop_newest when a queue is full (WS_SLOW_CONSUMER_POLICY)
+            ping_interval: Seconds between heartbeat pings (WS_PING_INTERVAL)
+            idle_timeout: Seconds without any client frame before a connection that answers pings is reaped (WS_IDLE_TIMEOUT)
+            max_per_user: Tabs per user; the oldest is closed when a new one connects (WS_MAX_CONNECTIONS_PER_USER)
+            max_per_org: Connections per organization; further ones are refused (WS_MAX_CONNECTIONS_PER_ORG)
+        """
+        self.queue_size = queue_size or int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+        self.policy = policy or os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+        if self.policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {self.policy}")
+        self.ping_interval = ping_interval or float(os.getenv("WS_PING_INTERVAL", "25"))
+        self.idle_timeout = idle_timeout or float(os.getenv("WS_IDLE_TIMEOUT", "120"))
+        self.max_per_user = max_per_user or int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", "5"))
+        self.max_per_org = max_per_org or int(os.getenv("WS_MAX_CONNECTIONS_PER_ORG", "500"))
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.connections: Dict[str, Connection] = {}
+        self._by_user: Dict[str, Set[str]] = {}
+        self._by_org: Dict[str, Set[str]] = {}
+        self._by_topic: Dict[str, Set[str]] = {}
+        # Connections opened without ?organization_id=; they still receive organization frames
+        self._without_org: Set[str] = set()
+        self.stats = {"connected": 0, "disconnected": 0, "serialized": 0, "enqueued": 0, "sent": 0,
+                      "send_failures": 0, "dropped": 0, "coalesced": 0,
+                      "reaped": 0, "replaced": 0, "rejected": 0}
+
+    @staticmethod
+    def _index(index: Dict[str, Set[str]], key: Optional[str], connection_id: str) -> None:
+        if key:
+            index.setdefault(key, set()).add(connection_id)
+
+    @staticmethod
+    def _unindex(index: Dict[str, Set[str]], key: Optional[str], connection_id: str) -> None:
+        members = index.get(key) if key else None
+        if members is not None:
+            members.discard(connection_id)
+            if not members:
+                del index[key]
+
+    # ------------------------------------------------------------------
+    # Registration
+    # ------------------------------------------------------------------
+
+    def connect(self,
+                websocket: Any,
+                user_id: Optional[str] = None,
+                org_id: Optional[str] = None,
+                topics: Optional[Iterable[str]] = None) -> str:
+        """
+        Register an accepted WebSocket
+
+        Args:
+            websocket: Accepted WebSocket
+            user_id: Owner of the connection
+            org_id: Organization the user belongs to
+            topics: Initial topic subscriptions
+
+        Returns:
+            Unique connection id (one per tab, so tabs of the same user never collide)
+
+        Raises:
+            ConnectionLimitExceeded: The organization is at WS_MAX_CONNECTIONS_PER_ORG
+        """
+        if org_id and len(self._by_org.get(org_id, ())) >= self.max_per_org:
+            self.stats["rejected"] += 1
+            raise ConnectionLimitExceeded(f"Organization {org_id} has {self.max_per_org} open connections")
+        if user_id:
+            # The newest tab wins: close the user's oldest connections beyond the cap
+            tabs = sorted((self.connections[cid] for cid in self._by_user.get(user_id, ())),
+                          key=lambda connection: connection.connected_at)
+            for connection in tabs[:max(0, len(tabs) - self.max_per_user + 1)]:
+                self.stats["replaced"] += 1
+                self._close(self.disconnect(connection.connection_id), CLOSE_REPLACED)
+
+        connection_id = f"user_{user_id or 'anonymous'}_{uuid.uuid4().hex[:12]}"
+        connection = Connection(
+            connection_id=connection_id,
+            websocket=websocket,
+            user_id=user_id,
+            org_id=org_id,
+            queue=SendQueue(self.queue_size, self.policy)
+        )
+        connection.writer = asyncio.create_task(self._write_loop(connection))
+        self.connections[connection_id] = connection
+        self._index(self._by_user, user_id, connection_id)
+        self._index(self._by_org, org_id, connection_id)
+        if not org_id:
+            self._without_org.add(connection_id)
+        for topic in topics or []:
+            self.subscribe(connection_id, topic)
+        self.stats["connected"] += 1
+        return connection_id
+
+    def disconnect(self, connection_id: str) -> Optional[Connection]:
+        """Remove a connection from every index (safe to call twice)"""
+        connection = self.connections.pop(connection_id, None)
+        if connection is None:
+            return None
+        self._unindex(self._by_user, connection.user_id, connection_id)
+        self._unindex(self._by_org, connection.org_id, connection_id)
+        self._without_org.discard(connection_id)
+        for topic in connection.topics:
+            self._unindex(self._by_topic, topic, connection_id)
+        if connection.writer and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        self.stats["disconnected"] += 1
+        self.stats["dropped"] += connection.queue.dropped
+        self.stats["coalesced"] += connection.queue.coalesced
+        return connection
+
+    def touch(self, connection_id: str, pong: bool = False) -> None:
+        """Record that the client sent something (any frame proves the socket is alive)"""
+        connection = self.connections.get(connection_id)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+            if pong:
+                connection.answers_pings = True
+
+    def subscribe(self, connection_id: str, topic: str) -> bool:
+        """Subscribe a connection to a topic"""
+        connection = self.connections.get(connection_id)
+        if connection is None or not topic:
+            return False
+        connection.topics.add(topic)
+        self._index(self._by_topic, topic, connection_id)
+        return True
+
+    def unsubscribe(self, connection_id: str, topic: str) -> bool:
+        """Unsubscribe a connection from a topic"""
+        connection = self.connections.get(connection_id)
+        if connection is None or topic not in connection.topics:
+            return False
+        connection.topics.discard(topic)
+        self._unindex(self._by_topic, topic, connection_id)
+        return True
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def get_connection(self, connection_id: str):
+        """WebSocket of a connection, or None"""
+        connection = self.connections.get(connection_id)
+        return connection.websocket if connection else None
+
+    def get_all_connections(self):
+        """(connection_id, websocket) pairs of every open connection"""
+        return [(connection_id, connection.websocket) for connection_id, connection in self.connections.items()]
+
+    def user_connections(self, user_id: str) -> List[str]:
+        return list(self._by_user.get(user_id, ()))
+
+    def org_connections(self, org_id: str) -> List[str]:
+        return list(self._by_org.get(org_id, ()))
+
+    def org_alert_connections(self, org_id: str) -> List[str]:
+        """Connections of an organization plus those that did not name one (alerts only reach them this way)"""
+        return list(self._by_org.get(org_id, set()) | self._without_org)
+
+    def topic_connections(self, topic: str) -> List[str]:
+        return list(self._by_topic.get(topic, ()))
+
+    def is_online(self, user_id: str) -> bool:
+        return bool(self._by_user.get(user_id))
+
+    def count_connections(self) -> int:
+        return len(self.connections)
+
+    # ------------------------------------------------------------------
+    # Delivery
+    # ------------------------------------------------------------------
+
+    async def _write_loop(self, connection: Connection) -> None:
+        """Writer task: drain the connection's queue in order"""
+        while True:
+            frame = await connection.queue.get()
+            try:
+                # The same str object is shared by every recipient of a fan-out
+                await connection.websocket.send_text(frame)
+                self.stats["sent"] += 1
+            except Exception as e:
+                # A socket that cannot be written to is gone; its endpoint will also call disconnect()
+                logger.warning(f"Dropping WebSocket {connection.connection_id} after failed send: {e}")
+                self.stats["send_failures"] += 1
+                self.disconnect(connection.connection_id)
+                return
+
+    def send(self, connection_ids: Iterable[str], message: Dict[str, Any], coalesce_key: Optional[str] = None) -> int:
+        """
+        Queue a message for connections without waiting for the sockets
+        The message is serialized once, whatever the number of recipients
+
+        Args:
+            connection_ids: Target connections
+            message: JSON frame
+            coalesce_key: Frames with the same key replace each other while still queued (e.g. progress updates)
+
+        Returns:
+            Number of connections the frame was queued for
+        """
+        targets = [self.connections[connection_id] for connection_id in connection_ids
+                   if connection_id in self.connections]
+        if not targets:
+            return 0
+        frame = encode_frame(message)
+        self.stats["serialized"] += 1
+        return self._enqueue(targets, frame, coalesce_key)
+
+    def _enqueue(self, targets: List[Connection], frame: str, coalesce_key: Optional[str]) -> int:
+        queued = sum(1 for connection in targets if connection.queue.put(frame, coalesce_key))
+        self.stats["enqueued"] += queued
+        return queued
+
+    def route_targets(self, route: str, key: Optional[str] = None) -> List[str]:
+        """Connection ids addressed by a route: user, org, org_alert or topic with a key, or all"""
+        if route == "all":
+            return list(self.connections)
+        if route == "org_alert":
+            return self.org_alert_connections(key)
+        index = {"user": self._by_user, "org": self._by_org, "topic": self._by_topic}.get(route)
+        if index is None:
+            raise ValueError(f"Unknown route: {route}")
+        return list(index.get(key, ()))
+
+    def deliver(self, route: str, key: Optional[str], frame: str, coalesce_key: Optional[str] = None) -> int:
+        """Queue an already serialized frame for the local connections of a route (used by the message bus)"""
+        targets = [self.connections[connection_id] for connection_id in self.route_targets(route, key)
+                   if connection_id in self.connections]
+        return self._enqueue(targets, frame, coalesce_key)
+
+    def send_to_user(self, user_id: str, message: Dict[str, Any], coalesce_key: Optional[str] = None) -> int:
+        """Queue for every tab of a user"""
+        return self.send(self._by_user.get(user_id, ()), message, coalesce_key)
+
+    def send_to_org(self, org_id: str, message: Dict[str, Any], coalesce_key: Optional[str] = None) -> int:
+        """Queue for every connection of an organization"""
+        return self.send(self.org_connections(org_id), message, coalesce_key)
+
+    def send_to_topic(self, topic: str, message: Dict[str, Any], coalesce_key: Optional[str] = None) -> int:
+        """Queue for every subscriber of a topic"""
+        return self.send(self._by_topic.get(topic, ()), message, coalesce_key)
+
+    def broadcast(self, message: Dict[str, Any], coalesce_key: Optional[str] = None) -> int:
+        """Queue for every open connection"""
+        return self.send(self.connections, message, coalesce_key)
+
+    # ------------------------------------------------------------------
+    # Heartbeat
+    # ------------------------------------------------------------------
+
+    def start_heartbeat(self) -> None:
+        """Start pinging and reaping in the background (call from the server's startup hook)"""
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop_heartbeat(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                self.reap_idle()
+                # One shared ping frame; a ping still queued for a slow client is not duplicated
+                self.broadcast({"type": "ping", "timestamp": datetime.now().isoformat()}, coalesce_key="ping")
+            except Exception as e:
+                logger.error(f"WebSocket heartbeat failed: {e}")
+
+    def reap_idle(self) -> int:
+        """Remove every ping-answering connection silent for longer than the idle timeout, in one pass"""
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [connection_id for connection_id, connection in self.connections.items()
+                if connection.answers_pings and connection.last_seen < deadline]
+        for connection_id in idle:
+            self._close(self.disconnect(connection_id), CLOSE_IDLE)
+        if idle:
+            self.stats["reaped"] += len(idle)
+            logger.info(f"Reaped {len(idle)} idle WebSocket connections")
+        return len(idle)
+
+    @staticmethod
+    def _close(connection: Optional[Connection], code: int) -> None:
+        """Close a removed connection's socket without waiting on it (a half-open peer may never answer)"""
+        if connection is None:
+            return
+
+        async def close():
+            try:
+                await asyncio.wait_for(connection.websocket.close(code=code), timeout=5)
+            except Exception:
+                pass
+
+        asyncio.create_task(close())
+
+    def metrics(self) -> Dict[str, Any]:
+        """Connection counts, queue depths and delivery counters"""
+        queues = [connection.queue for connection in self.connections.values()]
+        depths = [len(queue) for queue in queues]
+        # Idle: nothing heard from the client for more than one ping interval
+        quiet_since = time.monotonic() - self.ping_interval
+        idle = sum(1 for connection in self.connections.values() if connection.last_seen < quiet_since)
+        return {
+            "connections": len(self.connections),
+            "live": len(self.connections) - idle,
+            "idle": idle,
+            "users": len(self._by_user),
+            "organizations": len(self._by_org),
+            "topics": len(self._by_topic),
+            "queue_size": self.queue_size,
+            "policy": self.policy,
+            "encoder": "orjson" if orjson is not None else "json",
+            "per_message_deflate": per_message_deflate_enabled(),
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            **self.stats,
+            # Closed connections were folded into stats on disconnect
+            "dropped": self.stats["dropped"] + sum(queue.dropped for queue in queues),
+            "coalesced": self.stats["coalesced"] + sum(queue.coalesced for queue in queues)
+        }
@@ -0,0 +1,285 @@
+"""
+Conversation Log for Morvo AI Marketing Platform
+Append-only per-session chat turns with a rolling window, token budget and summary compaction
+"""
+
+from typing import Dict, List, Any, Optional, Callable, Tuple
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ROLES = ("user", "assistant", "system")
+ROLE_LABELS = {"user": "المستخدم", "assistant": "مورفو", "system": "النظام"}
+
+# Contents at least this long are stored zlib-compressed
+COMPRESS_MIN_BYTES = 256
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 UTF-8 bytes per token; Arabic comes out near 2 characters per token)"""
+    return len(text.encode("utf-8")) // 4 + 1
+
+def _encode(text: str) -> bytes:
+    raw = text.encode("utf-8")
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return b"z" + packed
+    return b"t" + raw
+
+def _decode(blob: bytes) -> str:
+    raw = blob[1:]
+    return (zlib.decompress(raw) if blob[:1] == b"z" else raw).decode("utf-8")
+
+def conversation_key(user_id: str, session_id: str) -> str:
+    """
+    Key of one user's conversation in the log
+
+    Session ids come from clients and are not unique across users, so the log is always
+    addressed by (user_id, session_id).
+    """
+    return f"{user_id}\x1f{session_id}"
+
+def extractive_summary(previous: Optional[str], turns: List[Dict[str, Any]], max_tokens: int) -> str:
+    """
+    Default summarizer: the previous summary plus the opening line of every folded turn,
+    keeping the newest lines that fit in max_tokens (no LLM call)
+    """
+    lines = previous.split("\n") if previous else []
+    # Short enough that a single line never exceeds the budget on its own
+    max_chars = min(160, max_tokens)
+    for turn in turns:
+        first_line = turn["content"].strip().split("\n", 1)[0]
+        if len(first_line) > max_chars:
+            first_line = first_line[:max_chars] + "…"
+        lines.append(f"{ROLE_LABELS.get(turn['role'], turn['role'])}: {first_line}")
+
+    kept, used = [], 0
+    for line in reversed(lines):
+        used += estimate_tokens(line)
+        if used > max_tokens:
+            break
+        kept.append(line)
+    return "\n".join(reversed(kept))
+
+class ConversationLog:
+    """
+    Chat history per session (session_id arguments are conversation_key() values)
+    Turns are appended, never rewritten; building a context reads only the turns the session
+    summary does not cover yet (at most window + compact_every, a reverse range scan on the
+    primary key). Turns that fall out of the window are folded into the summary in chunks of
+    `compact_every`.
+    """
+
+    def __init__(self,
+                 db_path: Optional[str] = None,
+                 window: Optional[int] = None,
+                 token_budget: Optional[int] = None,
+                 summary_tokens: Optional[int] = None,
+                 compact_every: Optional[int] = None,
+                 summarizer: Optional[Callable[[Optional[str], List[Dict[str, Any]], int], str]] = None):
+        """
+        Initialize the log
+
+        Args:
+            db_path: SQLite file
+            window: Recent turns always kept out of the summary
+            token_budget: Tokens a context (summary + turns) may take
+            summary_tokens: Tokens the rolling summary is kept within
+            compact_every: Turns outside the window that trigger a compaction
+            summarizer: (previous summary, folded turns, max tokens) -> new summary
+        """
+        self.db_path = db_path or os.getenv("CONVERSATION_DB", "conversations.db")
+        self.window = window or int(os.getenv("CONVERSATION_WINDOW", "20"))
+        self.token_budget = token_budget or int(os.getenv("CONVERSATION_TOKEN_BUDGET", "2000"))
+        self.summary_tokens = summary_tokens or int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "400"))
+        self.compact_every = compact_every or int(os.getenv("CONVERSATION_COMPACT_EVERY", "10"))
+        self.summarizer = summarizer or extractive_summary
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"appended": 0, "contexts": 0, "compactions": 0}
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS conversation_turns (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role INTEGER NOT NULL,
+                tokens INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                content BLOB NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS conversation_summaries (
+                session_id TEXT PRIMARY KEY,
+                upto_seq INTEGER NOT NULL,
+                tokens INTEGER NOT NULL,
+                summary TEXT NOT NULL
+            ) WITHOUT ROWID;
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get a connection for the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _summary(self, conn: sqlite3.Connection, session_id: str) -> Tuple[int, int, Optional[str]]:
+        """(upto_seq, tokens, summary) of a session, (0, 0, None) before the first compaction"""
+        row = conn.execute(
+            "SELECT upto_seq, tokens, summary FROM conversation_summaries WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row or (0, 0, None)
+
+    def append(self, session_id: str, role: str, content: str) -> int:
+        """
+        Append a turn to a session
+
+        Args:
+            session_id: Session identifier
+            role: user, assistant or system
+            content: Turn text
+
+        Returns:
+            Sequence number of the turn within the session
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Next seq from the primary key (last entry of the session's range)
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM conversation_turns WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO conversation_turns (session_id, seq, role, tokens, created_at, content) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, seq, ROLES.index(role), estimate_tokens(content), time.time(), _encode(content))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self.stats["appended"] += 1
+
+        upto_seq = self._summary(conn, session_id)[0]
+        if seq - self.window - upto_seq >= self.compact_every:
+            self.compact(session_id, seq)
+        return seq
+
+    def compact(self, session_id: str, last_seq: Optional[int] = None) -> bool:
+        """
+        Fold the turns older than the window into the session summary
+
+        Only the turns between the previous summary and the window are read.
+
+        Returns:
+            Whether anything was folded
+        """
+        conn = self._connect()
+        if last_seq is None:
+            last_seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM conversation_turns WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+        upto_seq, _, previous = self._summary(conn, session_id)
+        fold_to = last_seq - self.window
+        if fold_to <= upto_seq:
+            return False
+
+        rows = conn.execute(
+            "SELECT role, content FROM conversation_turns WHERE session_id = ? AND seq > ? AND seq <= ? ORDER BY seq",
+            (session_id, upto_seq, fold_to)
+        ).fetchall()
+        turns = [{"role": ROLES[role], "content": _decode(content)} for role, content in rows]
+        summary = self.summarizer(previous, turns, self.summary_tokens)
+        # A concurrent compaction that got further wins
+        conn.execute(
+            """INSERT INTO conversation_summaries (session_id, upto_seq, tokens, summary) VALUES (?, ?, ?, ?)
+               ON CONFLICT (session_id) DO UPDATE SET upto_seq = excluded.upto_seq,
+                   tokens = excluded.tokens, summary = excluded.summary
+               WHERE excluded.upto_seq > conversation_summaries.upto_seq""",
+            (session_id, fold_to, estimate_tokens(summary), summary)
+        )
+        with self._lock:
+            self.stats["compactions"] += 1
+        return True
+
+    def context(self, session_id: str, token_budget: Optional[int] = None,
+                before_seq: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Recent history of a session within a token budget
+
+        Args:
+            session_id: Session identifier
+            token_budget: Overrides the default budget
+            before_seq: Only turns before this one (e.g. the message being answered)
+
+        Returns:
+            {"summary": str or None, "turns": [{"role", "content"}] oldest first, "tokens": int}
+        """
+        budget = token_budget or self.token_budget
+        conn = self._connect()
+        upto_seq, summary_tokens, summary = self._summary(conn, session_id)
+        # Everything the summary does not cover yet: the window plus at most compact_every turns before it
+        rows = conn.execute(
+            "SELECT role, tokens, content FROM conversation_turns WHERE session_id = ? AND seq > ? AND seq < ? "
+            "ORDER BY seq DESC LIMIT ?",
+            (session_id, upto_seq, before_seq or 2 ** 62, self.window + self.compact_every)
+        ).fetchall()
+
+        # Newest turns first; the summary only gets what they leave over
+        turns, used = [], 0
+        for role, tokens, content in rows:
+            if used + tokens > budget:
+                if not turns:
+                    # Keep the tail of an oversized latest turn rather than nothing
+                    text = _decode(content)
+                    # ~2 characters per token for Arabic, see estimate_tokens
+                    turns.append({"role": ROLES[role], "content": "…" + text[-budget * 2:]})
+                    used = budget
+                break
+            turns.append({"role": ROLES[role], "content": _decode(content)})
+            used += tokens
+        if summary and used + summary_tokens > budget:
+            summary = None
+        elif summary:
+            used += summary_tokens
+
+        with self._lock:
+            self.stats["contexts"] += 1
+        turns.reverse()
+        return {"summary": summary, "turns": turns, "tokens": used}
+
+    def render(self, context: Dict[str, Any]) -> str:
+        """Context as prompt text (empty for a new session)"""
+        parts = []
+        if context.get("summary"):
+            parts.append(f"ملخص ما سبق:\n{context['summary']}")
+        for turn in context.get("turns", []):
+            parts.append(f"{ROLE_LABELS.get(turn['role'], turn['role'])}: {turn['content']}")
+        return "\n".join(parts)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Counters"""
+        with self._lock:
+            return dict(self.stats)
+
+_conversation_log: Optional[ConversationLog] = None
+_conversation_log_lock = threading.Lock()
+
+def get_conversation_log() -> ConversationLog:
+    """Get the process-wide conversation log, creating it on first use"""
+    global _conversation_log
+    if _conversation_log is None:
+        with _conversation_log_lock:
+            if _conversation_log is None:
+                _conversation_log = ConversationLog()
+                logger.info(f"Conversation log at {_conversation_log.db_path}")
+    return _conversation_log
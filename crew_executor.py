@@ -0,0 +1,134 @@
+"""
+Crew Executor for Morvo AI Marketing Platform
+Runs blocking CrewAI kickoffs on a bounded worker pool so the event loop stays responsive
+"""
+
+from typing import Dict, Any, Callable, Optional
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class CrewExecutionTimeout(Exception):
+    """Raised when a crew job does not finish within its timeout"""
+    pass
+
+class CrewExecutor:
+    """
+    Bounded worker pool for synchronous crew.kickoff() calls
+    Async callers submit jobs and await results without blocking the event loop
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, default_timeout: Optional[float] = None):
+        """Initialize the pool from arguments or environment variables"""
+        self.max_workers = max_workers or int(os.getenv("CREW_EXECUTOR_WORKERS", "4"))
+        if default_timeout is None:
+            default_timeout = float(os.getenv("CREW_JOB_TIMEOUT_SECONDS", "600"))
+        # A non-positive timeout disables the limit
+        self.default_timeout = default_timeout if default_timeout > 0 else None
+
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="crew-worker"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "total_run_seconds": 0.0
+        }
+
+    def _invoke(self, func: Callable, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        """Run a job on a worker thread and keep the counters in sync"""
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+            with self._lock:
+                self.stats["completed"] += 1
+            return result
+        except Exception:
+            with self._lock:
+                self.stats["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self.stats["total_run_seconds"] += time.monotonic() - started
+
+    def _on_done(self, future) -> None:
+        """Release the queue slot of jobs cancelled before a worker picked them up"""
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run a blocking callable on the pool and await its result
+
+        Args:
+            func: Blocking callable, usually crew.kickoff
+            *args: Positional arguments for the callable
+            timeout: Seconds to wait before giving up, defaults to the executor timeout
+            **kwargs: Keyword arguments for the callable
+
+        Returns:
+            Whatever the callable returns
+        """
+        with self._lock:
+            self._queued += 1
+            self.stats["submitted"] += 1
+
+        future = self._pool.submit(self._invoke, func, args, kwargs)
+        future.add_done_callback(self._on_done)
+
+        job_timeout = timeout if timeout is not None else self.default_timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), job_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.stats["timed_out"] += 1
+            # A job that already started keeps its worker until it returns
+            future.cancel()
+            logger.error(f"Crew job {getattr(func, '__qualname__', func)} timed out after {job_timeout}s")
+            raise CrewExecutionTimeout(f"Crew job timed out after {job_timeout} seconds")
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return queue depth and job counters"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                **self.stats,
+                "total_run_seconds": round(self.stats["total_run_seconds"], 3)
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop accepting jobs and release the worker threads"""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+_crew_executor: Optional[CrewExecutor] = None
+_crew_executor_lock = threading.Lock()
+
+def get_crew_executor() -> CrewExecutor:
+    """Get the process-wide crew executor, creating it on first use"""
+    global _crew_executor
+    if _crew_executor is None:
+        with _crew_executor_lock:
+            if _crew_executor is None:
+                _crew_executor = CrewExecutor()
+                logger.info(f"Crew executor started with {_crew_executor.max_workers} workers")
+    return _crew_executor
@@ -0,0 +1,443 @@
+"""
+Crew Job Queue for Morvo AI Marketing Platform
+Durable SQLite-backed queue for long-running crew jobs with status, results, progress and cancellation
+"""
+
+from typing import Dict, List, Any, Callable, Awaitable, Optional
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from startup_profiler import deferred_import
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINAL_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled"""
+    pass
+
+class CrewJobStore:
+    """
+    SQLite storage for crew jobs
+    Safe to share between processes; claiming a job is a single write transaction
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_attempts: Optional[int] = None):
+        """Open (and create if needed) the job database"""
+        self.db_path = db_path or os.getenv("CREW_JOBS_DB", "crew_jobs.db")
+        self.max_attempts = max_attempts or int(os.getenv("CREW_JOBS_MAX_ATTEMPTS", "3"))
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get a connection for the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        """Create tables and indexes"""
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS crew_jobs (
+                id TEXT PRIMARY KEY,
+                job_type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                user_id TEXT,
+                organization_id TEXT,
+                progress TEXT NOT NULL DEFAULT '[]',
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                worker_id TEXT,
+                lease_expires_at REAL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_crew_jobs_status_created
+                ON crew_jobs (status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_crew_jobs_org
+                ON crew_jobs (organization_id, created_at);
+        """)
+        # Databases created before max_attempts existed
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(crew_jobs)")}
+        if "max_attempts" not in columns:
+            conn.execute("ALTER TABLE crew_jobs ADD COLUMN max_attempts INTEGER NOT NULL DEFAULT 3")
+
+    def _row_to_job(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        """Convert a database row to a job dict"""
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["progress"] = json.loads(job["progress"] or "[]")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def enqueue(self,
+                job_type: str,
+                payload: Dict[str, Any],
+                user_id: Optional[str] = None,
+                organization_id: Optional[str] = None) -> str:
+        """Add a job to the queue and return its id"""
+        job_id = f"job_{uuid.uuid4().hex}"
+        self._connect().execute(
+            """INSERT INTO crew_jobs (id, job_type, payload, status, user_id, organization_id,
+                                      max_attempts, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (job_id, job_type, json.dumps(payload, ensure_ascii=False), JOB_QUEUED,
+             user_id, organization_id, self.max_attempts, time.time())
+        )
+        return job_id
+
+    def claim(self, worker_id: str, job_types: List[str], lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        Claim the oldest runnable job for a worker
+
+        Jobs whose lease expired (their worker died or the server restarted) are runnable again
+        until they have used up max_attempts; see fail_exhausted.
+
+        Args:
+            worker_id: Identifier of the claiming worker
+            job_types: Job types this worker has handlers for
+            lease_seconds: How long the claim is valid without renewal
+
+        Returns:
+            The claimed job, or None if nothing is runnable
+        """
+        if not job_types:
+            return None
+
+        conn = self._connect()
+        now = time.time()
+        placeholders = ",".join("?" for _ in job_types)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"""SELECT id FROM crew_jobs
+                    WHERE job_type IN ({placeholders})
+                      AND (status = ? OR (status = ? AND lease_expires_at < ? AND attempts < max_attempts))
+                    ORDER BY created_at
+                    LIMIT 1""",
+                (*job_types, JOB_QUEUED, JOB_RUNNING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            # A retried job reports its progress afresh, so drop what the lost attempt stored
+            conn.execute(
+                """UPDATE crew_jobs
+                   SET status = ?, worker_id = ?, lease_expires_at = ?,
+                       started_at = COALESCE(started_at, ?), attempts = attempts + 1, progress = '[]'
+                   WHERE id = ?""",
+                (JOB_RUNNING, worker_id, now + lease_seconds, now, row["id"])
+            )
+            job = conn.execute("SELECT * FROM crew_jobs WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+            return self._row_to_job(job)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def fail_exhausted(self) -> List[Dict[str, Any]]:
+        """
+        Fail running jobs whose lease expired on their last allowed attempt
+
+        Such a job lost its worker max_attempts times in a row (typically it crashes the
+        process), so it is not handed out again.
+
+        Returns:
+            The jobs marked failed
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """SELECT * FROM crew_jobs
+                   WHERE status = ? AND lease_expires_at < ? AND attempts >= max_attempts""",
+                (JOB_RUNNING, now)
+            ).fetchall()
+            for row in rows:
+                conn.execute(
+                    """UPDATE crew_jobs SET status = ?, error = ?, finished_at = ?, lease_expires_at = NULL
+                       WHERE id = ?""",
+                    (JOB_FAILED, f"Worker lost after {row['attempts']} attempts", now, row["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [{**self._row_to_job(row), "status": JOB_FAILED} for row in rows]
+
+    def renew_lease(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extend the lease of a running job; False if the job is no longer ours"""
+        cursor = self._connect().execute(
+            "UPDATE crew_jobs SET lease_expires_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+            (time.time() + lease_seconds, job_id, worker_id, JOB_RUNNING)
+        )
+        return cursor.rowcount == 1
+
+    def add_progress(self, job_id: str, event: Dict[str, Any]) -> None:
+        """Append a progress event to a job"""
+        self._connect().execute(
+            "UPDATE crew_jobs SET progress = json_insert(progress, '$[#]', json(?)) WHERE id = ?",
+            (json.dumps(event, ensure_ascii=False), job_id)
+        )
+
+    def finish(self,
+               job_id: str,
+               status: str,
+               result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> bool:
+        """Record the final state of a running job; False if it was cancelled meanwhile"""
+        cursor = self._connect().execute(
+            """UPDATE crew_jobs
+               SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires_at = NULL
+               WHERE id = ? AND status = ?""",
+            (status, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+             error, time.time(), job_id, JOB_RUNNING)
+        )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job"""
+        cursor = self._connect().execute(
+            """UPDATE crew_jobs SET status = ?, finished_at = ?, lease_expires_at = NULL
+               WHERE id = ? AND status IN (?, ?)""",
+            (JOB_CANCELLED, time.time(), job_id, JOB_QUEUED, JOB_RUNNING)
+        )
+        return cursor.rowcount == 1
+
+    def get_status(self, job_id: str) -> Optional[str]:
+        """Get only the status of a job"""
+        row = self._connect().execute("SELECT status FROM crew_jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by id"""
+        row = self._connect().execute("SELECT * FROM crew_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Count jobs per status"""
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) AS n FROM crew_jobs GROUP BY status"
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+# Handler signature: (payload, report_progress) -> result dict
+JobHandler = Callable[[Dict[str, Any], Callable[[Dict[str, Any]], None]], Awaitable[Dict[str, Any]]]
+# Notifier signature: (job, event) -> None
+JobNotifier = Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[None]]
+
+class CrewJobQueue:
+    """
+    Runs jobs from a CrewJobStore with registered handlers
+    Every process that calls start() becomes a worker for the shared database
+    """
+
+    def __init__(self, store: Optional[CrewJobStore] = None):
+        """Initialize the queue with a store and worker settings"""
+        self.store = store or CrewJobStore()
+        self.handlers: Dict[str, JobHandler] = {}
+        self.notifier: Optional[JobNotifier] = None
+        self.concurrency = int(os.getenv("CREW_JOBS_CONCURRENCY", "2"))
+        self.poll_interval = float(os.getenv("CREW_JOBS_POLL_SECONDS", "1.0"))
+        self.lease_seconds = float(os.getenv("CREW_JOBS_LEASE_SECONDS", "120"))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._workers: List[asyncio.Task] = []
+        self._running_jobs: Dict[str, asyncio.Task] = {}
+
+    def register_handler(self, job_type: str, handler: JobHandler):
+        """Register the coroutine that runs jobs of a given type"""
+        self.handlers[job_type] = handler
+        logger.info(f"Registered crew job handler: {job_type}")
+
+    def set_notifier(self, notifier: JobNotifier):
+        """Set the coroutine that pushes job events to clients"""
+        self.notifier = notifier
+
+    async def submit(self,
+                     job_type: str,
+                     payload: Dict[str, Any],
+                     user_id: Optional[str] = None,
+                     organization_id: Optional[str] = None) -> str:
+        """Enqueue a job and return its id"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        return await asyncio.to_thread(self.store.enqueue, job_type, payload, user_id, organization_id)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job with its progress and result"""
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a job; a running job stops at its next progress report"""
+        cancelled = await asyncio.to_thread(self.store.cancel, job_id)
+        if cancelled:
+            job = await self.get(job_id)
+            await self._notify(job, {"type": "job_cancelled", "job_id": job_id})
+        return cancelled
+
+    async def start(self):
+        """Start the worker tasks in this process"""
+        if self._workers:
+            return
+        for i in range(self.concurrency):
+            self._workers.append(asyncio.create_task(self._worker_loop(i)))
+        logger.info(f"Crew job queue started: {self.concurrency} workers, db={self.store.db_path}")
+
+    async def stop(self):
+        """Stop the worker tasks; running jobs are picked up again after their lease expires"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return job counts and local worker state"""
+        return {
+            "worker_id": self.worker_id,
+            "workers": len(self._workers),
+            "running_here": len(self._running_jobs),
+            "jobs": self.store.count_by_status()
+        }
+
+    async def _notify(self, job: Optional[Dict[str, Any]], event: Dict[str, Any]):
+        """Forward a job event to the notifier, never failing the job"""
+        if not self.notifier or not job:
+            return
+        try:
+            await self.notifier(job, event)
+        except Exception as e:
+            logger.error(f"Error notifying job event {event.get('type')}: {e}")
+
+    async def _worker_loop(self, index: int):
+        """Claim and run jobs until cancelled"""
+        worker_id = f"{self.worker_id}:{index}"
+        while True:
+            try:
+                for failed in await asyncio.to_thread(self.store.fail_exhausted):
+                    logger.error(f"Crew job {failed['id']} failed: worker lost after {failed['attempts']} attempts")
+                    await self._notify(failed, {"type": "job_failed", "job_id": failed["id"],
+                                                "error": "Worker lost too many times"})
+                job = await asyncio.to_thread(
+                    self.store.claim, worker_id, list(self.handlers.keys()), self.lease_seconds
+                )
+                if job is None:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                await self._run_job(job, worker_id)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Crew job worker {worker_id} error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _keep_lease(self, job_id: str, worker_id: str):
+        """Renew the job lease while it runs"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await asyncio.to_thread(self.store.renew_lease, job_id, worker_id, self.lease_seconds)
+
+    async def _run_job(self, job: Dict[str, Any], worker_id: str):
+        """Run one claimed job and record its outcome"""
+        job_id = job["id"]
+        loop = asyncio.get_running_loop()
+
+        async def record_progress(event: Dict[str, Any]):
+            await asyncio.to_thread(self.store.add_progress, job_id, event)
+            await self._notify(job, {"type": "job_progress", "job_id": job_id, **event})
+
+        def report_progress(event: Dict[str, Any]):
+            # Called from crew worker threads as tasks finish
+            event = {**event, "timestamp": time.time()}
+            if self.store.get_status(job_id) == JOB_CANCELLED:
+                raise JobCancelled(job_id)
+            asyncio.run_coroutine_threadsafe(record_progress(event), loop)
+
+        await self._notify(job, {"type": "job_started", "job_id": job_id, "attempt": job["attempts"]})
+        lease_task = asyncio.create_task(self._keep_lease(job_id, worker_id))
+        self._running_jobs[job_id] = lease_task
+        try:
+            result = await self.handlers[job["job_type"]](job["payload"], report_progress)
+            if await asyncio.to_thread(self.store.finish, job_id, JOB_COMPLETED, result):
+                await self._notify(job, {"type": "job_completed", "job_id": job_id, "result": result})
+        except JobCancelled:
+            logger.info(f"Crew job {job_id} stopped after cancellation")
+        except Exception as e:
+            logger.error(f"Crew job {job_id} failed: {e}")
+            if await asyncio.to_thread(self.store.finish, job_id, JOB_FAILED, None, str(e)):
+                await self._notify(job, {"type": "job_failed", "job_id": job_id, "error": str(e)})
+        finally:
+            lease_task.cancel()
+            self._running_jobs.pop(job_id, None)
+
+_crew_job_queue: Optional[CrewJobQueue] = None
+
+def get_crew_job_queue() -> CrewJobQueue:
+    """Get the process-wide crew job queue, creating it on first use"""
+    global _crew_job_queue
+    if _crew_job_queue is None:
+        _crew_job_queue = CrewJobQueue()
+    return _crew_job_queue
+
+# The scraper pulls in crewai, crewai_tools, bs4 and aiohttp; it is only imported by the first job
+_website_scraper = deferred_import("morvo_website_scraper")
+
+async def run_website_analysis_job(payload: Dict[str, Any],
+                                   report_progress: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """website_analysis handler; imports the scraper off the event loop on first use"""
+    handler = await asyncio.to_thread(getattr, _website_scraper, "run_website_analysis_job")
+    return await handler(payload, report_progress)
+
+def register_default_handlers(queue: CrewJobQueue):
+    """Register the built-in crew job handlers (without importing what they run)"""
+    queue.register_handler("website_analysis", run_website_analysis_job)
+
+if __name__ == "__main__":
+    # Standalone worker process: python crew_jobs.py
+    logging.basicConfig(level=logging.INFO)
+
+    async def run_worker():
+        from job_events import job_event_notifier
+        from message_bus import create_message_bus
+
+        # Publish-only bus: with WS_BUS_BACKEND=unix/postgres events reach the API workers' sockets
+        bus = create_message_bus()
+        await bus.start()
+        await bus.wait_connected()
+
+        queue = get_crew_job_queue()
+        register_default_handlers(queue)
+        queue.set_notifier(job_event_notifier(bus))
+        await queue.start()
+        await asyncio.Event().wait()
+
+    asyncio.run(run_worker())
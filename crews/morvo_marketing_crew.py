@@ -9,6 +9,8 @@ import os
 from datetime import datetime
 from agents.morvo_marketing_agents import MorvoMarketingAgents
 from tasks.morvo_marketing_tasks import MorvoMarketingTasks
+from task_graph import TaskGraph
+from llm_cache import get_llm_cache
 
 class MorvoMarketingCrew:
     """
@@ -39,7 +41,7 @@ class MorvoMarketingCrew:
             memory=True
         )
         
-        result = crew.kickoff()
+        result = get_llm_cache().kickoff(crew)
         filename = self.save_result(result, "m1_strategic_analysis")
         return f"Strategic analysis completed and saved to {filename}"
     
@@ -55,7 +57,7 @@ class MorvoMarketingCrew:
             memory=True
         )
         
-        result = crew.kickoff()
+        result = get_llm_cache().kickoff(crew)
         filename = self.save_result(result, "m2_social_monitoring")
         return f"Social media monitoring completed and saved to {filename}"
     
@@ -71,7 +73,7 @@ class MorvoMarketingCrew:
             memory=True
         )
         
-        result = crew.kickoff()
+        result = get_llm_cache().kickoff(crew)
         filename = self.save_result(result, "m3_campaign_optimization")
         return f"Campaign optimization completed and saved to {filename}"
     
@@ -87,7 +89,7 @@ class MorvoMarketingCrew:
             memory=True
         )
         
-        result = crew.kickoff()
+        result = get_llm_cache().kickoff(crew)
         filename = self.save_result(result, "m4_content_strategy")
         return f"Content strategy completed and saved to {filename}"
     
@@ -103,7 +105,7 @@ class MorvoMarketingCrew:
             memory=True
         )
         
-        result = crew.kickoff()
+        result = get_llm_cache().kickoff(crew)
         filename = self.save_result(result, "m5_data_analytics")
         return f"Data analytics completed and saved to {filename}"
     
@@ -129,7 +131,7 @@ class MorvoMarketingCrew:
             memory=True
         )
         
-        result = crew.kickoff()
+        result = get_llm_cache().kickoff(crew)
         filename = self.save_result(result, "market_analysis_crew")
         return f"Market analysis crew completed and saved to {filename}"
     
@@ -155,7 +157,7 @@ class MorvoMarketingCrew:
             memory=True
         )
         
-        result = crew.kickoff()
+        result = get_llm_cache().kickoff(crew)
         filename = self.save_result(result, "content_social_crew")
         return f"Content and social crew completed and saved to {filename}"
     
@@ -184,7 +186,7 @@ class MorvoMarketingCrew:
             memory=True
         )
         
-        result = crew.kickoff()
+        result = get_llm_cache().kickoff(crew)
         filename = self.save_result(result, "campaign_execution_crew")
         return f"Campaign execution crew completed and saved to {filename}"
     
@@ -195,39 +197,50 @@ class MorvoMarketingCrew:
         Run Complete Marketing Automation with all 5 agents (M1-M5)
         The ultimate workflow for comprehensive marketing automation
         """
-        # All 5 agents in the marketing automation workflow
-        all_agents = [
-            self.agents.m1_strategic_manager_agent(),    # Strategic Analysis
-            self.agents.m4_content_manager_agent(),      # Content Strategy
-            self.agents.m2_social_media_manager_agent(), # Social Media Monitoring
-            self.agents.m5_data_manager_agent()          # Data Analytics
-        ]
-        
-        # Core tasks for complete automation
-        all_tasks = [
-            self.tasks.m1_strategic_analysis_task(company_info),
-            self.tasks.m4_content_strategy_task(company_info),
-            self.tasks.m2_social_monitoring_task(company_info),
-            self.tasks.m5_data_analytics_task()
-        ]
+        # Core tasks for complete automation; each task carries its own agent
+        tasks = {
+            "m1": self.tasks.m1_strategic_analysis_task(company_info),
+            "m2": self.tasks.m2_social_monitoring_task(company_info),
+            "m4": self.tasks.m4_content_strategy_task(company_info),
+            "m5": self.tasks.m5_data_analytics_task()
+        }
+        dependencies = {
+            "m4": ["m1", "m2"]  # Content strategy builds on strategy and social insights
+        }
         
         # Add campaign optimization if campaign info is provided
         if campaign_info:
-            all_agents.append(self.agents.m3_campaign_manager_agent())
-            all_tasks.append(self.tasks.m3_campaign_optimization_task(campaign_info))
+            tasks["m3"] = self.tasks.m3_campaign_optimization_task(campaign_info)
+            dependencies["m3"] = ["m1", "m5"]  # Campaign optimization builds on strategy and analytics
         
-        crew = Crew(
-            agents=all_agents,
-            tasks=all_tasks,
-            process=Process.sequential,
-            verbose=True,
-            memory=True,
-            max_rpm=100  # Rate limiting for API calls
-        )
+        # M1, M2 and M5 run concurrently; M3/M4 start once their context tasks finish
+        graph = TaskGraph()
+        for name, task in tasks.items():
+            depends_on = dependencies.get(name, [])
+            task.context = [tasks[d] for d in depends_on]
+            graph.add(name, self._single_task_runner(task), depends_on=depends_on)
         
-        result = crew.kickoff()
+        run = graph.run_sync()
+        result = {name: node["result"] for name, node in run["results"].items()}
         filename = self.save_result(result, "complete_marketing_automation")
-        return f"Complete marketing automation completed and saved to {filename}"
+        return (f"Complete marketing automation completed in {run['wall_seconds']}s "
+                f"(critical path {run['critical_path_seconds']}s) and saved to {filename}")
+    
+    def _single_task_runner(self, task):
+        """
+        Build a task graph node that kicks off a one-task crew
+        """
+        def run(upstream):
+            crew = Crew(
+                agents=[task.agent],
+                tasks=[task],
+                process=Process.sequential,
+                verbose=True,
+                memory=True,
+                max_rpm=100  # Rate limiting for API calls
+            )
+            return get_llm_cache().kickoff(crew)
+        return run
     
     def save_result(self, result: Any, operation_name: str) -> str:
         """
@@ -237,7 +250,9 @@ class MorvoMarketingCrew:
         filename = f"{self.results_directory}/{operation_name}_{timestamp}.json"
         
         # Convert result to string if it's not already
-        if hasattr(result, 'raw'):
+        if isinstance(result, dict):
+            result_data = {name: getattr(value, 'raw', str(value)) for name, value in result.items()}
+        elif hasattr(result, 'raw'):
             result_data = result.raw
         else:
             result_data = str(result)
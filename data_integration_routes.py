@@ -11,6 +11,7 @@ import logging
 from datetime import datetime, timedelta
 import json
 import os
+import time
 
 # Import Morvo components
 from external_data_base import ExternalDataManager, DataSourceConfig, ExternalDataResult
@@ -71,9 +72,29 @@ data_manager = ExternalDataManager()
 alert_system = SmartAlertSystem()
 context_manager = AgentContextManager()
 
+# Score every fresh GA4/Brand24 series against the streaming anomaly detector
+data_manager.add_result_listener(alert_system.observe_external_data)
+
 # Background tasks
 refresh_tasks = {}
+# company_id -> alert check registration, all served by one batch loop
 alert_check_tasks = {}
+alert_check_loop: Optional[asyncio.Task] = None
+alert_check_wakeup = asyncio.Event()
+# company_id -> {rule: monotonic time of the first context update not yet evaluated}
+alert_pending_rules: Dict[str, Dict[str, float]] = {}
+# Context updates arriving within this many seconds are evaluated together
+ALERT_EVENT_DEBOUNCE = float(os.getenv("ALERT_EVENT_DEBOUNCE_SECONDS", "5"))
+
+def mark_rules_dirty(company_id: str, rules: List[str]):
+    """Queue an evaluation of the given rules for a company whose alert checking is on"""
+    if company_id not in alert_check_tasks or not rules:
+        return
+    pending = alert_pending_rules.setdefault(company_id, {})
+    now = time.monotonic()
+    for rule in rules:
+        pending.setdefault(rule, now)
+    alert_check_wakeup.set()
 
 # API Key validation
 async def get_api_key(api_key_header: str = Security(api_key_header)):
@@ -125,31 +146,83 @@ async def initialize_sources():
             raise
 
 # Background task for alert checking
-async def check_alerts_background(company_id: str, alert_types: List[str], interval_minutes: int):
-    """Background task to check for alerts periodically"""
-    while True:
+async def check_alerts_background():
+    """
+    Background task checking registered companies in batches
+    
+    A company whose interval elapsed runs every rule; in between, agent context updates
+    (/context/sync, /context/push) re-run just the rules reading the updated keys, as soon
+    as the debounce window has passed.
+    """
+    while alert_check_tasks:
         try:
-            # Check for opportunities
-            opportunities = await alert_system.check_all_opportunities(company_id)
+            alert_check_wakeup.clear()
+            now = time.monotonic()
             
-            # Filter by alert types if specified
-            if alert_types:
-                opportunities = [o for o in opportunities if o.get("alert_type") in alert_types]
-                
-            # Store alerts that were found
-            for opportunity in opportunities:
-                await alert_system.store_alert(opportunity)
+            # Rule set (None for all) -> companies to run it for
+            runs: Dict[Optional[frozenset], List[str]] = {}
+            for company_id, entry in alert_check_tasks.items():
+                pending = alert_pending_rules.get(company_id)
+                if entry["next_check"] <= now:
+                    runs.setdefault(None, []).append(company_id)
+                    alert_pending_rules.pop(company_id, None)
+                elif pending and min(pending.values()) + ALERT_EVENT_DEBOUNCE <= now:
+                    runs.setdefault(frozenset(pending), []).append(company_id)
+                    del alert_pending_rules[company_id]
+            
+            if runs:
+                alerts = []
+                for rules, company_ids in runs.items():
+                    found = await alert_system.check_opportunities_batch(
+                        company_ids, rules=None if rules is None else list(rules)
+                    )
+                    
+                    for company_id in company_ids:
+                        entry = alert_check_tasks.get(company_id)
+                        if entry is None:  # Stopped while the batch ran
+                            continue
+                        company_alerts = found.get(company_id, [])
+                        
+                        # Filter by alert types if specified
+                        if entry["alert_types"]:
+                            company_alerts = [a for a in company_alerts if a.get("alert_type") in entry["alert_types"]]
+                        alerts.extend(company_alerts)
+                        
+                        if rules is None:
+                            entry["next_check"] = now + entry["interval_minutes"] * 60
+                        entry["last_check"] = datetime.utcnow().isoformat()
                 
-            # Wait for next check
-            await asyncio.sleep(interval_minutes * 60)
+                # Store alerts that were found
+                stored = await alert_system.store_alerts(alerts)
+                scheduled = len(runs.get(None, []))
+                logger.info(f"Alert check covered {scheduled} scheduled and "
+                            f"{sum(len(c) for c in runs.values()) - scheduled} updated companies, stored {stored} alerts")
             
+            # Wait for the next company to fall due or updated data to settle (or for a registration change)
+            if alert_check_tasks:
+                next_check = min(
+                    [entry["next_check"] for entry in alert_check_tasks.values()] +
+                    [min(pending.values()) + ALERT_EVENT_DEBOUNCE for pending in alert_pending_rules.values() if pending]
+                )
+                try:
+                    await asyncio.wait_for(alert_check_wakeup.wait(), timeout=max(0.0, next_check - time.monotonic()))
+                except asyncio.TimeoutError:
+                    pass
+                    
         except asyncio.CancelledError:
-            logger.info(f"Alert check task for company {company_id} cancelled")
+            logger.info("Alert check task cancelled")
             break
         except Exception as e:
-            logger.error(f"Error in alert check task for company {company_id}: {e}")
+            logger.error(f"Error in alert check task: {e}")
             await asyncio.sleep(300)  # 5 minutes on error
 
+def ensure_alert_check_loop():
+    """Start the shared alert check task if it is not running, and wake it"""
+    global alert_check_loop
+    if alert_check_loop is None or alert_check_loop.done():
+        alert_check_loop = asyncio.create_task(check_alerts_background())
+    alert_check_wakeup.set()
+
 # Routes
 @data_integration_router.get("/status", response_model=IntegrationStatusResponse)
 async def get_integration_status(api_key: str = Depends(get_api_key)):
@@ -353,37 +426,20 @@ async def start_alert_checking(
 ):
     """Start background alert checking for a company"""
     try:
-        # Stop any existing alert check task
-        if config.company_id in alert_check_tasks:
-            task = alert_check_tasks[config.company_id]["task"]
-            if not task.done():
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
-        
         # Apply threshold overrides if any
         if config.threshold_overrides:
             for alert_type, thresholds in config.threshold_overrides.items():
                 if alert_type in alert_system.alert_thresholds:
                     alert_system.alert_thresholds[alert_type].update(thresholds)
         
-        # Start new background task
-        task = asyncio.create_task(
-            check_alerts_background(
-                company_id=config.company_id,
-                alert_types=config.alert_types,
-                interval_minutes=config.check_interval_minutes
-            )
-        )
-        
+        # Register (or replace) the company; the shared task checks it right away
         alert_check_tasks[config.company_id] = {
-            "task": task,
             "started_at": datetime.utcnow().isoformat(),
             "interval_minutes": config.check_interval_minutes,
-            "alert_types": config.alert_types
+            "alert_types": config.alert_types,
+            "next_check": 0.0
         }
+        ensure_alert_check_loop()
         
         return {
             "status": "success",
@@ -404,15 +460,10 @@ async def stop_alert_checking(
     """Stop background alert checking for a company"""
     if company_id in alert_check_tasks:
         try:
-            task = alert_check_tasks[company_id]["task"]
-            if not task.done():
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
-                    
             del alert_check_tasks[company_id]
+            alert_pending_rules.pop(company_id, None)
+            # The shared task exits by itself once no company is left
+            alert_check_wakeup.set()
             
             return {
                 "status": "success",
@@ -495,6 +546,7 @@ async def synchronize_context(
             company_id=company_id,
             context_data=context_data
         )
+        mark_rules_dirty(company_id, alert_system.rules_for_context(list(context_data)))
         
         return {
             "status": "success",
@@ -524,6 +576,7 @@ async def push_context_update(
             company_id=company_id,
             context_data=context_data
         )
+        mark_rules_dirty(company_id, alert_system.rules_for_context(list(context_data)))
         
         return {
             "status": "success",
@@ -3,16 +3,20 @@ External Data Integration Base Module for Morvo AI Marketing Platform
 Provides abstract base classes and utilities for external data source integration
 """
 
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, Callable, Awaitable
 import asyncio
 import logging
 from datetime import datetime, timedelta
 import json
 import os
 from abc import ABC, abstractmethod
-import aiohttp
 from pydantic import BaseModel
 
+from startup_profiler import deferred_import
+
+# aiohttp is only needed once a data source makes its first request
+aiohttp = deferred_import("aiohttp")
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -179,6 +183,24 @@ class ExternalDataManager:
         self.sources: Dict[str, ExternalDataSource] = {}
         self.data_cache: Dict[str, Dict[str, ExternalDataResult]] = {}
         self.refresh_tasks = {}
+        self.result_listeners: List[Callable[[str, ExternalDataResult], Awaitable[Any]]] = []
+        
+    def add_result_listener(self, listener: Callable[[str, ExternalDataResult], Awaitable[Any]]):
+        """
+        Register a coroutine called with (company_id, result) for every freshly fetched result
+        Cached results are not re-announced
+        """
+        self.result_listeners.append(listener)
+        
+    async def _notify_result(self, company_id: Optional[str], result: ExternalDataResult):
+        """Hand a fresh result to the listeners; a failing listener never fails the fetch"""
+        if not company_id or result.status != "success":
+            return
+        for listener in self.result_listeners:
+            try:
+                await listener(company_id, result)
+            except Exception as e:
+                logger.error(f"Result listener failed for {result.source}/{result.data_type}: {e}")
         
     def register_source(self, source: ExternalDataSource):
         """Register a data source"""
@@ -251,6 +273,8 @@ class ExternalDataManager:
             # Update cache
             self.data_cache[source_name][cache_key] = result
             
+            await self._notify_result(params.get("company_id"), result)
+            
             return result
             
         except Exception as e:
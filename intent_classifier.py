@@ -0,0 +1,325 @@
+"""
+Intent Classifier for Morvo AI Marketing Platform
+Offline char n-gram hashing + linear (softmax) model in NumPy, trained from labeled chat logs
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import zlib
+
+import numpy as np
+
+from intent_engine import IntentMatch, normalize_arabic
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_FEATURES = 2 ** 16
+DEFAULT_NGRAMS = (2, 4)
+
+def load_examples(path: str) -> List[Tuple[str, str]]:
+    """
+    Read labeled chat messages from JSONL
+
+    Each line needs the message in "text" (or "content") and the label in "intent" (or "label").
+    """
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            text = record.get("text") or record.get("content")
+            intent = record.get("intent") or record.get("label")
+            if not text or not intent:
+                logger.warning(f"{path}:{line_number}: skipping record without text/intent")
+                continue
+            examples.append((text, intent))
+    return examples
+
+class IntentClassifier:
+    """
+    Multinomial logistic regression over hashed character n-grams
+    Inference is a gather-and-sum over weight rows, so a batch costs one NumPy call per step
+    """
+
+    def __init__(self,
+                 labels: List[str],
+                 weights: np.ndarray,
+                 bias: np.ndarray,
+                 ngram_range: Tuple[int, int] = DEFAULT_NGRAMS):
+        """Wrap trained parameters; weights has shape (n_features, n_labels)"""
+        self.labels = list(labels)
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.n_features = weights.shape[0]
+        self.ngram_range = tuple(ngram_range)
+
+    # ------------------------------------------------------------------
+    # Features
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _hash_ngrams(text: str, n_features: int, ngram_range: Tuple[int, int]) -> List[int]:
+        """Hash the character n-grams of a normalized, space-padded message"""
+        padded = f" {normalize_arabic(text)} "
+        indices = []
+        low, high = ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(padded) - n + 1):
+                # crc32 is stable across processes, unlike hash()
+                indices.append(zlib.crc32(padded[i:i + n].encode("utf-8")) % n_features)
+        return indices
+
+    @classmethod
+    def _featurize(cls, texts: List[str], n_features: int,
+                   ngram_range: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sparse batch features
+
+        Returns:
+            (indices, values, offsets): flat feature indices, their L2-normalized values
+            and the start offset of each message
+        """
+        all_indices: List[int] = []
+        values: List[float] = []
+        offsets: List[int] = []
+        for text in texts:
+            indices = cls._hash_ngrams(text, n_features, ngram_range) or [0]
+            offsets.append(len(all_indices))
+            all_indices.extend(indices)
+            values.extend([1.0 / np.sqrt(len(indices))] * len(indices))
+        return (np.asarray(all_indices, dtype=np.int64),
+                np.asarray(values, dtype=np.float32),
+                np.asarray(offsets, dtype=np.int64))
+
+    @staticmethod
+    def _logits(weights: np.ndarray, bias: np.ndarray, indices: np.ndarray,
+                values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Sum the weighted weight rows of every message"""
+        rows = weights[indices] * values[:, None]
+        return np.add.reduceat(rows, offsets, axis=0) + bias
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return shifted / shifted.sum(axis=1, keepdims=True)
+
+    # ------------------------------------------------------------------
+    # Training
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def train(cls,
+              examples: List[Tuple[str, str]],
+              n_features: int = DEFAULT_FEATURES,
+              ngram_range: Tuple[int, int] = DEFAULT_NGRAMS,
+              epochs: int = 30,
+              learning_rate: float = 1.0,
+              l2: float = 1e-5,
+              batch_size: int = 32,
+              seed: int = 0) -> "IntentClassifier":
+        """
+        Fit the model with mini-batch gradient descent on the softmax cross-entropy
+
+        Args:
+            examples: (text, intent) pairs
+            n_features: Hash space size
+            ngram_range: Smallest and largest character n-gram
+            epochs: Passes over the data
+            learning_rate: Step size
+            l2: Weight decay
+            batch_size: Messages per update
+            seed: Shuffle seed, for reproducible models
+
+        Returns:
+            Trained classifier
+        """
+        if not examples:
+            raise ValueError("Cannot train an intent classifier without examples")
+
+        labels = sorted({intent for _, intent in examples})
+        label_index = {label: i for i, label in enumerate(labels)}
+        texts = [text for text, _ in examples]
+        targets = np.array([label_index[intent] for _, intent in examples], dtype=np.int64)
+
+        # Hash every message once up front
+        features = [cls._featurize([text], n_features, ngram_range)[:2] for text in texts]
+
+        rng = np.random.default_rng(seed)
+        weights = np.zeros((n_features, len(labels)), dtype=np.float32)
+        bias = np.zeros(len(labels), dtype=np.float32)
+
+        for epoch in range(epochs):
+            order = rng.permutation(len(texts))
+            total_loss = 0.0
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                indices = np.concatenate([features[i][0] for i in batch])
+                values = np.concatenate([features[i][1] for i in batch])
+                lengths = np.array([len(features[i][0]) for i in batch])
+                offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+                probs = cls._softmax(cls._logits(weights, bias, indices, values, offsets))
+                total_loss -= np.log(probs[np.arange(len(batch)), targets[batch]] + 1e-12).sum()
+
+                # d(loss)/d(logits) = probs - one_hot, averaged over the batch
+                grad = probs
+                grad[np.arange(len(batch)), targets[batch]] -= 1.0
+                grad /= len(batch)
+
+                row_grad = np.repeat(grad, lengths, axis=0) * values[:, None]
+                weights *= (1.0 - learning_rate * l2)
+                np.add.at(weights, indices, -learning_rate * row_grad)
+                bias -= learning_rate * grad.sum(axis=0)
+
+            logger.debug(f"Intent classifier epoch {epoch + 1}: loss={total_loss / len(texts):.4f}")
+
+        logger.info(f"Trained intent classifier on {len(texts)} examples, {len(labels)} intents")
+        return cls(labels, weights, bias, ngram_range)
+
+    # ------------------------------------------------------------------
+    # Inference
+    # ------------------------------------------------------------------
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        """Class probabilities for a batch of messages, shape (len(texts), n_labels)"""
+        if not texts:
+            return np.zeros((0, len(self.labels)), dtype=np.float32)
+        indices, values, offsets = self._featurize(texts, self.n_features, self.ngram_range)
+        return self._softmax(self._logits(self.weights, self.bias, indices, values, offsets))
+
+    def predict(self, texts: List[str]) -> List[IntentMatch]:
+        """Best intent and its probability for each message"""
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        return [
+            IntentMatch(
+                intent=self.labels[label],
+                confidence=round(float(row[label]), 3),
+                scores={name: round(float(p), 3) for name, p in zip(self.labels, row)}
+            )
+            for row, label in zip(probabilities, best)
+        ]
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path: str) -> None:
+        """Write the model to a .npz file"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez_compressed(
+            path,
+            labels=np.array(self.labels),
+            weights=self.weights,
+            bias=self.bias,
+            ngram_range=np.array(self.ngram_range)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        """Read a model written by save()"""
+        with np.load(path) as data:
+            return cls(
+                labels=[str(label) for label in data["labels"]],
+                weights=data["weights"],
+                bias=data["bias"],
+                ngram_range=tuple(int(n) for n in data["ngram_range"])
+            )
+
+def load_intent_classifier(model_path: Optional[str] = None,
+                           training_path: Optional[str] = None) -> Optional[IntentClassifier]:
+    """
+    Load the intent model for this process
+
+    Uses the saved model if present; otherwise trains from the labeled JSONL and saves the result.
+    Returns None when neither exists, so callers fall back to keyword matching.
+    """
+    model_path = model_path or os.getenv("INTENT_MODEL_PATH", "data/intent_classifier.npz")
+    training_path = training_path or os.getenv("INTENT_TRAINING_DATA", "data/intent_training.jsonl")
+
+    try:
+        if os.path.exists(model_path):
+            model = IntentClassifier.load(model_path)
+            logger.info(f"Loaded intent classifier from {model_path} ({len(model.labels)} intents)")
+            return model
+        if os.path.exists(training_path):
+            model = IntentClassifier.train(load_examples(training_path))
+            model.save(model_path)
+            logger.info(f"Saved intent classifier to {model_path}")
+            return model
+    except Exception as e:
+        logger.error(f"Could not load intent classifier: {e}")
+        return None
+
+    logger.warning("No intent model or training data found; using keyword intents only")
+    return None
+
+class IntentBatcher:
+    """
+    Groups messages classified during the same event loop iteration into one predict() call
+    Adds no waiting: the batch is flushed on the next loop tick
+    """
+
+    def __init__(self, model: Optional[IntentClassifier] = None):
+        """Initialize with an optional model; set .model later, e.g. at startup"""
+        self.model = model
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._scheduled = False
+        self.stats = {"batches": 0, "messages": 0, "max_batch": 0}
+
+    async def classify(self, text: str) -> Optional[IntentMatch]:
+        """Classify one message; None if no model is loaded"""
+        if self.model is None:
+            return None
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        """Run one batch for every message queued since the last flush"""
+        batch, self._pending, self._scheduled = self._pending, [], False
+        if not batch:
+            return
+        try:
+            predictions = self.model.predict([text for text, _ in batch])
+        except Exception as e:
+            logger.error(f"Intent batch of {len(batch)} failed: {e}")
+            predictions = [None] * len(batch)
+
+        self.stats["batches"] += 1
+        self.stats["messages"] += len(batch)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        for (_, future), prediction in zip(batch, predictions):
+            if not future.done():
+                future.set_result(prediction)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return model and batching counters"""
+        return {
+            "model_loaded": self.model is not None,
+            "intents": self.model.labels if self.model else [],
+            **self.stats
+        }
+
+if __name__ == "__main__":
+    # Train a model from labeled chat logs: python intent_classifier.py data/intent_training.jsonl
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    source = sys.argv[1] if len(sys.argv) > 1 else os.getenv("INTENT_TRAINING_DATA", "data/intent_training.jsonl")
+    target = sys.argv[2] if len(sys.argv) > 2 else os.getenv("INTENT_MODEL_PATH", "data/intent_classifier.npz")
+    classifier = IntentClassifier.train(load_examples(source))
+    classifier.save(target)
+    print(f"Saved {len(classifier.labels)}-intent model to {target}")
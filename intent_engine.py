@@ -0,0 +1,147 @@
+"""
+Intent Engine for Morvo AI Marketing Platform
+Arabic-aware keyword intent matching with a single-pass Aho-Corasick automaton
+"""
+
+from typing import Dict, List, Optional, Tuple
+from collections import deque
+from dataclasses import dataclass, field
+import re
+
+# Harakat, superscript alef and Quranic marks
+_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+_TATWEEL = "\u0640"
+_FOLDING = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",  # alef variants
+    "ى": "ي",                                # alef maqsura -> ya
+    "ة": "ه",                                # ta marbuta -> ha
+})
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_arabic(text: str) -> str:
+    """
+    Normalize text for keyword matching
+
+    Lowercases, strips diacritics and tatweel, folds alef/ya/ta-marbuta variants
+    and collapses whitespace, so "أهلاً" and "اهلا" compare equal.
+    """
+    text = _DIACRITICS.sub("", (text or "").lower()).replace(_TATWEEL, "")
+    return _WHITESPACE.sub(" ", text.translate(_FOLDING)).strip()
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+@dataclass
+class IntentMatch:
+    """Result of matching a message against the intent vocabularies"""
+    intent: str
+    confidence: float
+    scores: Dict[str, float] = field(default_factory=dict)
+    matched: List[str] = field(default_factory=list)
+
+class IntentMatcher:
+    """
+    Compiled multi-pattern matcher over all intent keyword sets
+    Arabic keywords match anywhere (they usually carry prefixes like ال/و/ب);
+    Latin keywords only match whole words so "hi" does not fire inside "this"
+    """
+
+    def __init__(self,
+                 keywords: Dict[str, Dict[str, float]],
+                 default_intent: str = "general_query",
+                 priority: Optional[List[str]] = None):
+        """
+        Compile the automaton
+
+        Args:
+            keywords: Intent -> {keyword: weight}
+            default_intent: Intent returned when nothing matches
+            priority: Tie-break order between intents with equal scores (defaults to dict order)
+        """
+        self.default_intent = default_intent
+        self.priority = {intent: i for i, intent in enumerate(priority or keywords.keys())}
+
+        # Trie as parallel lists: transitions, failure links, outputs
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, str, float, bool]]] = [[]]
+
+        for intent, words in keywords.items():
+            for word, weight in words.items():
+                normalized = normalize_arabic(word)
+                if normalized:
+                    whole_word = normalized.isascii()
+                    self._insert(normalized, (intent, normalized, weight, whole_word))
+        self._build_failure_links()
+
+    def _insert(self, pattern: str, output: Tuple[str, str, float, bool]) -> None:
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append(output)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                candidate = self._goto[fallback].get(char, 0)
+                self._fail[child] = candidate if candidate != child else 0
+                self._output[child].extend(self._output[self._fail[child]])
+
+    def scores(self, text: str) -> Tuple[Dict[str, float], List[str]]:
+        """Scan the normalized text once; return summed weights per intent and matched keywords"""
+        normalized = normalize_arabic(text)
+        scores: Dict[str, float] = {}
+        matched: List[str] = []
+        seen = set()
+        node = 0
+        for end, char in enumerate(normalized):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for intent, keyword, weight, whole_word in self._output[node]:
+                if (intent, keyword) in seen:
+                    continue
+                if whole_word:
+                    start = end - len(keyword) + 1
+                    if (start > 0 and _is_word_char(normalized[start - 1])) or \
+                            (end + 1 < len(normalized) and _is_word_char(normalized[end + 1])):
+                        continue
+                # Each keyword counts once per message
+                seen.add((intent, keyword))
+                scores[intent] = scores.get(intent, 0.0) + weight
+                matched.append(keyword)
+        return scores, matched
+
+    def match(self, text: str) -> IntentMatch:
+        """
+        Pick the best intent for a message
+
+        Returns:
+            IntentMatch with the winning intent, its share of the total score as confidence,
+            all intent scores and the matched keywords
+        """
+        scores, matched = self.scores(text)
+        if not scores:
+            return IntentMatch(intent=self.default_intent, confidence=0.0)
+
+        intent = min(scores, key=lambda name: (-scores[name], self.priority.get(name, len(self.priority))))
+        confidence = scores[intent] / sum(scores.values())
+        return IntentMatch(
+            intent=intent,
+            confidence=round(confidence, 3),
+            scores=scores,
+            matched=matched
+        )
@@ -0,0 +1,62 @@
+"""
+Job Events for Morvo AI Marketing Platform
+WebSocket frames for crew job progress and results, published on the message bus
+"""
+
+from typing import Dict, Any, Optional
+from datetime import datetime
+import logging
+
+from crew_jobs import JobNotifier
+from message_bus import MessageBus
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def send_to_job_owner(bus: MessageBus, job: Dict[str, Any], message: Dict[str, Any],
+                      coalesce_key: Optional[str] = None) -> None:
+    """Publish to the tabs of the user who submitted a job, else to its organization's connections"""
+    if job.get("user_id"):
+        bus.publish_to_user(job["user_id"], message, coalesce_key)
+    elif job.get("organization_id"):
+        bus.publish_to_org(job["organization_id"], message, coalesce_key)
+
+def notify_analysis_complete(bus: MessageBus, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """Tell the job owner that a website analysis finished"""
+    try:
+        send_to_job_owner(bus, job, {
+            "type": "website_analysis_complete",
+            "analysis_id": job["id"],
+            "data": {
+                "title": result.get("title", ""),
+                "business_type": result.get("business_type", ""),
+                "confidence_score": result.get("confidence_score", 0.0),
+                "recommendations_count": len(result.get("recommendations", []))
+            },
+            "message": "🎉 اكتمل تحليل موقعك! إليك النتائج:",
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"Error sending analysis notification: {str(e)}")
+
+def job_event_notifier(bus: MessageBus) -> JobNotifier:
+    """
+    Build a CrewJobQueue notifier that publishes job events on a message bus
+
+    Args:
+        bus: The API's bus, or a publish-only bus in a standalone worker process
+
+    Returns:
+        Coroutine to pass to CrewJobQueue.set_notifier
+    """
+    async def send_job_event(job: Dict[str, Any], event: Dict[str, Any]) -> None:
+        if event["type"] == "job_completed" and job.get("job_type") == "website_analysis":
+            notify_analysis_complete(bus, job, event.get("result") or {})
+            return
+
+        message = {**event, "job_type": job.get("job_type"), "timestamp": datetime.now().isoformat()}
+        # Successive progress updates replace each other in a slow client's queue
+        coalesce_key = f"job_progress:{job['id']}" if event["type"] == "job_progress" else None
+        send_to_job_owner(bus, job, message, coalesce_key)
+
+    return send_job_event
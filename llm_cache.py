@@ -0,0 +1,328 @@
+"""
+LLM Response Cache for Morvo AI Marketing Platform
+Content-addressed SQLite cache of crew completions keyed by model, temperature, prompt and tool outputs
+"""
+
+from typing import Dict, List, Any, Optional
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so formatting-only differences map to the same key"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", prompt or "")).strip()
+
+def hash_tool_outputs(tool_outputs: Any) -> str:
+    """Stable hash of the tool/data inputs a completion was produced from"""
+    if tool_outputs is None:
+        return ""
+    encoded = json.dumps(tool_outputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def make_cache_key(model: str, temperature: Optional[float], prompt: str, tool_outputs: Any = None) -> str:
+    """
+    Build the content address of a completion
+
+    Args:
+        model: Model name
+        temperature: Sampling temperature (None when the provider default is used)
+        prompt: Full prompt text; normalized before hashing
+        tool_outputs: Tool results or external data the prompt depends on
+
+    Returns:
+        Hex digest used as cache key
+    """
+    material = json.dumps(
+        [model, temperature, normalize_prompt(prompt), hash_tool_outputs(tool_outputs)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """
+    SQLite cache of LLM/crew responses with TTL and size limits
+    Least recently used entries are evicted once the limits are exceeded
+    """
+
+    def __init__(self,
+                 db_path: Optional[str] = None,
+                 ttl_seconds: Optional[float] = None,
+                 max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 enabled: Optional[bool] = None):
+        """Open the cache from arguments or environment variables"""
+        self.db_path = db_path or os.getenv("LLM_CACHE_DB", "llm_cache.db")
+        self.ttl_seconds = ttl_seconds or float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+        self.max_entries = max_entries or int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+        self.max_bytes = max_bytes or int(float(os.getenv("LLM_CACHE_MAX_MB", "100")) * 1024 * 1024)
+        if enabled is None:
+            enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+        self.enabled = enabled
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get a connection for the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        """Create tables and indexes"""
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used
+                ON llm_cache (last_used_at);
+            CREATE INDEX IF NOT EXISTS idx_llm_cache_expires
+                ON llm_cache (expires_at);
+        """)
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response, or None if missing or expired"""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT response FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        conn.execute(
+            "UPDATE llm_cache SET hits = hits + 1, last_used_at = ? WHERE key = ?", (now, key)
+        )
+        self._count("hits")
+        return row["response"]
+
+    def set(self, key: str, response: str, model: Optional[str] = None, ttl_seconds: Optional[float] = None) -> None:
+        """Store a response and evict old entries if the cache grew past its limits"""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            logger.warning(f"LLM response of {size} bytes exceeds cache size limit, not cached")
+            return
+        self._connect().execute(
+            """INSERT OR REPLACE INTO llm_cache
+               (key, model, response, size, hits, created_at, expires_at, last_used_at)
+               VALUES (?, ?, ?, ?, 0, ?, ?, ?)""",
+            (key, model, response, size, now, now + (ttl_seconds or self.ttl_seconds), now)
+        )
+        self._count("stores")
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop expired entries, then least recently used ones until within limits"""
+        conn = self._connect()
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+        row = conn.execute("SELECT COUNT(*) AS n, COALESCE(SUM(size), 0) AS bytes FROM llm_cache").fetchone()
+        entries, total_bytes = row["n"], row["bytes"]
+        if entries <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        evicted = 0
+        for victim in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used_at").fetchall():
+            if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (victim["key"],))
+            entries -= 1
+            total_bytes -= victim["size"]
+            evicted += 1
+        with self._lock:
+            self.stats["evictions"] += evicted
+
+    def clear(self) -> None:
+        """Remove every cached response"""
+        self._connect().execute("DELETE FROM llm_cache")
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return hit/miss counters and cache size"""
+        row = self._connect().execute(
+            "SELECT COUNT(*) AS n, COALESCE(SUM(size), 0) AS bytes FROM llm_cache"
+        ).fetchone()
+        with self._lock:
+            stats = dict(self.stats)
+        return {"enabled": self.enabled, "entries": row["n"], "bytes": row["bytes"], **stats}
+
+    # ------------------------------------------------------------------
+    # Crew integration
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _describe_llm(llm: Any) -> tuple:
+        """Extract (model, temperature) from a CrewAI/LangChain LLM or a model name"""
+        if llm is None:
+            return os.getenv("OPENAI_MODEL_NAME", "default"), None
+        if isinstance(llm, str):
+            return llm, None
+        model = getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__
+        return str(model), getattr(llm, "temperature", None)
+
+    @staticmethod
+    def _describe_context(context: Any) -> List[str]:
+        """Render task context: plain strings and the outputs of upstream tasks"""
+        if not isinstance(context, (list, tuple)):
+            return []
+        parts = []
+        for item in context:
+            if isinstance(item, str):
+                parts.append(item)
+            else:
+                output = getattr(item, "output", None)
+                parts.append(str(getattr(output, "raw", output)))
+        return parts
+
+    def crew_key(self, crew: Any, tool_outputs: Any = None) -> str:
+        """Cache key for a crew: every agent's model and persona plus every task prompt"""
+        models, temperatures, prompt_parts = [], [], []
+        for task in crew.tasks:
+            agent = task.agent
+            model, temperature = self._describe_llm(getattr(agent, "llm", None))
+            models.append(model)
+            temperatures.append(temperature)
+            tool_names = [getattr(tool, "name", type(tool).__name__) for tool in (getattr(agent, "tools", None) or [])]
+            prompt_parts.extend([
+                agent.role, agent.goal, agent.backstory, ",".join(tool_names),
+                task.description, task.expected_output,
+                *self._describe_context(getattr(task, "context", None))
+            ])
+        return make_cache_key(
+            "|".join(models),
+            temperatures[0] if len(set(temperatures)) == 1 else str(temperatures),
+            "\n".join(str(part) for part in prompt_parts),
+            tool_outputs
+        )
+
+    @staticmethod
+    def _context_ready(crew: Any) -> bool:
+        """Whether every upstream task in the crew's task contexts has produced its output"""
+        crew_tasks = [id(task) for task in crew.tasks]
+        for task in crew.tasks:
+            context = getattr(task, "context", None)
+            if not isinstance(context, (list, tuple)):
+                # Unset context is a truthy sentinel in newer CrewAI releases
+                continue
+            for item in context:
+                # Tasks of the same crew run first within the kickoff itself
+                if not isinstance(item, str) and id(item) not in crew_tasks and getattr(item, "output", None) is None:
+                    return False
+        return True
+
+    @staticmethod
+    def _restore_output(task: Any, raw: str) -> None:
+        """Set a task's output as if it had run, so dependent tasks see it as context"""
+        from crewai.tasks.task_output import TaskOutput
+
+        task.output = TaskOutput(
+            description=task.description,
+            expected_output=getattr(task, "expected_output", None),
+            raw=raw,
+            agent=getattr(task.agent, "role", "")
+        )
+
+    def _get_outputs(self, key: str, crew: Any) -> Optional[List[str]]:
+        """Cached raw output of every task of a crew (the last one is the crew result), or None"""
+        outputs = []
+        for index in range(len(crew.tasks) - 1):
+            raw = self.get(f"{key}:{index}")
+            if raw is None:
+                return None
+            outputs.append(raw)
+        final = self.get(key)
+        if final is None:
+            return None
+        outputs.append(final)
+        try:
+            for task, raw in zip(crew.tasks, outputs):
+                self._restore_output(task, raw)
+        except Exception as e:
+            logger.warning(f"Could not restore cached task outputs, running the crew: {e}")
+            return None
+        return outputs
+
+    def kickoff(self, crew: Any, tool_outputs: Any = None, bypass: bool = False) -> str:
+        """
+        Run crew.kickoff() unless an identical run is cached (blocking; call from a worker thread)
+
+        On a hit every task's output is set from the cache, so tasks that take them as
+        context (e.g. dependent TaskGraph nodes) see the same upstream output as after a run.
+
+        Args:
+            crew: CrewAI crew with agents and tasks assigned
+            tool_outputs: External data the tasks depend on, part of the key
+            bypass: Skip the cache lookup and force a fresh run (the result is still stored)
+
+        Returns:
+            The crew's final output as text
+        """
+        if not self.enabled:
+            result = crew.kickoff()
+            return getattr(result, "raw", None) or str(result)
+        if not self._context_ready(crew):
+            # The key would stand for a missing upstream output; neither read nor store it
+            logger.warning("Crew task context has no upstream output yet, not using the LLM cache")
+            result = crew.kickoff()
+            return getattr(result, "raw", None) or str(result)
+
+        key = self.crew_key(crew, tool_outputs)
+        if bypass:
+            self._count("bypassed")
+        else:
+            outputs = self._get_outputs(key, crew)
+            if outputs is not None:
+                logger.info(f"LLM cache hit for crew {key[:12]}")
+                return outputs[-1]
+
+        result = crew.kickoff()
+        text = getattr(result, "raw", None) or str(result)
+        model = self._describe_llm(getattr(crew.tasks[0].agent, "llm", None))[0] if crew.tasks else None
+        # Intermediate task outputs first, so a stored final output always has them
+        for index, task in enumerate(crew.tasks[:-1]):
+            output = getattr(task, "output", None)
+            if output is None:
+                return text
+            self.set(f"{key}:{index}", str(getattr(output, "raw", output)), model=model)
+        self.set(key, text, model=model)
+        return text
+
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMResponseCache:
+    """Get the process-wide LLM response cache, creating it on first use"""
+    global _llm_cache
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMResponseCache()
+                logger.info(f"LLM response cache at {_llm_cache.db_path} (enabled={_llm_cache.enabled})")
+    return _llm_cache
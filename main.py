@@ -4,6 +4,13 @@
 نسخة نظيفة تماماً لضمان نجاح النشر على Railway
 """
 
+import time
+_import_started = time.perf_counter()
+
+# قياس زمن الاستيراد لكل وحدة عند تفعيل MORVO_IMPORT_PROFILE=true
+from startup_profiler import enable_import_profiling, module_available, lazy_component, record_import, budget_report
+enable_import_profiling()
+
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -14,6 +21,16 @@ import asyncio
 from datetime import datetime
 import os
 
+from crew_executor import get_crew_executor, CrewExecutionTimeout
+from agent_pool import AgentPool
+from intent_engine import IntentMatcher
+from chat_streaming import ChatSocketSession, StreamCancelled, TokenSink, get_token_handler
+from connection_manager import (
+    ConnectionManager, ConnectionLimitExceeded, CLOSE_TRY_AGAIN_LATER, per_message_deflate_enabled
+)
+from message_bus import create_message_bus
+from conversation_log import get_conversation_log, conversation_key
+
 # إعداد التسجيل
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -48,110 +65,129 @@ class ChatResponse(BaseModel):
     user_id: str
     session_id: str
 
-# إدارة الاتصالات
-active_connections: Dict[str, WebSocket] = {}
+# إدارة الاتصالات (عدة تبويبات لكل مستخدم، مفهرسة بالمستخدم والمؤسسة)
+connection_manager = ConnectionManager()
+# ناقل الرسائل بين العمال (WS_BUS_BACKEND): يصل الإطار إلى العامل الذي يحمل اتصال المستخدم
+message_bus = create_message_bus(connection_manager)
 
 # محرك CrewAI
 class CrewAIEngine:
     def __init__(self):
-        self.available = False
+        # CrewAI و LangChain ثقيلان: نتحقق من توفرهما دون استيرادهما، ويُنشأ LLM عند أول طلب
+        self.available = module_available("crewai") and module_available("langchain_openai")
+        if not self.available:
+            print("⚠️ CrewAI not available: crewai/langchain_openai not installed")
         
         try:
-            from crewai import Agent, Task, Crew, Process
-            from langchain_openai import ChatOpenAI
             from dotenv import load_dotenv
-            self.available = True
             load_dotenv()
-        except ImportError as e:
-            print(f"⚠️ CrewAI not available: {e}")
+        except ImportError:
+            pass
         
-        if self.available:
-            try:
-                # إعداد LLM
-                api_key = os.getenv("OPENAI_API_KEY")
-                if api_key:
-                    self.llm = ChatOpenAI(
-                        model="gpt-4-turbo-preview",
-                        temperature=0.7,
-                        openai_api_key=api_key
-                    )
-                    logger.info("✅ CrewAI initialized with OpenAI GPT-4")
-                else:
-                    logger.warning("⚠️ OPENAI_API_KEY not found, using fallback")
-                    self.available = False
-            except Exception as e:
-                logger.error(f"❌ CrewAI initialization failed: {e}")
-                self.available = False
-    
-    def create_marketing_crew(self):
-        """إنشاء فريق التسويق الرقمي"""
-        if not self.available or not self.llm:
-            return None
+        if self.available and not os.getenv("OPENAI_API_KEY"):
+            logger.warning("⚠️ OPENAI_API_KEY not found, using fallback")
+            self.available = False
         
-        try:
-            # وكيل المحلل التسويقي
-            analyst = Agent(
-                role='محلل تسويق رقمي',
-                goal='تحليل البيانات وتقديم رؤى تسويقية دقيقة',
-                backstory="""أنت محلل تسويق رقمي خبير مع 10 سنوات من الخبرة في 
+        # وكلاء جاهزون يُعاد استخدامهم بين الطلبات بدلاً من إنشائهم كل مرة
+        self.agent_pool = AgentPool(self._build_agent)
+    
+    # تعريفات الوكلاء (الدور، الهدف، الخلفية)
+    AGENT_SPECS = {
+        'analyst': (
+            'محلل تسويق رقمي',
+            'تحليل البيانات وتقديم رؤى تسويقية دقيقة',
+            """أنت محلل تسويق رقمي خبير مع 10 سنوات من الخبرة في 
                 تحليل البيانات والسوق. تجيد العربية والإنجليزية وتركز على تقديم 
-                رؤى عملية وقابلة للتنفيذ.""",
-                llm=self.llm,
-                verbose=True,
-                allow_delegation=False
-            )
-            
-            # وكيل منشئ المحتوى
-            content_creator = Agent(
-                role='منشئ محتوى إبداعي',
-                goal='إنشاء محتوى تسويقي جذاب ومناسب للثقافة العربية',
-                backstory="""أنت منشئ محتوى إبداعي متخصص في التسويق الرقمي 
+                رؤى عملية وقابلة للتنفيذ."""
+        ),
+        'content_creator': (
+            'منشئ محتوى إبداعي',
+            'إنشاء محتوى تسويقي جذاب ومناسب للثقافة العربية',
+            """أنت منشئ محتوى إبداعي متخصص في التسويق الرقمي 
                 للسوق العربي. تفهم التفاصيل الثقافية وتنشئ محتوى يتفاعل معه 
-                الجمهور العربي بشكل إيجابي.""",
-                llm=self.llm,
-                verbose=True,
-                allow_delegation=False
-            )
-            
-            return {'analyst': analyst, 'content_creator': content_creator}
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to create marketing crew: {e}")
-            return None
+                الجمهور العربي بشكل إيجابي."""
+        )
+    }
+    
+    @lazy_component
+    def llm(self):
+        """إعداد LLM عند أول استخدام"""
+        from langchain_openai import ChatOpenAI
+        
+        llm = ChatOpenAI(
+            model="gpt-4-turbo-preview",
+            temperature=0.7,
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            # بث الرموز إلى WebSocket المرتبط بخيط التنفيذ الحالي
+            streaming=True,
+            callbacks=[get_token_handler()]
+        )
+        logger.info("✅ CrewAI initialized with OpenAI GPT-4")
+        return llm
+    
+    def _load_crewai(self):
+        """استيراد CrewAI وإنشاء LLM (عملية حاجبة في المرة الأولى فقط)"""
+        import crewai  # noqa: F401
+        return self.llm
+    
+    def _build_agent(self, agent_type: str, model: str):
+        """إنشاء وكيل جديد للمجمّع"""
+        from crewai import Agent
+        
+        role, goal, backstory = self.AGENT_SPECS[agent_type]
+        return Agent(
+            role=role,
+            goal=goal,
+            backstory=backstory,
+            llm=self.llm,
+            verbose=True,
+            allow_delegation=False
+        )
     
-    def process_with_crewai(self, content: str, user_id: str) -> dict:
-        """معالجة الرسالة باستخدام CrewAI"""
+    async def process_with_crewai(self, content: str, user_id: str, sink: Optional[TokenSink] = None,
+                                  history: str = "", session_id: Optional[str] = None) -> dict:
+        """معالجة الرسالة باستخدام CrewAI (مع بث الرموز إلى sink إن وُجد، وسياق المحادثة السابق في history)"""
+        if not self.available:
+            return None
+        
         try:
-            crew_agents = self.create_marketing_crew()
-            if not crew_agents:
-                return None
+            # الاستيراد الأول لـ CrewAI وإنشاء LLM يتمان خارج حلقة الأحداث
+            llm = await asyncio.to_thread(self._load_crewai)
+            from crewai import Task, Crew, Process
             
-            # إنشاء مهمة ديناميكية
-            task = Task(
-                description=f"""
-                قم بتحليل هذا الطلب من المستخدم: "{content}"
+            model = llm.model_name
+            history_block = f"""
+                    سياق المحادثة السابقة (للرجوع إليه فقط):
+                    {history}
+                    """ if history else ""
+            with self.agent_pool.checkout('analyst', model) as analyst, \
+                    self.agent_pool.checkout('content_creator', model) as content_creator:
+                # إنشاء مهمة ديناميكية
+                task = Task(
+                    description=f"""{history_block}
+                    قم بتحليل هذا الطلب من المستخدم: "{content}"
+                    
+                    المطلوب:
+                    1. تحديد نوع الطلب (تحليل، إنشاء محتوى، استراتيجية، إلخ)
+                    2. تقديم إجابة شاملة ومفيدة بالعربية
+                    3. اقتراح خطوات عملية إن أمكن
+                    4. تقديم نصائح إضافية ذات صلة
+                    
+                    اجعل الرد موجهاً للسوق العربي ومناسباً ثقافياً.
+                    """,
+                    agent=analyst,
+                    expected_output="رد تفصيلي باللغة العربية مع توصيات عملية"
+                )
                 
-                المطلوب:
-                1. تحديد نوع الطلب (تحليل، إنشاء محتوى، استراتيجية، إلخ)
-                2. تقديم إجابة شاملة ومفيدة بالعربية
-                3. اقتراح خطوات عملية إن أمكن
-                4. تقديم نصائح إضافية ذات صلة
+                # إنشاء الفريق لكل طلب وتشغيله في مجمّع العمال
+                crew = Crew(
+                    agents=[analyst, content_creator],
+                    tasks=[task],
+                    process=Process.sequential,
+                    verbose=True
+                )
                 
-                اجعل الرد موجهاً للسوق العربي ومناسباً ثقافياً.
-                """,
-                agent=crew_agents['analyst'],
-                expected_output="رد تفصيلي باللغة العربية مع توصيات عملية"
-            )
-            
-            # إنشاء وتشغيل الفريق
-            crew = Crew(
-                agents=[crew_agents['analyst'], crew_agents['content_creator']],
-                tasks=[task],
-                process=Process.sequential,
-                verbose=True
-            )
-            
-            result = crew.kickoff()
+                result = await get_crew_executor().run(sink.bind(crew.kickoff) if sink else crew.kickoff)
             
             return {
                 "content": str(result),
@@ -165,34 +201,35 @@ class CrewAIEngine:
                 ],
                 "timestamp": datetime.now().isoformat(),
                 "user_id": user_id,
-                "session_id": f"session_{user_id}"
+                "session_id": session_id or f"session_{user_id}"
             }
             
+        except (CrewExecutionTimeout, StreamCancelled):
+            raise
         except Exception as e:
             logger.error(f"❌ CrewAI processing failed: {e}")
             return None
 
+# الكلمات المفتاحية لكل قصد مع أوزانها
+CHAT_INTENT_KEYWORDS = {
+    "greeting": {"مرحبا": 1.0, "السلام": 1.0, "أهلا": 1.0, "hello": 1.0, "hi": 1.0},
+    "analysis_request": {"تحليل": 1.0, "analysis": 1.0, "بيانات": 1.0, "data": 1.0},
+    "content_creation": {"محتوى": 1.0, "content": 1.0, "منشور": 1.0, "post": 1.0},
+    "strategy_planning": {"استراتيجية": 1.0, "strategy": 1.0, "خطة": 1.0, "plan": 1.0},
+    "help_request": {"مساعدة": 1.0, "help": 1.0, "شرح": 1.0, "explain": 1.0}
+}
+
+CHAT_INTENT_MATCHER = IntentMatcher(CHAT_INTENT_KEYWORDS, default_intent="general_query")
+
 # محرك المحادثة المُحدث
 class EnhancedChatEngine:
     def __init__(self):
         self.crewai_engine = CrewAIEngine()
+        self.conversation_log = get_conversation_log()
         
     def detect_intent(self, content: str) -> str:
         """كشف قصد المستخدم"""
-        content_lower = content.lower()
-        
-        if any(word in content_lower for word in ['مرحبا', 'السلام', 'أهلا', 'hello', 'hi']):
-            return "greeting"
-        elif any(word in content_lower for word in ['تحليل', 'analysis', 'بيانات', 'data']):
-            return "analysis_request"
-        elif any(word in content_lower for word in ['محتوى', 'content', 'منشور', 'post']):
-            return "content_creation"
-        elif any(word in content_lower for word in ['استراتيجية', 'strategy', 'خطة', 'plan']):
-            return "strategy_planning"
-        elif any(word in content_lower for word in ['مساعدة', 'help', 'شرح', 'explain']):
-            return "help_request"
-        else:
-            return "general_query"
+        return CHAT_INTENT_MATCHER.match(content).intent
     
     def get_rich_components(self, intent: str) -> List[Dict[str, str]]:
         """إنشاء مكونات تفاعلية حسب القصد"""
@@ -247,19 +284,36 @@ class EnhancedChatEngine:
         
         return responses.get(intent, "شكراً لتواصلك معي. كيف يمكنني مساعدتك بشكل أفضل؟")
     
-    def process_message(self, content: str, user_id: str) -> dict:
-        """معالجة الرسالة الرئيسية"""
+    async def process_message(self, content: str, user_id: str, sink: Optional[TokenSink] = None,
+                              session_id: Optional[str] = None) -> dict:
+        """معالجة الرسالة الرئيسية (تُحفظ الرسالة والرد في سجل الجلسة)"""
+        session_id = session_id or f"session_{user_id}"
+        # السجل مفهرس بالمستخدم والجلسة معاً: معرف الجلسة يأتي من العميل وقد يتكرر بين المستخدمين
+        conversation = conversation_key(user_id, session_id)
         intent = self.detect_intent(content)
+        seq = await asyncio.to_thread(self.conversation_log.append, conversation, "user", content)
         
-        # محاولة استخدام CrewAI أولاً
+        # محاولة استخدام CrewAI أولاً - التنفيذ على مجمع العمال حتى لا تتوقف حلقة الأحداث
         if self.crewai_engine.available and intent in ["analysis_request", "content_creation", "strategy_planning"]:
-            crewai_result = self.crewai_engine.process_with_crewai(content, user_id)
+            # آخر أدوار الجلسة وملخص ما قبلها ضمن ميزانية الرموز (دون إعادة قراءة السجل كاملاً)
+            context = await asyncio.to_thread(self.conversation_log.context, conversation, None, seq)
+            try:
+                crewai_result = await self.crewai_engine.process_with_crewai(
+                    content, user_id, sink,
+                    history=self.conversation_log.render(context),
+                    session_id=session_id
+                )
+            except CrewExecutionTimeout:
+                logger.warning(f"⚠️ CrewAI timed out for {user_id}, using simple response")
+                crewai_result = None
             if crewai_result:
+                await asyncio.to_thread(self.conversation_log.append, conversation, "assistant", crewai_result["content"])
                 return crewai_result
         
         # العودة للرد البسيط
         simple_response = self.generate_simple_response(content, intent)
         rich_components = self.get_rich_components(intent)
+        await asyncio.to_thread(self.conversation_log.append, conversation, "assistant", simple_response)
         
         return {
             "content": simple_response,
@@ -267,7 +321,7 @@ class EnhancedChatEngine:
             "rich_components": rich_components,
             "timestamp": datetime.now().isoformat(),
             "user_id": user_id,
-            "session_id": f"session_{user_id}"
+            "session_id": session_id
         }
 
 # إنشاء محرك المحادثة المحسن
@@ -287,8 +341,8 @@ async def root():
 
 # فحص الصحة
 @app.get("/health")
-async def health_check():
-    """فحص صحة الخادم"""
+async def health_check(verbose: bool = False):
+    """فحص صحة الخادم (verbose=true يضيف تقرير زمن البدء والاستيراد)"""
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
@@ -296,10 +350,15 @@ async def health_check():
         "environment": "Railway Production",
         "services": {
             "fastapi": "active",
-            "websocket": f"{len(active_connections)} connections",
-            "chat_engine": "active"
+            "websocket": f"{connection_manager.count_connections()} connections",
+            "chat_engine": "active",
+            "crew_executor": get_crew_executor().metrics(),
+            "agent_pool": chat_engine.crewai_engine.agent_pool.metrics(),
+            "conversation_log": chat_engine.conversation_log.metrics(),
+            "message_bus": message_bus.metrics()
         },
-        "port": os.getenv("PORT", "8000")
+        "port": os.getenv("PORT", "8000"),
+        **({"startup": budget_report(verbose=True)} if verbose else {})
     }
 
 # API الرسائل
@@ -308,19 +367,14 @@ async def chat_message(message: ChatMessage):
     """معالجة رسائل المحادثة"""
     try:
         # معالجة الرسالة
-        response = chat_engine.process_message(
+        response = await chat_engine.process_message(
             content=message.content,
-            user_id=message.user_id
+            user_id=message.user_id,
+            session_id=message.session_id
         )
         
-        # إشعار عبر WebSocket إن وجد
-        if message.user_id in active_connections:
-            try:
-                await active_connections[message.user_id].send_text(
-                    json.dumps({"type": "chat_response", "data": response})
-                )
-            except:
-                pass
+        # إشعار جميع تبويبات المستخدم المفتوحة عبر WebSocket
+        message_bus.publish_to_user(message.user_id, {"type": "chat_response", "data": response})
         
         return ChatResponse(**response)
         
@@ -331,9 +385,24 @@ async def chat_message(message: ChatMessage):
 # WebSocket
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    """نقطة WebSocket للاتصال المباشر"""
+    """
+    نقطة WebSocket للاتصال المباشر
+
+    ?stream=true (أو "stream": true في الرسالة) يبث الرد كإطارات message_start/delta/message_end؛
+    إطار {"type": "cancel"} أو قطع الاتصال يلغي الرد الجاري
+    """
     await websocket.accept()
-    active_connections[user_id] = websocket
+    try:
+        connection_id = connection_manager.connect(
+            websocket,
+            user_id=user_id,
+            org_id=websocket.query_params.get("organization_id")
+        )
+    except ConnectionLimitExceeded as e:
+        logger.warning(f"WebSocket refused for {user_id}: {e}")
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+        return
+    stream = websocket.query_params.get("stream", "false").lower() == "true"
     
     try:
         # رسالة ترحيب
@@ -345,30 +414,43 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
         await websocket.send_text(json.dumps(welcome_msg))
         
         # استقبال الرسائل
-        while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
-            
-            # معالجة الرسالة
-            if message_data.get("type") == "chat_message":
-                response = chat_engine.process_message(
-                    content=message_data.get("content", ""),
-                    user_id=user_id
-                )
-                await websocket.send_text(json.dumps({
-                    "type": "chat_response",
-                    "data": response
-                }))
-                
+        async with ChatSocketSession(websocket, stream=stream,
+                                     on_frame=lambda: connection_manager.touch(connection_id),
+                                     on_pong=lambda: connection_manager.touch(connection_id, pong=True)) as session:
+            while (message_data := await session.receive()) is not None:
+                # معالجة الرسالة
+                if message_data.get("type") == "chat_message":
+                    content = message_data.get("content", "")
+                    session_id = message_data.get("session_id")
+                    await session.respond(
+                        lambda sink: chat_engine.process_message(content=content, user_id=user_id, sink=sink,
+                                                                 session_id=session_id),
+                        lambda response: {"type": "chat_response", "data": response},
+                        stream=message_data.get("stream")
+                    )
+        
+        logger.info(f"User {user_id} disconnected")
     except WebSocketDisconnect:
         logger.info(f"User {user_id} disconnected")
     except Exception as e:
         logger.error(f"WebSocket error for {user_id}: {e}")
     finally:
-        if user_id in active_connections:
-            del active_connections[user_id]
+        connection_manager.disconnect(connection_id)
+
+@app.on_event("startup")
+async def startup_event():
+    """الاتصال بناقل الرسائل بين العمال وبدء نبض WebSocket"""
+    await message_bus.start()
+    connection_manager.start_heartbeat()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await connection_manager.stop_heartbeat()
+    await message_bus.stop()
+
+record_import("main", time.perf_counter() - _import_started)
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(app, host="0.0.0.0", port=port, ws_per_message_deflate=per_message_deflate_enabled())
@@ -161,6 +161,45 @@ class MCPIntegration:
             logger.error(f"Failed to retrieve memories from MCP: {str(e)}")
             return {"status": "error", "message": str(e)}
     
+    async def batch_retrieve_contexts(self, queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Run several context/memory lookups in a single MCP request
+        
+        Args:
+            queries: Lookups such as {"kind": "memories", "agent_id": "M1", "company_id": "...", "limit": 50}
+                     or {"kind": "shared", "agent_id": "M1", "limit": 100}
+            
+        Returns:
+            Dict whose "results" list holds one {"contexts": [...]} entry per query, in order;
+            on failure {"status": "error", "http_status": <code or None>}
+        """
+        if not self.mcp_enabled:
+            logger.info("MCP integration disabled. Using local context only.")
+            return {"status": "disabled", "message": "MCP integration disabled"}
+            
+        try:
+            async with httpx.AsyncClient() as client:
+                payload = {
+                    "project_id": self.project_id,
+                    "queries": queries
+                }
+                
+                response = await client.post(
+                    f"{self.mcp_endpoint}/context/batch",
+                    json=payload,
+                    headers=self.headers
+                )
+                
+                response.raise_for_status()
+                return response.json()
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Failed to batch retrieve context from MCP: {str(e)}")
+            return {"status": "error", "message": str(e), "http_status": e.response.status_code}
+        except Exception as e:
+            # Timeouts and connection errors carry no HTTP status
+            logger.error(f"Failed to batch retrieve context from MCP: {str(e)}")
+            return {"status": "error", "message": str(e), "http_status": None}
+    
     async def query_structured_knowledge(self, query: str, agent_id: Optional[str] = None) -> Dict[str, Any]:
         """Query MCP for structured knowledge related to query"""
         if not self.mcp_enabled:
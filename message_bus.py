@@ -0,0 +1,326 @@
+"""
+Message Bus for Morvo AI Marketing Platform
+Cross-worker pub/sub for WebSocket delivery: in-process, Unix domain socket broker or Postgres LISTEN/NOTIFY
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+import asyncio
+import fcntl
+import json
+import logging
+import os
+
+from connection_manager import ConnectionManager, encode_frame
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+POSTGRES_NOTIFY_LIMIT = 7999
+
+# Largest envelope the Unix socket broker relays
+MAX_LINE_BYTES = 4 * 1024 * 1024
+
+def encode_envelope(route: str, key: Optional[str], frame: str, coalesce_key: Optional[str] = None) -> str:
+    """
+    One-line wire format: JSON routing header, a tab, then the serialized frame
+    json.dumps escapes tabs and newlines inside the header and encode_frame never emits raw ones
+    """
+    return json.dumps([route, key, coalesce_key]) + "\t" + frame
+
+def decode_envelope(line: str) -> Tuple[str, Optional[str], str, Optional[str]]:
+    """Inverse of encode_envelope: (route, key, frame, coalesce_key)"""
+    header, frame = line.split("\t", 1)
+    route, key, coalesce_key = json.loads(header)
+    return route, key, frame, coalesce_key
+
+class MessageBus:
+    """
+    Routes WebSocket frames to whichever worker holds the target sockets
+    Publishing never blocks: every worker receives the frame and delivers it to its own connections
+    """
+
+    backend = "inprocess"
+
+    def __init__(self, manager: Optional[ConnectionManager] = None):
+        """
+        Initialize the bus
+
+        Args:
+            manager: This worker's connections (None for publish-only processes such as alert runners)
+        """
+        self.manager = manager
+        self.connected = asyncio.Event()
+        self.stats = {"published": 0, "received": 0, "delivered": 0, "local_fallbacks": 0, "errors": 0}
+
+    async def start(self) -> None:
+        """Connect to the backend"""
+        self.connected.set()
+
+    async def stop(self) -> None:
+        """Disconnect from the backend"""
+
+    async def wait_connected(self, timeout: float = 5.0) -> bool:
+        """Wait until frames reach other workers; publish-only processes call this before publishing"""
+        try:
+            await asyncio.wait_for(self.connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _deliver(self, route: str, key: Optional[str], frame: str, coalesce_key: Optional[str]) -> int:
+        """Hand a frame to this worker's connections"""
+        self.stats["received"] += 1
+        if self.manager is None:
+            return 0
+        delivered = self.manager.deliver(route, key, frame, coalesce_key)
+        self.stats["delivered"] += delivered
+        return delivered
+
+    def _on_line(self, line: str) -> None:
+        """Deliver one envelope received from the backend"""
+        try:
+            self._deliver(*decode_envelope(line))
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Malformed message bus envelope: {e}")
+
+    def _transmit(self, route: str, key: Optional[str], frame: str, coalesce_key: Optional[str]) -> bool:
+        """Send a frame to every worker; False when the backend is unavailable"""
+        # In-process: this worker is every worker
+        self._deliver(route, key, frame, coalesce_key)
+        return True
+
+    def publish(self, route: str, key: Optional[str], message: Dict[str, Any], coalesce_key: Optional[str] = None) -> None:
+        """
+        Publish a frame to a route on every worker
+
+        Args:
+            route: user, org, org_alert, topic or all
+            key: User id, organization id or topic name (None for all)
+            message: JSON frame, serialized once here
+            coalesce_key: See ConnectionManager.send
+        """
+        frame = encode_frame(message)
+        self.stats["published"] += 1
+        if not self._transmit(route, key, frame, coalesce_key):
+            # Backend down: at least reach the sockets held by this worker
+            self.stats["local_fallbacks"] += 1
+            self._deliver(route, key, frame, coalesce_key)
+
+    def publish_to_user(self, user_id: str, message: Dict[str, Any], coalesce_key: Optional[str] = None) -> None:
+        self.publish("user", user_id, message, coalesce_key)
+
+    def publish_to_org(self, org_id: str, message: Dict[str, Any], coalesce_key: Optional[str] = None) -> None:
+        self.publish("org", org_id, message, coalesce_key)
+
+    def publish_alert_to_org(self, org_id: str, message: Dict[str, Any], coalesce_key: Optional[str] = None) -> None:
+        """Like publish_to_org, but also reaches connections that did not name an organization"""
+        self.publish("org_alert", org_id, message, coalesce_key)
+
+    def publish_to_topic(self, topic: str, message: Dict[str, Any], coalesce_key: Optional[str] = None) -> None:
+        self.publish("topic", topic, message, coalesce_key)
+
+    def broadcast(self, message: Dict[str, Any], coalesce_key: Optional[str] = None) -> None:
+        self.publish("all", None, message, coalesce_key)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Backend name and message counters"""
+        return {"backend": self.backend, **self.stats}
+
+class UnixSocketBus(MessageBus):
+    """
+    Workers on one host connect to a small broker over a Unix domain socket
+    The first worker to take the lock file hosts the broker; the others take over if it exits
+    """
+
+    backend = "unix"
+
+    def __init__(self, manager: Optional[ConnectionManager] = None, path: Optional[str] = None):
+        super().__init__(manager)
+        self.path = path or os.getenv("WS_BUS_SOCKET", "/tmp/morvo_ws_bus.sock")
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: List[asyncio.StreamWriter] = []
+        self.stats["reconnects"] = 0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._writer:
+            self._writer.close()
+        if self._server:
+            self._server.close()
+            for peer in self._peers:
+                peer.close()
+            await self._server.wait_closed()
+        if self._lock_file:
+            self._lock_file.close()
+
+    # ------------------------------------------------------------------
+    # Broker
+    # ------------------------------------------------------------------
+
+    async def _try_become_broker(self) -> bool:
+        """Host the broker if no other worker holds the lock"""
+        if self._server is not None:
+            return True
+        lock_file = open(f"{self.path}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Holding the lock means any socket file left behind is stale
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._lock_file = lock_file
+        self._server = await asyncio.start_unix_server(self._serve_peer, path=self.path, limit=MAX_LINE_BYTES)
+        logger.info(f"Message bus broker listening on {self.path}")
+        return True
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Relay every line from one worker to all workers, the sender included"""
+        self._peers.append(writer)
+        try:
+            while line := await reader.readline():
+                for peer in list(self._peers):
+                    try:
+                        peer.write(line)
+                    except Exception:
+                        self._peers.remove(peer)
+        finally:
+            if writer in self._peers:
+                self._peers.remove(writer)
+            writer.close()
+
+    # ------------------------------------------------------------------
+    # Client
+    # ------------------------------------------------------------------
+
+    async def _run(self) -> None:
+        """Stay connected to the broker, becoming it when it is gone"""
+        delay = 0.1
+        while True:
+            try:
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_LINE_BYTES)
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if not await self._try_become_broker():
+                        raise
+                    reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_LINE_BYTES)
+                self._writer = writer
+                self.connected.set()
+                delay = 0.1
+                while line := await reader.readline():
+                    self._on_line(line.decode("utf-8").rstrip("\n"))
+                logger.warning("Message bus broker closed the connection")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Message bus unavailable ({e}), retrying in {delay:.1f}s")
+            self._writer = None
+            self.connected.clear()
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+    def _transmit(self, route: str, key: Optional[str], frame: str, coalesce_key: Optional[str]) -> bool:
+        if self._writer is None or self._writer.is_closing():
+            return False
+        self._writer.write(encode_envelope(route, key, frame, coalesce_key).encode("utf-8") + b"\n")
+        return True
+
+class PostgresBus(MessageBus):
+    """
+    Workers on any host share a Postgres NOTIFY channel (needs asyncpg and DATABASE_URL)
+    Frames over the NOTIFY payload limit are only delivered by the publishing worker
+    """
+
+    backend = "postgres"
+
+    def __init__(self, manager: Optional[ConnectionManager] = None,
+                 dsn: Optional[str] = None, channel: Optional[str] = None):
+        super().__init__(manager)
+        self.dsn = dsn or os.getenv("DATABASE_URL")
+        self.channel = channel or os.getenv("WS_BUS_CHANNEL", "morvo_ws")
+        self._connection = None
+        self._outbox: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.stats["reconnects"] = 0
+        self.stats["oversized"] = 0
+
+    async def start(self) -> None:
+        if not self.dsn:
+            raise ValueError("PostgresBus needs DATABASE_URL")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._connection is not None:
+            await self._connection.close()
+
+    def _on_notification(self, connection, pid, channel, payload) -> None:
+        self._on_line(payload)
+
+    async def _run(self) -> None:
+        """Listen on the channel and send queued notifications, reconnecting on failure"""
+        import asyncpg
+
+        delay = 0.5
+        while True:
+            try:
+                self._connection = await asyncpg.connect(self.dsn)
+                await self._connection.add_listener(self.channel, self._on_notification)
+                logger.info(f"Message bus listening on Postgres channel {self.channel}")
+                self.connected.set()
+                delay = 0.5
+                while True:
+                    line = await self._outbox.get()
+                    await self._connection.execute("SELECT pg_notify($1, $2)", self.channel, line)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Postgres message bus unavailable ({e}), retrying in {delay:.1f}s")
+            self.connected.clear()
+            if self._connection is not None:
+                self._connection.terminate()
+                self._connection = None
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 10.0)
+
+    def _transmit(self, route: str, key: Optional[str], frame: str, coalesce_key: Optional[str]) -> bool:
+        if self._connection is None:
+            return False
+        line = encode_envelope(route, key, frame, coalesce_key)
+        if len(line.encode("utf-8")) > POSTGRES_NOTIFY_LIMIT:
+            self.stats["oversized"] += 1
+            logger.warning("Frame exceeds the NOTIFY payload limit, delivering to local sockets only")
+            return False
+        self._outbox.put_nowait(line)
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**super().metrics(), "channel": self.channel, "outbox": self._outbox.qsize()}
+
+BUS_BACKENDS = {
+    "inprocess": MessageBus,
+    "unix": UnixSocketBus,
+    "postgres": PostgresBus
+}
+
+def create_message_bus(manager: Optional[ConnectionManager] = None, backend: Optional[str] = None) -> MessageBus:
+    """Build the bus selected by WS_BUS_BACKEND (inprocess, unix or postgres)"""
+    backend = backend or os.getenv("WS_BUS_BACKEND", "inprocess")
+    if backend not in BUS_BACKENDS:
+        raise ValueError(f"Unknown message bus backend: {backend}")
+    return BUS_BACKENDS[backend](manager)
@@ -16,6 +16,8 @@ import os
 import uvicorn
 from datetime import datetime
 
+from intent_engine import IntentMatcher
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -55,20 +57,18 @@ class ChatResponse(BaseModel):
 active_connections: Dict[str, WebSocket] = {}
 
 # Simple intent detection for Arabic
+INTENT_KEYWORDS = {
+    "greeting": {"مرحبا": 1.0, "أهلا": 1.0, "السلام": 1.0},
+    "website_analysis": {"تحليل": 1.0, "موقع": 1.0, "دراسة": 1.0},
+    "platform_connection": {"منصة": 1.0, "ربط": 1.0, "شوبيفاي": 1.0, "سلة": 1.0},
+    "help": {"مساعدة": 1.0, "كيف": 0.5, "ماذا": 0.5}
+}
+
+intent_matcher = IntentMatcher(INTENT_KEYWORDS, default_intent="general")
+
 def detect_intent(text: str) -> str:
     """Simple Arabic intent detection"""
-    text_lower = text.lower()
-    
-    if any(word in text_lower for word in ["مرحبا", "أهلا", "السلام"]):
-        return "greeting"
-    elif any(word in text_lower for word in ["تحليل", "موقع", "دراسة"]):
-        return "website_analysis"
-    elif any(word in text_lower for word in ["منصة", "ربط", "شوبيفاي", "سلة"]):
-        return "platform_connection"
-    elif any(word in text_lower for word in ["مساعدة", "كيف", "ماذا"]):
-        return "help"
-    else:
-        return "general"
+    return intent_matcher.match(text).intent
 
 # Generate response based on intent
 def generate_response(message: str, intent: str) -> ChatResponse:
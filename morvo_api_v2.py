@@ -1,6 +1,16 @@
 # 🤖 **مورفو AI - FastAPI Integration Server v2.0**
 # Server محدث مع Website Scraping + Chat Engine + Intent Detection
 
+import time
+_import_started = time.perf_counter()
+
+# يجب تفعيل قياس زمن الاستيراد قبل أي استيراد ثقيل (MORVO_IMPORT_PROFILE=true)
+from startup_profiler import (
+    enable_import_profiling, deferred_import, module_available,
+    lazy_component, record_import, budget_report, log_budget_report
+)
+enable_import_profiling()
+
 from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -15,6 +25,20 @@ from pathlib import Path
 import uvicorn
 import warnings
 
+from crew_executor import get_crew_executor, CrewExecutionTimeout
+from llm_cache import get_llm_cache
+from intent_engine import IntentMatcher
+from intent_classifier import IntentBatcher, load_intent_classifier
+from crew_jobs import get_crew_job_queue, register_default_handlers
+from chat_streaming import ChatSocketSession, StreamCancelled, TokenSink, streaming_llm
+from connection_manager import (
+    ConnectionManager, ConnectionLimitExceeded, CLOSE_TRY_AGAIN_LATER, per_message_deflate_enabled
+)
+from message_bus import create_message_bus
+from job_events import job_event_notifier
+from user_profiles import get_user_profiles
+from conversation_log import get_conversation_log, conversation_key
+
 # إزالة التحذيرات غير المهمة
 warnings.filterwarnings("ignore", category=UserWarning)
 warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -30,17 +54,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# مورفو imports
-try:
-    from morvo_website_scraper import MorvoWebsiteScraper, WebsiteAnalysisResult
-    from crewai import Agent, Task, Crew
-    from crewai_tools import ScrapeWebsiteTool
-    logger.info("✅ تم تحميل مورفو modules بنجاح")
-except Exception as e:
-    logger.error(f"❌ خطأ في تحميل المورفو modules: {e}")
-    # في حالة فقدان المورفو modules، استخدم fallback
-    MorvoWebsiteScraper = None
-    WebsiteAnalysisResult = None
+# مورفو imports - CrewAI ووحدة تحليل المواقع تُستورد عند أول استخدام فقط
+crewai = deferred_import("crewai")
+WEBSITE_SCRAPER_AVAILABLE = all(
+    module_available(name) for name in ("crewai", "crewai_tools", "bs4", "aiohttp")
+)
+if WEBSITE_SCRAPER_AVAILABLE:
+    logger.info("✅ وحدات مورفو متوفرة (تحميل مؤجل)")
+else:
+    logger.error("❌ وحدات CrewAI غير متوفرة - تحليل المواقع معطل")
 
 # إعداد FastAPI
 app = FastAPI(
@@ -80,6 +102,7 @@ class WebsiteAnalysisRequest(BaseModel):
     url: str
     organization_id: str
     analysis_type: str = "full"  # full, seo, competitors, quick
+    user_id: Optional[str] = None  # لإرسال التقدم عبر /ws/{user_id}
 
 class OnboardingStep(BaseModel):
     user_id: str
@@ -92,49 +115,56 @@ class PlatformConnectionRequest(BaseModel):
     connection_data: Dict
     organization_id: str
 
-# متغيرات عامة
-website_scraper = None  # Lazy initialization to avoid startup errors
-
-# Connection manager for WebSockets
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-    
-    def get_connection(self, connection_id: str):
-        return self.active_connections.get(connection_id)
-        
-    def add_connection(self, connection_id: str, websocket: WebSocket):
-        self.active_connections[connection_id] = websocket
-        
-    def remove_connection(self, connection_id: str):
-        if connection_id in self.active_connections:
-            del self.active_connections[connection_id]
-            
-    def get_all_connections(self):
-        return self.active_connections.items()
-        
-    def count_connections(self):
-        return len(self.active_connections)
+# قائمة مهام CrewAI الدائمة (SQLite) - تعمل العمليات كعمال مشتركين
+crew_job_queue = get_crew_job_queue()
 
-# Create the connection manager
-# Initialize connection manager at module level
+# Connection manager for WebSockets (indexed by user, organization and topic)
 connection_manager = ConnectionManager()
 
+# ناقل الرسائل بين عمال uvicorn: كل عامل يسلّم الإطار لاتصالاته المحلية (WS_BUS_BACKEND)
+message_bus = create_message_bus(connection_manager)
+
 # ============================================================================
 # 🤖 **محرك المحادثة الذكي مع Intent Detection**
 # ============================================================================
 
+# الكلمات المفتاحية لكل قصد مع أوزانها (تُطبّع العربية قبل المطابقة)
+CHAT_INTENT_KEYWORDS = {
+    "greeting": {"مرحبا": 1.0, "السلام": 1.0, "أهلا": 1.0, "تحية": 1.0},
+    "website_analysis": {"موقع": 1.0, "تحليل": 1.0, "سايت": 1.0, "website": 1.0},
+    "platform_connection": {"ربط": 1.0, "منصة": 1.0, "شوبيفاي": 1.0, "سلة": 1.0, "زد": 0.5},
+    "campaign_creation": {"حملة": 1.0, "إعلان": 1.0, "تسويق": 0.5, "campaign": 1.0},
+    "company_info": {"اسم": 1.0, "شركة": 0.5, "شركتي": 1.0, "اسم شركتي": 1.0}
+}
+
+CHAT_INTENT_MATCHER = IntentMatcher(CHAT_INTENT_KEYWORDS, default_intent="general_question")
+
+# مصنف القصد المحلي (يُحمّل عند بدء التشغيل) مع تجميع الرسائل المتزامنة في دفعة واحدة
+intent_batcher = IntentBatcher()
+INTENT_ESCALATION_THRESHOLD = float(os.getenv("INTENT_ESCALATION_THRESHOLD", "0.45"))
+
+# سجل المحادثات لكل جلسة: نافذة آخر الأدوار وملخص ما قبلها لسياق CrewAI
+conversation_log = get_conversation_log()
+
 class MorvoConversationEngine:
     """محرك المحادثة الذكي لمورفو"""
     
-    def __init__(self):
-        self.intent_classifier = self._create_intent_classifier()
-        self.response_generator = self._create_response_generator()
-        self.onboarding_manager = self._create_onboarding_manager()
-        
+    # الوكلاء تُنشأ عند أول استخدام فقط حتى لا يبطئ استيراد الخادم
+    @lazy_component
+    def intent_classifier(self):
+        return self._create_intent_classifier()
+    
+    @lazy_component
+    def response_generator(self):
+        return self._create_response_generator()
+    
+    @lazy_component
+    def onboarding_manager(self):
+        return self._create_onboarding_manager()
+    
     def _create_intent_classifier(self):
         """🎯 وكيل تصنيف القصد"""
-        return Agent(
+        return crewai.Agent(
             role="Arabic Intent Classifier",
             goal="فهم قصد المستخدم من الرسائل العربية وتصنيفها بدقة",
             backstory="""أنت خبير في تحليل اللغة العربية الطبيعية وفهم احتياجات المستخدمين في التسويق الرقمي.
@@ -147,7 +177,10 @@ class MorvoConversationEngine:
     
     def _create_response_generator(self):
         """📝 وكيل توليد الردود"""
-        return Agent(
+        # LLM ببث الرموز حتى تصل الردود إلى WebSocket أثناء توليدها
+        llm = streaming_llm()
+        return crewai.Agent(
+            **({"llm": llm} if llm is not None else {}),
             role="Morvo Response Generator",
             goal="توليد ردود ذكية ومفيدة ومحادثية باللغة العربية",
             backstory="""أنت مورفو، المساعد الذكي للتسويق الرقمي. تتحدث بالعربية بطريقة ودودة ومحترفة.
@@ -160,7 +193,7 @@ class MorvoConversationEngine:
     
     def _create_onboarding_manager(self):
         """👋 مدير عملية التسجيل"""
-        return Agent(
+        return crewai.Agent(
             role="Onboarding Specialist",
             goal="إرشاد المستخدمين الجدد خلال عملية التسجيل والإعداد بطريقة محادثية",
             backstory="""خبير في تجربة المستخدم وإعداد الحسابات الجديدة للتسويق الرقمي.
@@ -171,15 +204,46 @@ class MorvoConversationEngine:
             allow_delegation=False
         )
 
-    async def process_message(self, message: ChatMessage) -> Dict:
-        """معالجة رسالة المستخدم وإنتاج رد ذكي"""
+    async def _generate_with_crew(self, content: str, sink: Optional[TokenSink] = None,
+                                  history: str = "") -> Optional[str]:
+        """توليد رد عبر وكيل الردود عندما يكون تصنيف القصد غير مؤكد (مع بث الرموز إلى sink إن وُجد)"""
+        if not os.getenv("OPENAI_API_KEY"):
+            return None
+        
+        try:
+            history_block = f"سياق المحادثة السابقة (للرجوع إليه فقط):\n{history}\n\n" if history else ""
+            task = crewai.Task(
+                description=f"""{history_block}أجب على رسالة المستخدم التالية بالعربية بأسلوب مورفو الودود والمحترف: "{content}"
+                قدّم معلومات مفيدة واقتراحات عملية في التسويق الرقمي.""",
+                expected_output="رد محادثي مختصر باللغة العربية",
+                agent=self.response_generator
+            )
+            crew = crewai.Crew(agents=[self.response_generator], tasks=[task], verbose=False)
+            kickoff = sink.bind(get_llm_cache().kickoff) if sink else get_llm_cache().kickoff
+            return await get_crew_executor().run(kickoff, crew)
+        except (CrewExecutionTimeout, StreamCancelled):
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ تعذر التصعيد إلى CrewAI: {e}")
+            return None
+    
+    async def process_message(self, message: ChatMessage, sink: Optional[TokenSink] = None) -> Dict:
+        """معالجة رسالة المستخدم وإنتاج رد ذكي (sink: بث رموز رد CrewAI أثناء توليده)"""
         
         try:
-            # منطق بسيط للبداية - يمكن تطويره لاحقاً
-            content = message.content.lower().strip()
+            # السجل مفهرس بالمستخدم والجلسة معاً: معرف الجلسة يأتي من العميل وقد يتكرر بين المستخدمين
+            conversation = conversation_key(message.user_id, message.session_id or f"session_{message.user_id}")
+            seq = await asyncio.to_thread(conversation_log.append, conversation, "user", message.content)
             
-            # تحديد القصد بطريقة بسيطة
-            if any(word in content for word in ["مرحبا", "السلام", "أهلا", "تحية"]):
+            # تحديد القصد: الكلمات المفتاحية أولاً، والنموذج المحلي فقط للرسائل التي لا تحتوي أياً منها
+            intent_match = CHAT_INTENT_MATCHER.match(message.content)
+            if not intent_match.matched:
+                model_match = await intent_batcher.classify(message.content)
+                if model_match is not None and model_match.confidence >= INTENT_ESCALATION_THRESHOLD:
+                    intent_match = model_match
+            intent = intent_match.intent
+            
+            if intent == "greeting":
                 intent = "greeting"
                 response_content = "مرحباً! 👋 أنا مورفو، مساعدتك الذكية في التسويق الرقمي. كيف يمكنني مساعدتك اليوم؟"
                 components = [
@@ -195,13 +259,11 @@ class MorvoConversationEngine:
                     }
                 ]
                 
-            elif any(word in content for word in ["موقع", "تحليل", "سايت", "website"]):
-                intent = "website_analysis"
+            elif intent == "website_analysis":
                 response_content = "ممتاز! 🔍 أستطيع تحليل موقعك الإلكتروني بشكل شامل. أرسل لي رابط الموقع وسأقوم بتحليل:\n\n• نوع العمل والصناعة\n• تحليل SEO شامل\n• التوافق مع السوق السعودي\n• تحليل المنافسين\n• توصيات للتحسين"
                 components = []
                 
-            elif any(word in content for word in ["ربط", "منصة", "شوبيفاي", "سلة", "زد"]):
-                intent = "platform_connection"
+            elif intent == "platform_connection":
                 response_content = "رائع! 🔗 أستطيع مساعدتك في ربط منصاتك التجارية. أي منصة تريد ربطها؟"
                 components = [
                     {
@@ -216,16 +278,13 @@ class MorvoConversationEngine:
                     }
                 ]
                 
-            elif any(word in content for word in ["حملة", "إعلان", "تسويق", "campaign"]):
-                intent = "campaign_creation"
+            elif intent == "campaign_creation":
                 response_content = "ممتاز! 📈 دعنا ننشئ حملة تسويقية ذكية. أحتاج لمعرفة:\n\n• نوع المنتج أو الخدمة\n• الجمهور المستهدف\n• الميزانية المتاحة\n• أهداف الحملة"
                 components = []
                 
-            elif any(word in content for word in ["اسم", "شركة", "شركتي", "اسم شركتي"]):
-                intent = "company_info"
-                
+            elif intent == "company_info":
                 # التحقق من وجود معلومات الشركة المحفوظة
-                company_name = get_user_data(message.user_id, 'company_name')
+                company_name = await get_user_data(message.user_id, 'company_name')
                 
                 if company_name:
                     response_content = f"اسم شركتك هو: **{company_name}** 🏢\n\nهل تريد تحديث هذه المعلومات أم تحتاج مساعدة أخرى؟"
@@ -254,19 +313,37 @@ class MorvoConversationEngine:
                     ]
                 
             else:
-                intent = "general_question"
                 response_content = "أفهم أنك تحتاج مساعدة في التسويق الرقمي. 🤔 هل يمكنك توضيح أكثر كيف يمكنني مساعدتك؟"
                 components = []
             
+            # التصعيد إلى CrewAI عندما لا تجد الكلمات المفتاحية ولا النموذج قصداً واضحاً
+            escalated = False
+            if intent == "general_question":
+                context = await asyncio.to_thread(conversation_log.context, conversation, None, seq)
+                try:
+                    crew_reply = await self._generate_with_crew(message.content, sink, conversation_log.render(context))
+                except CrewExecutionTimeout:
+                    logger.warning(f"⚠️ انتهت مهلة CrewAI للمستخدم {message.user_id}، استخدام الرد البسيط")
+                    crew_reply = None
+                if crew_reply:
+                    response_content = crew_reply
+                    components = []
+                    escalated = True
+            
+            await asyncio.to_thread(conversation_log.append, conversation, "assistant", response_content)
             return {
                 "content": response_content,
                 "message_type": "assistant",
                 "components": components,
                 "intent_detected": intent,
-                "confidence_score": 0.85,
+                "confidence_score": intent_match.confidence,
+                "escalated_to_crew": escalated,
                 "next_actions": ["يمكنك سؤالي عن أي شيء متعلق بالتسويق الرقمي"]
             }
             
+        except StreamCancelled:
+            # العميل أوقف الاستماع: لا رد ولا تسجيل لدور المساعد
+            raise
         except Exception as e:
             logger.error(f"خطأ في معالجة المحادثة: {str(e)}")
             return {
@@ -296,26 +373,21 @@ except Exception as e:
     logger.warning("⚠️ تم إنشاء محرك محادثة وهمي للتوافق")
 
 # ============================================================================
-# 💾 **User Data Storage (Simple In-Memory for now)**
+# 💾 **User Data Storage**
 # ============================================================================
 
-# قاموس مؤقت لحفظ معلومات المستخدمين
-user_data: Dict[str, Dict] = {}
+# ملفات المستخدمين: ذاكرة LRU محدودة فوق جدول SQLite/Postgres يُكتب إليه على دفعات
+user_profiles = get_user_profiles()
 
-def save_user_data(user_id: str, data: Dict):
+async def save_user_data(user_id: str, data: Dict):
     """حفظ بيانات المستخدم"""
-    if user_id not in user_data:
-        user_data[user_id] = {}
-    user_data[user_id].update(data)
-    logger.info(f"💾 تم حفظ بيانات المستخدم {user_id}: {data}")
+    await user_profiles.update(user_id, data)
+    # أسماء الحقول فقط - القيم قد تحتوي بيانات شخصية
+    logger.info(f"💾 تم حفظ بيانات المستخدم {user_id}: {sorted(data)}")
 
-def get_user_data(user_id: str, key: str = None):
+async def get_user_data(user_id: str, key: str = None):
     """استرجاع بيانات المستخدم"""
-    if user_id not in user_data:
-        return None
-    if key:
-        return user_data[user_id].get(key)
-    return user_data[user_id]
+    return await user_profiles.get(user_id, key)
 
 @app.post("/api/v2/user/data")
 async def save_user_info(request: Dict):
@@ -324,7 +396,7 @@ async def save_user_info(request: Dict):
         user_id = request.get('user_id', 'default_user')
         data = request.get('data', {})
         
-        save_user_data(user_id, data)
+        await save_user_data(user_id, data)
         
         return {
             "status": "success",
@@ -344,21 +416,27 @@ async def save_user_info(request: Dict):
 # ============================================================================
 
 @app.post("/api/v2/website/analyze", response_model=Dict)
-async def analyze_website(
-    request: WebsiteAnalysisRequest,
-    background_tasks: BackgroundTasks
-) -> Dict:
+async def analyze_website(request: WebsiteAnalysisRequest) -> Dict:
     """🔍 تحليل موقع إلكتروني شامل"""
     
     try:
         logger.info(f"🚀 بدء تحليل الموقع: {request.url}")
         
-        # بدء التحليل في الخلفية
-        background_tasks.add_task(
-            perform_website_analysis,
-            request.url,
-            request.organization_id,
-            request.analysis_type
+        # التحقق من توفر الوحدة
+        if not WEBSITE_SCRAPER_AVAILABLE:
+            logger.warning("⚠️ وحدة تحليل المواقع غير متوفرة")
+            return {
+                "status": "error",
+                "message": "خدمة تحليل المواقع غير متوفرة حالياً",
+                "url": request.url
+            }
+        
+        # إضافة التحليل إلى قائمة المهام الدائمة
+        analysis_id = await crew_job_queue.submit(
+            "website_analysis",
+            {"url": request.url, "analysis_type": request.analysis_type},
+            user_id=request.user_id,
+            organization_id=request.organization_id
         )
         
         return {
@@ -366,7 +444,7 @@ async def analyze_website(
             "message": "جاري تحليل الموقع، ستصلك النتائج قريباً",
             "url": request.url,
             "estimated_time": "2-5 دقائق",
-            "analysis_id": f"analysis_{int(datetime.now().timestamp())}"
+            "analysis_id": analysis_id
         }
         
     except Exception as e:
@@ -377,85 +455,53 @@ async def analyze_website(
             "error": str(e)
         }
 
-async def perform_website_analysis(url: str, org_id: str, analysis_type: str):
-    """تنفيذ تحليل الموقع في الخلفية"""
+@app.get("/api/v2/website/analysis/{analysis_id}")
+async def get_analysis_result(analysis_id: str) -> Dict:
+    """استرجاع نتائج تحليل الموقع"""
     
     try:
-        logger.info(f"🔍 تنفيذ تحليل الموقع: {url}")
-        
-        # التحقق من توفر الوحدة
-        if MorvoWebsiteScraper is None:
-            logger.warning("⚠️ وحدة تحليل المواقع غير متوفرة")
-            # إرسال إشعار بالفشل
-            await notify_analysis_complete(org_id, {
-                "status": "failed",
-                "message": "خدمة تحليل المواقع غير متوفرة حالياً",
-                "url": url
-            })
-            return
-        
-        # تنفيذ التحليل
-        global website_scraper
-        if website_scraper is None:
-            website_scraper = MorvoWebsiteScraper()
-        analysis_result = await website_scraper.analyze_website(url)
-        
-        # حفظ النتائج في قاعدة البيانات (ستتم إضافة Supabase لاحقاً)
-        logger.info(f"✅ اكتمل تحليل الموقع: {url}")
-        
-        # إرسال إشعار للمستخدم عبر WebSocket
-        await notify_analysis_complete(org_id, analysis_result)
+        job = await crew_job_queue.get(analysis_id)
+        if job is None:
+            return {
+                "status": "error",
+                "message": "لم يتم العثور على التحليل",
+                "analysis_id": analysis_id
+            }
         
+        return {
+            "analysis_id": analysis_id,
+            "status": job["status"],
+            "url": job["payload"].get("url"),
+            "progress": job["progress"],
+            "results": job["result"],
+            "error": job["error"],
+            "created_at": datetime.fromtimestamp(job["created_at"]).isoformat(),
+            "finished_at": datetime.fromtimestamp(job["finished_at"]).isoformat() if job["finished_at"] else None
+        }
     except Exception as e:
-        logger.error(f"❌ خطأ في تحليل الموقع {url}: {str(e)}")
-        # إرسال إشعار بالفشل
-        await notify_analysis_complete(org_id, {
+        logger.error(f"خطأ في استرجاع نتائج التحليل: {str(e)}")
+        return {
             "status": "error",
-            "message": f"خطأ في التحليل: {str(e)}",
-            "url": url
-        })
-
-async def notify_analysis_complete(org_id: str, result: Any):
-    """إشعار المستخدم باكتمال التحليل"""
-    
-    try:
-        # البحث عن اتصالات WebSocket نشطة للمؤسسة
-        for connection_id, websocket in connection_manager.get_all_connections():
-            if org_id in connection_id:
-                await websocket.send_json({
-                    "type": "website_analysis_complete",
-                    "data": {
-                        "title": result.title,
-                        "business_type": result.business_type,
-                        "confidence_score": result.confidence_score,
-                        "recommendations_count": len(result.recommendations)
-                    },
-                    "message": "🎉 اكتمل تحليل موقعك! إليك النتائج:",
-                    "timestamp": datetime.now().isoformat()
-                })
-    except Exception as e:
-        logger.error(f"خطأ في إرسال الإشعار: {str(e)}")
+            "message": "خطأ في استرجاع النتائج",
+            "error": str(e)
+        }
 
-@app.get("/api/v2/website/analysis/{analysis_id}")
-async def get_analysis_result(analysis_id: str) -> Dict:
-    """استرجاع نتائج تحليل الموقع"""
+@app.post("/api/v2/website/analysis/{analysis_id}/cancel")
+async def cancel_analysis(analysis_id: str) -> Dict:
+    """⛔ إلغاء تحليل موقع قيد الانتظار أو التنفيذ"""
     
     try:
-        # هنا ستتم استراجع النتائج من قاعدة البيانات
+        cancelled = await crew_job_queue.cancel(analysis_id)
         return {
             "analysis_id": analysis_id,
-            "status": "مكتمل",
-            "results": {
-                "title": "متجر المثال",
-                "business_type": "تجارة إلكترونية",
-                "confidence_score": 0.92
-            }
+            "status": "cancelled" if cancelled else "not_cancellable",
+            "message": "تم إلغاء التحليل" if cancelled else "التحليل غير موجود أو انتهى بالفعل"
         }
     except Exception as e:
-        logger.error(f"خطأ في استرجاع نتائج التحليل: {str(e)}")
+        logger.error(f"خطأ في إلغاء التحليل: {str(e)}")
         return {
             "status": "error",
-            "message": "خطأ في استرجاع النتائج",
+            "message": "خطأ في إلغاء التحليل",
             "error": str(e)
         }
 
@@ -491,11 +537,26 @@ async def send_chat_message(message: ChatMessage):
 
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
+    """
+    محادثة مباشرة مع مورفو
+
+    البث اختياري: ?stream=true عند الاتصال أو "stream": true في الرسالة يرسل الرد كإطارات
+    message_start ثم delta ثم message_end، وإطار {"type": "cancel"} يلغي الرد الجاري
+    """
     await websocket.accept()
-    connection_id = f"user_{user_id}_{datetime.now().timestamp()}"
+    stream = websocket.query_params.get("stream", "false").lower() == "true"
     
-    # Add connection
-    connection_manager.add_connection(connection_id, websocket)
+    # تسجيل الاتصال (لكل تبويب معرف خاص) وفهرسته بالمستخدم والمؤسسة
+    try:
+        connection_id = connection_manager.connect(
+            websocket,
+            user_id=user_id,
+            org_id=websocket.query_params.get("organization_id")
+        )
+    except ConnectionLimitExceeded as e:
+        logger.warning(f"رفض اتصال WebSocket: {e}")
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+        return
     
     try:
         # رسالة ترحيب
@@ -505,36 +566,45 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
             "timestamp": datetime.now().isoformat()
         })
         
-        while True:
-            # استقبال الرسائل
-            data = await websocket.receive_json()
-            
-            # معالجة الرسالة
-            message = ChatMessage(
-                content=data.get("content", ""),
-                user_id=user_id,
-                session_id=data.get("session_id", ""),
-                metadata=data.get("metadata", {})
-            )
-            
-            # الحصول على رد من مورفو
-            response = await conversation_engine.process_message(message)
-            
-            # إرسال الرد
-            await websocket.send_json({
-                "type": "message",
-                "content": response.content,
-                "components": response.components,
-                "intent_detected": response.intent_detected,
-                "timestamp": datetime.now().isoformat()
-            })
-            
+        async with ChatSocketSession(websocket, stream=stream,
+                                     on_frame=lambda: connection_manager.touch(connection_id),
+                                     on_pong=lambda: connection_manager.touch(connection_id, pong=True)) as session:
+            # استقبال الرسائل حتى انقطاع الاتصال
+            while (data := await session.receive()) is not None:
+                # الاشتراك في المواضيع: {"type": "subscribe", "topics": [...]}
+                if data.get("type") in ("subscribe", "unsubscribe"):
+                    update = connection_manager.subscribe if data["type"] == "subscribe" else connection_manager.unsubscribe
+                    for topic in data.get("topics", []):
+                        update(connection_id, topic)
+                    continue
+                
+                message = ChatMessage(
+                    content=data.get("content", ""),
+                    user_id=user_id,
+                    session_id=data.get("session_id", ""),
+                    metadata=data.get("metadata", {})
+                )
+                
+                # الحصول على رد من مورفو وإرساله (كاملاً أو مبثوثاً)
+                await session.respond(
+                    lambda sink: conversation_engine.process_message(message, sink),
+                    lambda response: {
+                        "type": "message",
+                        "content": response["content"],
+                        "components": response.get("components", []),
+                        "intent_detected": response.get("intent_detected"),
+                        "timestamp": datetime.now().isoformat()
+                    },
+                    stream=data.get("stream")
+                )
+        
+        logger.info(f"انقطع اتصال WebSocket: {user_id}")
     except WebSocketDisconnect:
         logger.info(f"انقطع اتصال WebSocket: {user_id}")
-        connection_manager.remove_connection(connection_id)
     except Exception as e:
         logger.error(f"خطأ في WebSocket: {str(e)}")
-        connection_manager.remove_connection(connection_id)
+    finally:
+        connection_manager.disconnect(connection_id)
 
 # ============================================================================
 # 🎯 **Onboarding & User Setup Endpoints**
@@ -789,7 +859,7 @@ async def get_alerts_status():
             "campaign_performance",
             "market_trend"
         ],
-        "websocket_connections": connection_manager.count_connections() if hasattr(connection_manager, 'count_connections') else 0,
+        "websocket_connections": connection_manager.count_connections(),
         "message": "نظام التنبيهات الذكية يعمل بكفاءة"
     }
 
@@ -814,17 +884,14 @@ async def run_smart_alerts_check(organization_id: str):
         logger.error(f"خطأ في فحص التنبيهات: {str(e)}")
 
 async def broadcast_alert(alert_data: dict):
-    """إرسال تنبيه لجميع المتصلين"""
+    """إرسال تنبيه لاتصالات المؤسسة المعنية والاتصالات التي لم تحدد مؤسسة (أو لجميع المتصلين إن لم تُحدد مؤسسة)"""
     try:
-        # Broadcast to all connections
-        for connection_id, websocket in connection_manager.get_all_connections():
-            try:
-                await websocket.send_json({
-                    "type": "alert",
-                    "data": alert_data
-                })
-            except Exception as e:
-                logger.error(f"Error sending alert to {connection_id}: {str(e)}")
+        message = {"type": "alert", "data": alert_data}
+        org_id = alert_data.get("organization_id")
+        if org_id:
+            message_bus.publish_alert_to_org(org_id, message)
+        else:
+            message_bus.broadcast(message)
     except Exception as e:
         logger.error(f"Broadcast error: {str(e)}")
 
@@ -833,8 +900,8 @@ async def broadcast_alert(alert_data: dict):
 # ============================================================================
 
 @app.get("/health")
-async def health_check():
-    """✅ فحص صحة الخادم - Enhanced for Railway deployment"""
+async def health_check(verbose: bool = False):
+    """✅ فحص صحة الخادم - Enhanced for Railway deployment (verbose=true يضيف تقرير زمن البدء)"""
     try:
         # Check WebSocket connections safely
         try:
@@ -848,7 +915,13 @@ async def health_check():
             "fastapi": "active",
             "websocket": websocket_status,
             "chat_engine": "active" if conversation_engine else "fallback mode",
-            "website_scraper": "active" if MorvoWebsiteScraper else "disabled"
+            "website_scraper": "active" if WEBSITE_SCRAPER_AVAILABLE else "disabled",
+            "crew_executor": get_crew_executor().metrics(),
+            "crew_jobs": crew_job_queue.metrics(),
+            "llm_cache": get_llm_cache().metrics(),
+            "intent_classifier": intent_batcher.metrics(),
+            "connections": connection_manager.metrics(),
+            "message_bus": message_bus.metrics()
         }
         
         return {
@@ -857,7 +930,8 @@ async def health_check():
             "version": "2.0.0",
             "environment": "Railway Production",
             "services": services,
-            "uptime": "running"
+            "uptime": "running",
+            **({"startup": budget_report(verbose=True)} if verbose else {})
         }
     except Exception as e:
         # Return 200 with warning status instead of 500 to avoid health check failures
@@ -895,6 +969,29 @@ async def root():
         ]
     }
 
+@app.on_event("startup")
+async def startup_event():
+    """تحميل مصنف القصد وتشغيل عمال قائمة مهام CrewAI"""
+    log_budget_report()
+    await message_bus.start()
+    connection_manager.start_heartbeat()
+    intent_batcher.model = await asyncio.to_thread(load_intent_classifier)
+    
+    if WEBSITE_SCRAPER_AVAILABLE:
+        register_default_handlers(crew_job_queue)
+    crew_job_queue.set_notifier(job_event_notifier(message_bus))
+    await crew_job_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """إيقاف عمال قائمة المهام - المهام الجارية تُستأنف بعد انتهاء مهلتها"""
+    await crew_job_queue.stop()
+    await connection_manager.stop_heartbeat()
+    await message_bus.stop()
+    await user_profiles.close()
+
+record_import("morvo_api_v2", time.perf_counter() - _import_started)
+
 # ============================================================================
 # 🚀 **تشغيل الخادم**
 # ============================================================================
@@ -913,5 +1010,6 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=port,
         reload=True,
-        log_level="info"
+        log_level="info",
+        ws_per_message_deflate=per_message_deflate_enabled()
     )
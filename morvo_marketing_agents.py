@@ -18,6 +18,8 @@ import asyncio
 from typing import Dict, List, Optional, Any, Union
 from datetime import datetime
 import logging
+from contextlib import ExitStack
+from functools import lru_cache
 
 # Initialize CrewAI
 from crewai import Agent, Task, Crew, Process
@@ -27,6 +29,12 @@ from crewai_tools import SerperDevTool
 # Import SEMrush integration
 from semrush_supabase_integration import get_semrush_supabase_manager
 
+# Blocking crew runs go through the shared worker pool
+from crew_executor import get_crew_executor
+from agent_pool import AgentPool
+from task_graph import TaskGraph
+from llm_cache import get_llm_cache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("morvo_marketing_agents")
@@ -173,8 +181,9 @@ Be technically precise while making insights accessible to non-technical stakeho
 """
 
 # Optional tools setup
+@lru_cache(maxsize=1)
 def get_search_tool():
-    """Get search tool if API key is available, otherwise return None."""
+    """Get search tool if API key is available, otherwise return None (built once per process)."""
     serper_api_key = os.getenv("SERPER_API_KEY")
     if serper_api_key:
         return SerperDevTool(api_key=serper_api_key)
@@ -207,87 +216,80 @@ class SEMrushTool:
         data = asyncio.run(self.get_keyword_data(keyword))
         return json.dumps(data, indent=2)
 
-# Function to create agents
-def create_marketing_agents(model_name=None):
+# Agent definitions (role, goal, backstory) per agent type
+AGENT_SPECS = {
+    "m1": ("Strategic Analysis Agent",
+           "Provide comprehensive market and competitor analysis with strategic recommendations",
+           M1_ROLE),
+    "m2": ("Social Media Monitoring Agent",
+           "Track and analyze social media presence, engagement, and sentiment",
+           M2_ROLE),
+    "m3": ("Campaign Optimization Agent",
+           "Maximize marketing campaign ROI through data-driven optimization",
+           M3_ROLE),
+    "m4": ("Content Strategy Agent",
+           "Develop effective content strategies aligned with business goals and audience needs",
+           M4_ROLE),
+    "m5": ("Data Analytics Agent",
+           "Transform marketing data into actionable insights and visualizations",
+           M5_ROLE),
+}
+
+def get_default_model(model_name=None):
+    """Resolve the model name from the argument, environment, or default."""
+    return model_name or os.getenv("OPENAI_MODEL_NAME", "gpt-4o")
+
+def build_marketing_agent(agent_type, model):
     """
-    Create the M1-M5 marketing agents.
+    Build a single M1-M5 agent.
     
     Args:
-        model_name: Optional model name to use for agents
+        agent_type: The type of agent (m1, m2, m3, m4, m5)
+        model: Model name for the agent's LLM
     
     Returns:
-        Dictionary of agents
+        Agent instance
     """
-    # Use environment variable or default if model not specified
-    model = model_name or os.getenv("OPENAI_MODEL_NAME", "gpt-4o")
+    if agent_type not in AGENT_SPECS:
+        raise ValueError(f"Unknown agent type: {agent_type}")
     
-    # Set up tools
+    role, goal, backstory = AGENT_SPECS[agent_type]
     search_tool = get_search_tool()
-    semrush_tool = SEMrushTool()
-    
-    # Define agent tools
-    m1_tools = []
-    if search_tool:
-        m1_tools.append(search_tool)
-    
-    # Create the agents
-    m1_agent = Agent(
-        role="Strategic Analysis Agent",
-        goal="Provide comprehensive market and competitor analysis with strategic recommendations",
-        backstory=M1_ROLE,
-        verbose=True,
-        allow_delegation=True,
-        tools=m1_tools,
-        llm=model
-    )
-    
-    m2_agent = Agent(
-        role="Social Media Monitoring Agent",
-        goal="Track and analyze social media presence, engagement, and sentiment",
-        backstory=M2_ROLE,
-        verbose=True,
-        allow_delegation=True,
-        tools=[search_tool] if search_tool else [],
-        llm=model
-    )
     
-    m3_agent = Agent(
-        role="Campaign Optimization Agent",
-        goal="Maximize marketing campaign ROI through data-driven optimization",
-        backstory=M3_ROLE,
-        verbose=True,
-        allow_delegation=True,
-        tools=[search_tool] if search_tool else [],
-        llm=model
-    )
-    
-    m4_agent = Agent(
-        role="Content Strategy Agent",
-        goal="Develop effective content strategies aligned with business goals and audience needs",
-        backstory=M4_ROLE,
+    return Agent(
+        role=role,
+        goal=goal,
+        backstory=backstory,
         verbose=True,
         allow_delegation=True,
         tools=[search_tool] if search_tool else [],
         llm=model
     )
+
+# Warm agents shared across requests, built lazily per (agent type, model)
+marketing_agent_pool = AgentPool(build_marketing_agent)
+
+# Function to create agents
+def create_marketing_agents(model_name=None):
+    """
+    Create the M1-M5 marketing agents.
     
-    m5_agent = Agent(
-        role="Data Analytics Agent",
-        goal="Transform marketing data into actionable insights and visualizations",
-        backstory=M5_ROLE,
-        verbose=True,
-        allow_delegation=True,
-        tools=[search_tool] if search_tool else [],
-        llm=model
-    )
+    Args:
+        model_name: Optional model name to use for agents
     
-    return {
-        "m1": m1_agent,
-        "m2": m2_agent,
-        "m3": m3_agent,
-        "m4": m4_agent,
-        "m5": m5_agent
-    }
+    Returns:
+        Dictionary of agents
+    """
+    model = get_default_model(model_name)
+    return {agent_type: build_marketing_agent(agent_type, model) for agent_type in AGENT_SPECS}
+
+# Agent types per crew, in execution order
+CREW_AGENT_TYPES = {
+    "market_analysis": ["m1", "m5"],              # Market Analysis Crew (M1 + M5)
+    "content_social": ["m2", "m4"],               # Content & Social Crew (M2 + M4)
+    "campaign_execution": ["m3", "m2", "m5"],     # Campaign Execution Crew (M3 + M2 + M5)
+    "complete_marketing": ["m1", "m2", "m3", "m4", "m5"]  # Complete Marketing Automation
+}
 
 # Function to create marketing crews
 def create_marketing_crews(agents):
@@ -300,43 +302,14 @@ def create_marketing_crews(agents):
     Returns:
         Dictionary of crews
     """
-    # Market Analysis Crew (M1 + M5)
-    market_analysis_crew = Crew(
-        agents=[agents["m1"], agents["m5"]],
-        tasks=[],  # Tasks will be added dynamically
-        verbose=True,
-        process=Process.sequential  # Sequential process for analysis workflow
-    )
-    
-    # Content & Social Crew (M2 + M4)
-    content_social_crew = Crew(
-        agents=[agents["m2"], agents["m4"]],
-        tasks=[],  # Tasks will be added dynamically
-        verbose=True,
-        process=Process.sequential
-    )
-    
-    # Campaign Execution Crew (M3 + M2 + M5)
-    campaign_execution_crew = Crew(
-        agents=[agents["m3"], agents["m2"], agents["m5"]],
-        tasks=[],  # Tasks will be added dynamically
-        verbose=True,
-        process=Process.sequential
-    )
-    
-    # Complete Marketing Automation (All M1-M5)
-    complete_marketing_crew = Crew(
-        agents=list(agents.values()),
-        tasks=[],  # Tasks will be added dynamically
-        verbose=True,
-        process=Process.sequential
-    )
-    
     return {
-        "market_analysis": market_analysis_crew,
-        "content_social": content_social_crew,
-        "campaign_execution": campaign_execution_crew,
-        "complete_marketing": complete_marketing_crew
+        crew_type: Crew(
+            agents=[agents[agent_type] for agent_type in agent_types],
+            tasks=[],  # Tasks will be added dynamically
+            verbose=True,
+            process=Process.sequential
+        )
+        for crew_type, agent_types in CREW_AGENT_TYPES.items()
     }
 
 # Helper function to create a strategic analysis task
@@ -457,43 +430,48 @@ def create_data_analytics_task(agent, brand, dataset=None, time_period=None, met
         context=[prompt]
     )
 
+# Task builder for each agent type
+TASK_BUILDERS = {
+    "m1": create_strategic_analysis_task,
+    "m2": create_social_monitoring_task,
+    "m3": create_campaign_optimization_task,
+    "m4": create_content_strategy_task,
+    "m5": create_data_analytics_task
+}
+
 # Function to run a single agent task
-async def run_agent_task(agent_type, **kwargs):
+async def run_agent_task(agent_type, model_name=None, bypass_cache=False, **kwargs):
     """
     Run a single agent task.
     
     Args:
         agent_type: The type of agent (m1, m2, m3, m4, m5)
+        model_name: Optional model name to use for the agent
+        bypass_cache: Force a fresh LLM run instead of reusing a cached response
         **kwargs: Parameters for the specific task
     
     Returns:
         Task output
     """
-    agents = create_marketing_agents()
-    
-    if agent_type == "m1":
-        task = create_strategic_analysis_task(agents["m1"], **kwargs)
-    elif agent_type == "m2":
-        task = create_social_monitoring_task(agents["m2"], **kwargs)
-    elif agent_type == "m3":
-        task = create_campaign_optimization_task(agents["m3"], **kwargs)
-    elif agent_type == "m4":
-        task = create_content_strategy_task(agents["m4"], **kwargs)
-    elif agent_type == "m5":
-        task = create_data_analytics_task(agents["m5"], **kwargs)
-    else:
+    if agent_type not in TASK_BUILDERS:
         raise ValueError(f"Unknown agent type: {agent_type}")
     
-    # Create a simple crew with just this agent and task
-    crew = Crew(
-        agents=[agents[agent_type]],
-        tasks=[task],
-        verbose=True,
-        process=Process.sequential
-    )
+    model = get_default_model(model_name)
     
-    # Run the crew and return results
-    result = crew.kickoff()
+    # Borrow a warm agent for the duration of this run
+    with marketing_agent_pool.checkout(agent_type, model) as agent:
+        task = TASK_BUILDERS[agent_type](agent, **kwargs)
+        
+        # Create a simple crew with just this agent and task
+        crew = Crew(
+            agents=[agent],
+            tasks=[task],
+            verbose=True,
+            process=Process.sequential
+        )
+        
+        # Run the crew on the worker pool (or reuse an identical cached run)
+        result = await get_crew_executor().run(get_llm_cache().kickoff, crew, bypass=bypass_cache)
     
     # Format result for API response
     return {
@@ -503,61 +481,83 @@ async def run_agent_task(agent_type, **kwargs):
         "task_type": task.description
     }
 
+# Tasks that need the output of other agents in the same crew (passed as task context)
+TASK_DEPENDENCIES = {
+    "m3": ["m1", "m5"],  # Campaign optimization builds on strategy and analytics
+    "m4": ["m1", "m2"]   # Content strategy builds on strategy and social insights
+}
+
+def _single_task_runner(agent, task, bypass_cache=False):
+    """Build a graph node that kicks off a one-task crew"""
+    def run(upstream):
+        crew = Crew(
+            agents=[agent],
+            tasks=[task],
+            verbose=True,
+            process=Process.sequential
+        )
+        # Upstream outputs are part of the task context, so they are part of the cache key too
+        return get_llm_cache().kickoff(crew, bypass=bypass_cache)
+    return run
+
 # Function to run a crew workflow
-async def run_crew_workflow(crew_type, **kwargs):
+async def run_crew_workflow(crew_type, model_name=None, bypass_cache=False, **kwargs):
     """
     Run a marketing crew workflow.
     
     Args:
         crew_type: The type of crew (market_analysis, content_social, campaign_execution, complete_marketing)
+        model_name: Optional model name to use for the agents
+        bypass_cache: Force fresh LLM runs instead of reusing cached responses
         **kwargs: Parameters for the tasks
     
     Returns:
         Crew output
     """
-    agents = create_marketing_agents()
-    crews = create_marketing_crews(agents)
-    
-    if crew_type not in crews:
+    if crew_type not in CREW_AGENT_TYPES:
         raise ValueError(f"Unknown crew type: {crew_type}")
     
-    crew = crews[crew_type]
-    
-    # Add appropriate tasks based on crew type
-    if crew_type == "market_analysis":
-        crew.tasks = [
-            create_strategic_analysis_task(agents["m1"], **kwargs),
-            create_data_analytics_task(agents["m5"], **kwargs)
-        ]
-    elif crew_type == "content_social":
-        crew.tasks = [
-            create_social_monitoring_task(agents["m2"], **kwargs),
-            create_content_strategy_task(agents["m4"], **kwargs)
-        ]
-    elif crew_type == "campaign_execution":
-        crew.tasks = [
-            create_campaign_optimization_task(agents["m3"], **kwargs),
-            create_social_monitoring_task(agents["m2"], **kwargs),
-            create_data_analytics_task(agents["m5"], **kwargs)
-        ]
-    elif crew_type == "complete_marketing":
-        crew.tasks = [
-            create_strategic_analysis_task(agents["m1"], **kwargs),
-            create_social_monitoring_task(agents["m2"], **kwargs),
-            create_campaign_optimization_task(agents["m3"], **kwargs),
-            create_content_strategy_task(agents["m4"], **kwargs),
-            create_data_analytics_task(agents["m5"], **kwargs)
-        ]
-    
-    # Run the crew and return results
-    result = crew.kickoff()
+    model = get_default_model(model_name)
+    agent_types = CREW_AGENT_TYPES[crew_type]
+    
+    with ExitStack() as stack:
+        # Borrow one warm agent per role in the crew
+        agents = {
+            agent_type: stack.enter_context(marketing_agent_pool.checkout(agent_type, model))
+            for agent_type in agent_types
+        }
+        tasks = {
+            agent_type: TASK_BUILDERS[agent_type](agents[agent_type], **kwargs)
+            for agent_type in agent_types
+        }
+        
+        # Independent tasks run concurrently; dependents wait for their context tasks
+        graph = TaskGraph()
+        for agent_type in agent_types:
+            dependencies = [d for d in TASK_DEPENDENCIES.get(agent_type, []) if d in tasks]
+            if dependencies:
+                # Unset context is a non-list sentinel in newer CrewAI releases
+                context = tasks[agent_type].context
+                tasks[agent_type].context = (list(context) if isinstance(context, (list, tuple)) else []) + \
+                    [tasks[d] for d in dependencies]
+            graph.add(agent_type, _single_task_runner(agents[agent_type], tasks[agent_type], bypass_cache),
+                      depends_on=dependencies)
+        
+        run = await graph.execute()
+    
+    results = {agent_type: run["results"][agent_type]["result"] for agent_type in agent_types}
     
     # Format result for API response
     return {
         "crew": crew_type,
         "timestamp": datetime.now().isoformat(),
-        "agents_involved": [agent.role for agent in crew.agents],
-        "result": result
+        "agents_involved": [agents[agent_type].role for agent_type in agent_types],
+        "result": results[agent_types[-1]],
+        "results": results,
+        "timing": {
+            "wall_seconds": run["wall_seconds"],
+            "critical_path_seconds": run["critical_path_seconds"]
+        }
     }
 
 if __name__ == "__main__":
@@ -5,15 +5,21 @@ Real-time intelligent alerts integrated with WebSocket and SEMrush data
 """
 
 import asyncio
+import heapq
+import itertools
 import json
 import logging
+import random
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Callable, Awaitable, Set
 import os
 from dataclasses import dataclass, asdict
 import aiohttp
 from enum import Enum
 
+from alert_store import get_alert_store, to_epoch
+from alert_fingerprints import get_fingerprint_index, fingerprint, SUPPRESSED
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("morvo_smart_alerts")
@@ -33,6 +39,24 @@ class AlertCategory(Enum):
     CAMPAIGN_PERFORMANCE = "campaign_performance"
     MARKET_TREND = "market_trend"
 
+PRIORITY_ORDER = {AlertPriority.LOW: 1, AlertPriority.MEDIUM: 2, AlertPriority.HIGH: 3, AlertPriority.CRITICAL: 4}
+
+# Alert types written by the streaming anomaly detector (see smart_alerts.SmartAlertSystem)
+ANOMALY_ALERT_TYPES = {"traffic_anomaly", "engagement_anomaly", "sentiment_shift"}
+
+METRIC_LABELS = {
+    "sessions": "الجلسات",
+    "active_users": "المستخدمين النشطين",
+    "engagement_rate": "معدل التفاعل",
+    "mentions": "الإشارات",
+    "negative_mentions": "الإشارات السلبية",
+    "sentiment_score": "مؤشر المشاعر"
+}
+
+def _format_value(value: float) -> str:
+    """Counts with thousands separators, rates and scores with two decimals"""
+    return f"{value:,.0f}" if abs(value) >= 100 else f"{value:,.2f}"
+
 @dataclass
 class SmartAlert:
     """Smart alert data structure"""
@@ -49,19 +73,158 @@ class SmartAlert:
     expires_at: Optional[str] = None
     is_read: bool = False
 
+class AlertScheduler:
+    """
+    Runs every alert rule for every organization on the rule's own check_interval
+    
+    Due runs start as separate tasks, so the rules of one organization run in parallel;
+    a run still in flight when its rule comes due again is skipped rather than overlapped.
+    """
+    
+    def __init__(self,
+                 run_rule: Callable[[str, str], Awaitable[Any]],
+                 intervals: Dict[str, float],
+                 jitter: float = 0.1,
+                 max_concurrent_runs: int = 20):
+        """
+        Initialize the scheduler
+        
+        Args:
+            run_rule: Coroutine function (organization_id, rule_name) performing one check
+            intervals: Rule name -> check interval in seconds
+            jitter: Fraction of the interval by which runs are randomly spread
+            max_concurrent_runs: Rule runs executing at once across all organizations
+        """
+        self.run_rule = run_rule
+        self.intervals = intervals
+        self.jitter = jitter
+        self.organizations: Set[str] = set()
+        self._heap: List[Tuple[float, int, str, str]] = []
+        self._sequence = itertools.count()
+        self._running: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent_runs)
+        self._wakeup = asyncio.Event()
+        self.stats = {"runs": 0, "errors": 0, "skipped_overlaps": 0}
+    
+    def _jittered(self, interval: float) -> float:
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+    
+    def _schedule(self, when: float, organization_id: str, rule_name: str):
+        heapq.heappush(self._heap, (when, next(self._sequence), organization_id, rule_name))
+    
+    def add_organization(self, organization_id: str):
+        """Start checking an organization; first runs are spread over the jitter window"""
+        if organization_id in self.organizations:
+            return
+        self.organizations.add(organization_id)
+        now = asyncio.get_running_loop().time()
+        for rule_name, interval in self.intervals.items():
+            self._schedule(now + random.uniform(0, interval * self.jitter), organization_id, rule_name)
+        self._wakeup.set()
+    
+    def remove_organization(self, organization_id: str):
+        """Stop checking an organization and drop its queued runs"""
+        if organization_id not in self.organizations:
+            return
+        self.organizations.discard(organization_id)
+        # Left in the heap, they would run alongside fresh entries if the organization is re-added
+        self._heap = [entry for entry in self._heap if entry[2] != organization_id]
+        heapq.heapify(self._heap)
+    
+    async def _run_one(self, organization_id: str, rule_name: str):
+        key = (organization_id, rule_name)
+        try:
+            async with self._semaphore:
+                await self.run_rule(organization_id, rule_name)
+            self.stats["runs"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"❌ Rule {rule_name} failed for {organization_id}: {e}")
+        finally:
+            self._running.pop(key, None)
+    
+    async def run(self):
+        """Dispatch due rule runs until cancelled"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                self._wakeup.clear()
+                now = loop.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due, _, organization_id, rule_name = heapq.heappop(self._heap)
+                    if organization_id not in self.organizations:
+                        continue
+                    
+                    # Next run keeps to the schedule; after falling behind it counts from now
+                    next_run = due + self._jittered(self.intervals[rule_name])
+                    self._schedule(next_run if next_run > now else now + self._jittered(self.intervals[rule_name]),
+                                   organization_id, rule_name)
+                    
+                    key = (organization_id, rule_name)
+                    if key in self._running:
+                        self.stats["skipped_overlaps"] += 1
+                        logger.warning(f"⏭️ {rule_name} for {organization_id} still running, skipping this run")
+                        continue
+                    self._running[key] = asyncio.create_task(self._run_one(organization_id, rule_name))
+                
+                timeout = self._heap[0][0] - loop.time() if self._heap else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in list(self._running.values()):
+                task.cancel()
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Scheduled organizations, runs in flight and counters"""
+        return {
+            "organizations": len(self.organizations),
+            "scheduled": len(self._heap),
+            "running": len(self._running),
+            **self.stats
+        }
+
 class MorvoSmartAlertsV2:
     """
     Advanced Smart Alerts System for Morvo AI v2.0
     Integrates with WebSocket, SEMrush data, and real-time notifications
     """
     
-    def __init__(self):
-        """Initialize the smart alerts system"""
-        self.alerts_queue = asyncio.Queue()
+    def __init__(self, bus=None):
+        """
+        Initialize the smart alerts system
+        
+        Args:
+            bus: Optional message_bus.MessageBus; alerts are then published to the user's topic and
+                 delivered by whichever server worker holds their sockets, instead of over a client WebSocket
+        """
+        self.bus = bus
+        self.alerts_queue: asyncio.Queue = asyncio.Queue()
         self.websocket_connections = {}
+        self._reconnect_backoff: Dict[str, Tuple[float, float]] = {}
+        self._delivery_task: Optional[asyncio.Task] = None
+        self._rate_buckets: Dict[str, Tuple[float, float]] = {}
+        self.delivery_stats = {"frames": 0, "alerts": 0, "dropped": 0, "suppressed": 0}
+        
+        # Delivery pacing per recipient
+        self.digest_rate = float(os.getenv("ALERT_DIGEST_RATE", "1.0"))  # frames per second
+        self.digest_burst = float(os.getenv("ALERT_DIGEST_BURST", "3"))
+        self.max_digest_size = int(os.getenv("ALERT_DIGEST_MAX_ALERTS", "20"))
+        # One smart_alert_digest frame per batch, or (default) the batch's alerts as smart_alert frames
+        self.digest_frames = os.getenv("ALERT_DIGEST_FRAMES", "false").lower() == "true"
+        self.max_pending_per_user = int(os.getenv("ALERT_MAX_PENDING_PER_USER", "200"))
+        
+        # Repeats of an alert already pushed to a recipient are held back for this long
+        self.fingerprints = get_fingerprint_index()
+        self.suppression_window = float(os.getenv("ALERT_SUPPRESSION_HOURS", "24")) * 3600
         self.alert_rules = self._load_alert_rules()
+        self.scheduler: Optional[AlertScheduler] = None
         self.semrush_data_cache = {}
         self.last_check_time = datetime.now()
+        # Anomaly alerts (written by the streaming detector) already sent: creation time per organization
+        self.last_anomaly_time: Dict[str, float] = {}
         
         # Railway/Production settings
         self.production_ws_url = "wss://crewai-production-d99a.up.railway.app"
@@ -78,12 +241,14 @@ class MorvoSmartAlertsV2:
             "traffic_spike": {
                 "threshold": 0.3,  # 30% increase
                 "priority": AlertPriority.MEDIUM,
-                "check_interval": 1800
+                "check_interval": 1800,
+                "check": "check_traffic_anomalies"
             },
             "competitor_new_content": {
                 "threshold": 1,  # new pages
                 "priority": AlertPriority.MEDIUM,
-                "check_interval": 7200
+                "check_interval": 7200,
+                "check": "check_competitor_activity"
             },
             "conversion_rate_drop": {
                 "threshold": 0.2,  # 20% drop
@@ -93,12 +258,32 @@ class MorvoSmartAlertsV2:
             "new_keyword_opportunity": {
                 "threshold": 100,  # search volume
                 "priority": AlertPriority.MEDIUM,
-                "check_interval": 86400  # daily
+                "check_interval": 86400,  # daily
+                "check": "check_seo_opportunities"
+            },
+            "market_trend": {
+                "threshold": 40,  # % growth
+                "priority": AlertPriority.MEDIUM,
+                "check_interval": 21600,
+                "check": "check_market_trends"
             }
         }
     
+    def _scheduled_rules(self) -> Dict[str, Dict[str, Any]]:
+        """Rules backed by a check method (rules without one have nothing to run yet)"""
+        return {name: rule for name, rule in self.alert_rules.items() if rule.get("check")}
+    
     async def connect_to_production_ws(self, user_id: str) -> bool:
-        """Connect to production WebSocket for real-time alerts"""
+        """Connect to production WebSocket for real-time alerts (reusing an open connection)"""
+        if self._is_open(self.websocket_connections.get(user_id)):
+            return True
+            
+        # Back off after failed attempts instead of reconnecting on every alert
+        loop = asyncio.get_running_loop()
+        retry_at, delay = self._reconnect_backoff.get(user_id, (0.0, 0.0))
+        if loop.time() < retry_at:
+            return False
+            
         try:
             import websockets
             
@@ -107,54 +292,227 @@ class MorvoSmartAlertsV2:
             
             websocket = await websockets.connect(ws_url)
             self.websocket_connections[user_id] = websocket
+            self._reconnect_backoff.pop(user_id, None)
             
             logger.info(f"✅ Connected to WebSocket for user: {user_id}")
             return True
             
         except Exception as e:
-            logger.error(f"❌ Failed to connect to WebSocket: {e}")
+            delay = min(max(delay * 2, 1.0), 60.0)
+            self._reconnect_backoff[user_id] = (loop.time() + delay * random.uniform(0.8, 1.2), delay)
+            logger.error(f"❌ Failed to connect to WebSocket: {e} (retrying in ~{delay:.0f}s)")
             return False
     
-    async def send_alert_to_websocket(self, alert: SmartAlert):
-        """Send smart alert through WebSocket"""
-        try:
-            websocket = self.websocket_connections.get(alert.user_id)
-            if not websocket:
-                logger.warning(f"⚠️ No WebSocket connection for user: {alert.user_id}")
-                return False
-            
-            # Create rich alert message
-            alert_message = {
-                "type": "smart_alert",
-                "alert_id": alert.id,
-                "title": alert.title,
-                "message": alert.message,
-                "category": alert.category.value,
-                "priority": alert.priority.value,
-                "timestamp": alert.timestamp,
-                "data": alert.data,
-                "rich_components": [
-                    {
-                        "type": "alert_card",
-                        "title": alert.title,
-                        "description": alert.message,
-                        "priority": alert.priority.value,
-                        "action_button": {
-                            "text": "View Details" if alert.action_url else "Acknowledge",
-                            "url": alert.action_url
-                        }
+    @staticmethod
+    def _is_open(websocket) -> bool:
+        if websocket is None:
+            return False
+        # websockets' legacy client exposes .closed, the newer one .state
+        closed = getattr(websocket, "closed", None)
+        if closed is not None:
+            return not closed
+        return getattr(getattr(websocket, "state", None), "name", "OPEN") == "OPEN"
+    
+    def _alert_message(self, alert: SmartAlert) -> Dict[str, Any]:
+        """Create rich alert message"""
+        return {
+            "type": "smart_alert",
+            "alert_id": alert.id,
+            "title": alert.title,
+            "message": alert.message,
+            "category": alert.category.value,
+            "priority": alert.priority.value,
+            "timestamp": alert.timestamp,
+            "data": alert.data,
+            "rich_components": [
+                {
+                    "type": "alert_card",
+                    "title": alert.title,
+                    "description": alert.message,
+                    "priority": alert.priority.value,
+                    "action_button": {
+                        "text": "View Details" if alert.action_url else "Acknowledge",
+                        "url": alert.action_url
                     }
-                ]
-            }
+                }
+            ]
+        }
+    
+    def _digest_message(self, user_id: str, alerts: List[SmartAlert]) -> Dict[str, Any]:
+        """One frame for everything pending for a recipient: the alert itself, or a digest of several"""
+        if len(alerts) == 1:
+            return self._alert_message(alerts[0])
+        return {
+            "type": "smart_alert_digest",
+            "user_id": user_id,
+            "count": len(alerts),
+            "highest_priority": max((a.priority for a in alerts), key=lambda p: PRIORITY_ORDER[p]).value,
+            "timestamp": datetime.now().isoformat(),
+            "alerts": [self._alert_message(alert) for alert in alerts]
+        }
+    
+    async def _send_frame(self, user_id: str, message: Dict[str, Any]) -> bool:
+        """Send one frame to a user through the bus or the (reused) WebSocket"""
+        if self.bus is not None:
+            self.bus.publish_to_user(user_id, message)
+            return True
             
-            await websocket.send(json.dumps(alert_message))
-            logger.info(f"📤 Alert sent via WebSocket: {alert.title}")
+        if not await self.connect_to_production_ws(user_id):
+            return False
+        websocket = self.websocket_connections[user_id]
+        try:
+            await websocket.send(json.dumps(message))
             return True
+        except Exception as e:
+            logger.warning(f"⚠️ WebSocket send failed for {user_id}, reconnecting: {e}")
+            self.websocket_connections.pop(user_id, None)
+            return False
+    
+    async def send_alert_to_websocket(self, alert: SmartAlert):
+        """Send smart alert through WebSocket right away (bypassing the delivery queue)"""
+        try:
+            if await self._send_frame(alert.user_id, self._alert_message(alert)):
+                logger.info(f"📤 Alert sent via WebSocket: {alert.title}")
+                return True
+            logger.warning(f"⚠️ No WebSocket connection for user: {alert.user_id}")
+            return False
             
         except Exception as e:
             logger.error(f"❌ Failed to send alert via WebSocket: {e}")
             return False
     
+    # ------------------------------------------------------------------
+    # Delivery pipeline
+    # ------------------------------------------------------------------
+    
+    def _ensure_delivery(self):
+        """Start the alerts_queue consumer if it is not running"""
+        if self._delivery_task is None or self._delivery_task.done():
+            self._delivery_task = asyncio.create_task(self._delivery_loop())
+    
+    async def _delivery_loop(self):
+        """
+        Consume alerts_queue: whatever is queued for a recipient goes out as one batch,
+        at most digest_rate batches per second per recipient (with a small burst)
+        """
+        loop = asyncio.get_running_loop()
+        pending: Dict[str, List[SmartAlert]] = {}
+        
+        def take(alert: SmartAlert):
+            alerts = pending.setdefault(alert.user_id, [])
+            alerts.append(alert)
+            if len(alerts) > self.max_pending_per_user:
+                alerts.pop(0)
+                self.delivery_stats["dropped"] += 1
+                self.alerts_queue.task_done()
+        
+        while True:
+            if not pending:
+                take(await self.alerts_queue.get())
+            while not self.alerts_queue.empty():
+                take(self.alerts_queue.get_nowait())
+                
+            next_attempt = None
+            for user_id in list(pending):
+                now = loop.time()
+                tokens, updated = self._rate_buckets.get(user_id, (self.digest_burst, now))
+                tokens = min(self.digest_burst, tokens + (now - updated) * self.digest_rate)
+                
+                if tokens < 1:
+                    wait = (1 - tokens) / self.digest_rate
+                elif not (delivered := await self._send_digest(user_id, pending[user_id][:self.max_digest_size])):
+                    # Retried once the connection is back (connect_to_production_ws paces the attempts)
+                    wait = 1.0
+                else:
+                    sent = pending[user_id][:delivered]
+                    del pending[user_id][:delivered]
+                    if not pending[user_id]:
+                        del pending[user_id]
+                    tokens -= 1
+                    self.delivery_stats["frames"] += 1 if self.digest_frames else len(sent)
+                    self.delivery_stats["alerts"] += len(sent)
+                    for _ in sent:
+                        self.alerts_queue.task_done()
+                    wait = 0.0 if user_id in pending and tokens >= 1 else (1 - tokens) / self.digest_rate
+                    
+                self._rate_buckets[user_id] = (tokens, now)
+                if user_id in pending:
+                    next_attempt = wait if next_attempt is None else min(next_attempt, wait)
+                    
+            # Sleep until a recipient may send again, waking early for new alerts
+            if pending and next_attempt > 0:
+                try:
+                    take(await asyncio.wait_for(self.alerts_queue.get(), next_attempt))
+                except asyncio.TimeoutError:
+                    pass
+    
+    async def _send_digest(self, user_id: str, alerts: List[SmartAlert]) -> int:
+        """Send a recipient's batch; returns how many of its alerts (from the front) were delivered"""
+        try:
+            if self.digest_frames:
+                return len(alerts) if await self._send_frame(user_id, self._digest_message(user_id, alerts)) else 0
+            # smart_alert frames, which every client handles; stop at the first failure so order is kept
+            for delivered, alert in enumerate(alerts):
+                if not await self._send_frame(user_id, self._alert_message(alert)):
+                    return delivered
+            return len(alerts)
+        except Exception as e:
+            logger.error(f"❌ Failed to deliver {len(alerts)} alerts to {user_id}: {e}")
+            return 0
+    
+    def _is_new(self, alert: SmartAlert) -> bool:
+        """
+        Whether an alert should be pushed, per the fingerprint of (category, recipient, key entity)
+        
+        A repeat is held back inside its window (the alert's lifetime, else suppression_window)
+        unless its priority rose or its score/size grew materially.
+        """
+        data = alert.data or {}
+        entity = data.get("keyword") or data.get("competitor") or data.get("topic") or data.get("metric") or ""
+        magnitude = abs(float(data.get("opportunity_score") or data.get("z_score")
+                              or data.get("growth_rate") or data.get("estimated_traffic") or 0))
+        window = self.suppression_window
+        if alert.expires_at:
+            window = max(to_epoch(alert.expires_at) - to_epoch(alert.timestamp), 0)
+        key = fingerprint(f"push:{alert.category.value}", f"{alert.organization_id}/{alert.user_id}", entity)
+        return self.fingerprints.admit(key, PRIORITY_ORDER[alert.priority], magnitude, window) != SUPPRESSED
+    
+    async def _deliver_alerts(self, alerts: List[SmartAlert]) -> List[SmartAlert]:
+        """Queue alerts for delivery, except repeats of ones already pushed; returns the queued alerts"""
+        if not alerts:
+            return []
+        fresh = await asyncio.to_thread(lambda: [alert for alert in alerts if self._is_new(alert)])
+        self.delivery_stats["suppressed"] += len(alerts) - len(fresh)
+        if fresh:
+            self._ensure_delivery()
+        for alert in fresh:
+            self.alerts_queue.put_nowait(alert)
+        return fresh
+    
+    async def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until everything queued has been delivered; False on timeout"""
+        if self.alerts_queue.empty() and self._delivery_task is None:
+            return True
+        try:
+            await asyncio.wait_for(self.alerts_queue.join(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {self.alerts_queue.qsize()} alerts still undelivered after {timeout}s")
+            return False
+    
+    async def stop_delivery(self):
+        """Stop the delivery consumer and close reused WebSocket connections"""
+        if self._delivery_task is not None:
+            self._delivery_task.cancel()
+            await asyncio.gather(self._delivery_task, return_exceptions=True)
+            self._delivery_task = None
+        for websocket in self.websocket_connections.values():
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+        self.websocket_connections.clear()
+    
     async def check_seo_opportunities(self, organization_id: str) -> List[SmartAlert]:
         """Check for SEO opportunities using mock SEMrush data"""
         alerts = []
@@ -237,33 +595,47 @@ class MorvoSmartAlertsV2:
         return alerts
     
     async def check_traffic_anomalies(self, organization_id: str) -> List[SmartAlert]:
-        """Detect traffic anomalies"""
+        """Report traffic/engagement anomalies found by the streaming detector since the last check"""
         alerts = []
         
         try:
-            # Mock traffic data
-            current_traffic = 12500
-            previous_traffic = 8200
-            change_percent = ((current_traffic - previous_traffic) / previous_traffic) * 100
+            stored = await asyncio.to_thread(get_alert_store().get_active, organization_id)
+            anomalies = [
+                a for a in stored
+                if a.get("alert_type") in ANOMALY_ALERT_TYPES
+                and "metric" in a
+                and to_epoch(a.get("timestamp"), 0.0) > self.last_anomaly_time.get(organization_id, 0.0)
+            ]
             
-            if change_percent > 30:  # 30% spike
+            for anomaly in anomalies:
+                label = METRIC_LABELS.get(anomaly["metric"], anomaly["metric"])
+                spike = anomaly["direction"] == "spike"
                 alert = SmartAlert(
-                    id=f"traffic_spike_{int(datetime.now().timestamp())}",
-                    title="📈 ارتفاع مفاجئ في الزيارات!",
-                    message=f"زيادة بنسبة {change_percent:.1f}% في الزيارات ({current_traffic:,} مقابل {previous_traffic:,})",
+                    id=anomaly["alert_id"],
+                    title=f"{'📈 ارتفاع' if spike else '📉 انخفاض'} غير معتاد في {label}!",
+                    message=(f"{label}: {_format_value(anomaly['value'])} مقابل "
+                             f"{_format_value(anomaly['expected'])} متوقعة (z = {anomaly['z_score']:+.1f})"),
                     category=AlertCategory.TRAFFIC_ANOMALY,
-                    priority=AlertPriority.HIGH,
+                    priority=AlertPriority.HIGH if anomaly.get("alert_priority") == "high" else AlertPriority.MEDIUM,
                     data={
-                        "current_traffic": current_traffic,
-                        "previous_traffic": previous_traffic,
-                        "change_percent": change_percent
+                        "metric": anomaly["metric"],
+                        "source": anomaly.get("source"),
+                        "value": anomaly["value"],
+                        "expected": anomaly["expected"],
+                        "z_score": anomaly["z_score"],
+                        "direction": anomaly["direction"],
+                        "observed_at": anomaly.get("observed_at")
                     },
-                    timestamp=datetime.now().isoformat(),
+                    timestamp=anomaly["timestamp"],
                     user_id="admin",
                     organization_id=organization_id,
-                    action_url="/analytics/traffic"
+                    action_url="/analytics/traffic",
+                    expires_at=anomaly.get("expires_at")
                 )
                 alerts.append(alert)
+            
+            if anomalies:
+                self.last_anomaly_time[organization_id] = max(to_epoch(a["timestamp"]) for a in anomalies)
                 
         except Exception as e:
             logger.error(f"❌ Error checking traffic anomalies: {e}")
@@ -312,52 +684,74 @@ class MorvoSmartAlertsV2:
             
         return alerts
     
+    async def run_rule(self, organization_id: str, rule_name: str) -> List[SmartAlert]:
+        """Run one rule's check for an organization and send what it finds"""
+        check = getattr(self, self.alert_rules[rule_name]["check"])
+        return await self._deliver_alerts(await check(organization_id))
+    
     async def run_alert_checks(self, organization_id: str = "test_org"):
-        """Run all alert checks and send notifications"""
+        """Run all alert checks once (in parallel) and send notifications"""
         logger.info("🔍 Running smart alert checks...")
         
-        # Connect to WebSocket first
-        await self.connect_to_production_ws("admin")
+        # Connect to WebSocket first (not needed when publishing through the message bus)
+        if self.bus is None:
+            await self.connect_to_production_ws("admin")
         
         # Run all checks
-        all_alerts = []
+        results = await asyncio.gather(*(
+            getattr(self, rule["check"])(organization_id) for rule in self._scheduled_rules().values()
+        ))
+        all_alerts = [alert for alerts in results for alert in alerts]
         
-        seo_alerts = await self.check_seo_opportunities(organization_id)
-        competitor_alerts = await self.check_competitor_activity(organization_id)
-        traffic_alerts = await self.check_traffic_anomalies(organization_id)
-        trend_alerts = await self.check_market_trends(organization_id)
-        
-        all_alerts.extend(seo_alerts)
-        all_alerts.extend(competitor_alerts)
-        all_alerts.extend(traffic_alerts)
-        all_alerts.extend(trend_alerts)
-        
-        # Send alerts via WebSocket
-        for alert in all_alerts:
-            await self.send_alert_to_websocket(alert)
-            await asyncio.sleep(2)  # Delay between alerts
+        # Queue the new ones and wait for the consumer to drain the queue
+        all_alerts = await self._deliver_alerts(all_alerts)
+        await self.flush()
         
         logger.info(f"✅ Sent {len(all_alerts)} smart alerts")
         return all_alerts
     
-    async def start_monitoring(self, check_interval: int = 300):
-        """Start continuous monitoring"""
-        logger.info(f"🚀 Starting Smart Alerts monitoring (every {check_interval}s)")
+    async def start_monitoring(self,
+                               check_interval: int = 300,
+                               organizations: Optional[List[str]] = None):
+        """
+        Start continuous monitoring
         
-        while True:
-            try:
-                await self.run_alert_checks()
-                await asyncio.sleep(check_interval)
-            except Exception as e:
-                logger.error(f"❌ Error in monitoring loop: {e}")
-                await asyncio.sleep(60)  # Wait 1 minute before retry
+        Every rule runs on its own check_interval (check_interval is only the fallback for
+        rules without one); organizations can be added later via self.scheduler.
+        """
+        rules = self._scheduled_rules()
+        self.scheduler = AlertScheduler(
+            run_rule=self.run_rule,
+            intervals={name: rule.get("check_interval", check_interval) for name, rule in rules.items()},
+            jitter=float(os.getenv("ALERT_SCHEDULER_JITTER", "0.1")),
+            max_concurrent_runs=int(os.getenv("ALERT_SCHEDULER_CONCURRENCY", "20"))
+        )
+        logger.info(f"🚀 Starting Smart Alerts monitoring: " +
+                    ", ".join(f"{name} every {interval}s" for name, interval in self.scheduler.intervals.items()))
+        
+        # Connect to WebSocket first (not needed when publishing through the message bus)
+        if self.bus is None:
+            await self.connect_to_production_ws("admin")
+        
+        for organization_id in organizations or ["test_org"]:
+            self.scheduler.add_organization(organization_id)
+        
+        await self.scheduler.run()
 
 # Test the smart alerts system
 async def test_smart_alerts():
     """Test the smart alerts system"""
     print("🧪 Testing Morvo Smart Alerts v2.0...")
     
-    alerts_system = MorvoSmartAlertsV2()
+    # With WS_BUS_BACKEND=unix/postgres alerts reach the sockets held by the running API workers
+    bus = None
+    if os.getenv("WS_BUS_BACKEND", "inprocess") != "inprocess":
+        from message_bus import create_message_bus
+        bus = create_message_bus()
+        await bus.start()
+        await bus.wait_connected()
+    
+    alerts_system = MorvoSmartAlertsV2(bus=bus)
     
     # Run one-time alert check
     alerts = await alerts_system.run_alert_checks()
@@ -366,6 +760,7 @@ async def test_smart_alerts():
     for alert in alerts:
         print(f"   🔔 {alert.priority.value.upper()}: {alert.title}")
     
+    await alerts_system.stop_delivery()
     print("🎉 Smart Alerts test completed!")
 
 if __name__ == "__main__":
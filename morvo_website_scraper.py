@@ -5,7 +5,7 @@ from crewai_tools import ScrapeWebsiteTool, WebsiteSearchTool
 from bs4 import BeautifulSoup
 import requests
 import json
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable
 import re
 from urllib.parse import urljoin, urlparse
 import asyncio
@@ -14,6 +14,9 @@ from pydantic import BaseModel
 import logging
 from datetime import datetime
 
+from crew_executor import get_crew_executor
+from startup_profiler import lazy_component
+
 # إعداد التسجيل
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -42,8 +45,7 @@ class MorvoWebsiteScraper:
     """🕷️ وكيل مورفو للحصول على بيانات المواقع وتحليلها"""
     
     def __init__(self):
-        self.scrape_tool = ScrapeWebsiteTool()
-        self.search_tool = WebsiteSearchTool()
+        # الأدوات والوكلاء تُنشأ عند أول استخدام فقط (WebsiteSearchTool يبني مخزن embeddings)
         
         # Headers للتصفح
         self.headers = {
@@ -53,14 +55,38 @@ class MorvoWebsiteScraper:
             'Accept-Encoding': 'gzip, deflate',
             'Connection': 'keep-alive',
         }
-        
-        # إنشاء الوكلاء المتخصصين
-        self.website_analyzer = self._create_website_analyzer()
-        self.seo_specialist = self._create_seo_specialist()
-        self.saudi_market_expert = self._create_saudi_market_expert()
-        self.competitor_researcher = self._create_competitor_researcher()
-        self.ecommerce_specialist = self._create_ecommerce_specialist()
-        
+    
+    @lazy_component
+    def scrape_tool(self):
+        """أداة قراءة صفحات المواقع"""
+        return ScrapeWebsiteTool()
+    
+    @lazy_component
+    def search_tool(self):
+        """أداة البحث داخل المواقع (تبني مخزن embeddings)"""
+        return WebsiteSearchTool()
+    
+    # الوكلاء المتخصصون - يُنشأ كل وكيل عند أول مهمة تحتاجه
+    @lazy_component
+    def website_analyzer(self):
+        return self._create_website_analyzer()
+    
+    @lazy_component
+    def seo_specialist(self):
+        return self._create_seo_specialist()
+    
+    @lazy_component
+    def saudi_market_expert(self):
+        return self._create_saudi_market_expert()
+    
+    @lazy_component
+    def competitor_researcher(self):
+        return self._create_competitor_researcher()
+    
+    @lazy_component
+    def ecommerce_specialist(self):
+        return self._create_ecommerce_specialist()
+    
     def _create_website_analyzer(self):
         """🔍 وكيل تحليل المواقع العام"""
         return Agent(
@@ -131,8 +157,28 @@ class MorvoWebsiteScraper:
             allow_delegation=False
         )
 
-    async def analyze_website(self, url: str) -> WebsiteAnalysisResult:
-        """🎯 تحليل شامل للموقع الإلكتروني"""
+    def _progress_callback(self, progress_callback: Optional[Callable[[Dict], None]],
+                           task_name: str, step: int, total_steps: int):
+        """إنشاء callback لمهمة CrewAI يبلّغ عن التقدم بعد اكتمالها"""
+        if progress_callback is None:
+            return None
+        
+        def _on_task_complete(task_output: Any):
+            progress_callback({
+                "task": task_name,
+                "step": step,
+                "total_steps": total_steps,
+                "summary": str(getattr(task_output, "summary", "") or "")[:200]
+            })
+        
+        return _on_task_complete
+
+    async def analyze_website(self, url: str,
+                              progress_callback: Optional[Callable[[Dict], None]] = None) -> WebsiteAnalysisResult:
+        """🎯 تحليل شامل للموقع الإلكتروني
+        
+        progress_callback يُستدعى بعد كل مهمة (من خيط العامل) لإرسال التقدم
+        """
         
         logger.info(f"🚀 بدء تحليل الموقع: {url}")
         
@@ -153,7 +199,8 @@ class MorvoWebsiteScraper:
                 ركز على استخراج أكبر قدر من المعلومات لفهم العمل بشكل كامل.
                 """,
                 agent=self.website_analyzer,
-                expected_output="تحليل شامل بتنسيق JSON يتضمن جميع البيانات المستخرجة"
+                expected_output="تحليل شامل بتنسيق JSON يتضمن جميع البيانات المستخرجة",
+                callback=self._progress_callback(progress_callback, "general_analysis", 1, 5)
             )
             
             # مهمة تحليل SEO
@@ -173,7 +220,8 @@ class MorvoWebsiteScraper:
                 قدم نقاط القوة والضعف مع توصيات للتحسين.
                 """,
                 agent=self.seo_specialist,
-                expected_output="تقرير SEO مفصل مع نقاط وتوصيات التحسين"
+                expected_output="تقرير SEO مفصل مع نقاط وتوصيات التحسين",
+                callback=self._progress_callback(progress_callback, "seo_analysis", 2, 5)
             )
             
             # مهمة تحليل السوق السعودي
@@ -193,7 +241,8 @@ class MorvoWebsiteScraper:
                 حدد مستوى التوافق مع السوق السعودي ونقاط التحسين.
                 """,
                 agent=self.saudi_market_expert,
-                expected_output="تقييم التوافق مع السوق السعودي مع توصيات التحسين"
+                expected_output="تقييم التوافق مع السوق السعودي مع توصيات التحسين",
+                callback=self._progress_callback(progress_callback, "saudi_compliance", 3, 5)
             )
             
             # مهمة تحليل المنافسين
@@ -212,7 +261,8 @@ class MorvoWebsiteScraper:
                 ركز على المنافسين في السوق السعودي والخليجي.
                 """,
                 agent=self.competitor_researcher,
-                expected_output="تحليل تنافسي شامل مع قائمة المنافسين والتوصيات"
+                expected_output="تحليل تنافسي شامل مع قائمة المنافسين والتوصيات",
+                callback=self._progress_callback(progress_callback, "competitor_analysis", 4, 5)
             )
             
             # مهمة تحليل التجارة الإلكترونية
@@ -232,7 +282,8 @@ class MorvoWebsiteScraper:
                 إذا لم يكن متجر إلكتروني، حلل الخدمات المقدمة بنفس التفصيل.
                 """,
                 agent=self.ecommerce_specialist,
-                expected_output="تحليل التجارة الإلكترونية أو الخدمات مع التوصيات"
+                expected_output="تحليل التجارة الإلكترونية أو الخدمات مع التوصيات",
+                callback=self._progress_callback(progress_callback, "ecommerce_analysis", 5, 5)
             )
             
             # إنشاء الفريق وتنفيذ المهام
@@ -255,9 +306,9 @@ class MorvoWebsiteScraper:
                 process="sequential"
             )
             
-            # تنفيذ التحليل
+            # تنفيذ التحليل على مجمع العمال حتى لا تتوقف حلقة الأحداث
             logger.info("🔍 تنفيذ تحليل الموقع...")
-            result = analysis_crew.kickoff()
+            result = await get_crew_executor().run(analysis_crew.kickoff)
             
             # معالجة النتائج وتحويلها إلى نموذج مهيكل
             analysis_result = self._process_analysis_results(url, result)
@@ -429,6 +480,19 @@ class MorvoWebsiteScraper:
             analysis_timestamp=datetime.now()
         )
 
+# محلل مشترك لمهام قائمة الانتظار
+_job_scraper: Optional[MorvoWebsiteScraper] = None
+
+async def run_website_analysis_job(payload: Dict[str, Any],
+                                   report_progress: Callable[[Dict], None]) -> Dict[str, Any]:
+    """🧾 معالج مهمة website_analysis في قائمة مهام CrewAI"""
+    global _job_scraper
+    if _job_scraper is None:
+        _job_scraper = MorvoWebsiteScraper()
+    
+    result = await _job_scraper.analyze_website(payload["url"], progress_callback=report_progress)
+    return json.loads(result.json())
+
 # دالة مساعدة للاستخدام السريع
 async def quick_website_analysis(url: str) -> WebsiteAnalysisResult:
     """🚀 تحليل سريع للموقع"""
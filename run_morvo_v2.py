@@ -79,7 +79,9 @@ def start_server():
             "morvo_api_v2:app",
             "--host", "0.0.0.0",
             "--port", "8090",
-            "--reload"
+            "--reload",
+            # permessage-deflate is a server-wide uvicorn setting, not per connection
+            "--ws-per-message-deflate", os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower()
         ], cwd=current_dir)
         
         # التعامل مع إيقاف الخادم
@@ -9,9 +9,14 @@ import logging
 from datetime import datetime, timedelta
 import json
 import os
+import time
 
 from agent_memory import AgentMemoryManager
 from agent_context_manager import AgentContextManager
+from alert_store import get_alert_store, to_epoch, PRIORITY_RANK
+from alert_fingerprints import get_fingerprint_index, fingerprint, SUPPRESSED
+from anomaly_detector import get_anomaly_detector, extract_points, METRIC_ALERT_TYPES
+import alert_rules
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -22,12 +27,32 @@ class SmartAlertSystem:
     Monitors marketing data and triggers timely notifications
     """
     
+    # Context each check reads, by the agent that owns it
+    CHECK_CONTEXT_KEYS = {
+        "M5": ["analytics_data", "traffic_sources"],
+        "M1": ["seo_data", "keyword_rankings"],
+        "M2": ["social_analytics", "engagement_metrics"]
+    }
+    
+    # Agents each alert type is relevant to
+    ALERT_AGENTS = {
+        "traffic_opportunity": ["M5", "M1", "M3"],
+        "keyword_opportunity": ["M1", "M4", "M3"],
+        "social_engagement_opportunity": ["M2", "M4", "M3"],
+        "sentiment_shift": ["M2", "M4", "M3"],
+        "conversion_opportunity": ["M3", "M5", "M1"],
+        "traffic_anomaly": ["M5", "M1", "M3"],
+        "engagement_anomaly": ["M2", "M4", "M3"]
+    }
+    
     def __init__(self):
         """Initialize the alert system with required components"""
         self.memory_manager = AgentMemoryManager()
         self.context_manager = AgentContextManager()
         self.alert_thresholds = self._load_alert_thresholds()
-        self.alert_history = {}
+        self.alert_store = get_alert_store()
+        self.anomaly_detector = get_anomaly_detector()
+        self.fingerprints = get_fingerprint_index()
         
     def _load_alert_thresholds(self) -> Dict[str, Any]:
         """Load alert thresholds from configuration or use defaults"""
@@ -60,62 +85,35 @@ class SmartAlertSystem:
             }
         }
     
-    async def check_traffic_opportunity(self, company_id: str) -> Optional[Dict[str, Any]]:
+    async def check_traffic_opportunity(self, company_id: str,
+                                        context: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Check for significant traffic increases that represent opportunities
         
         Args:
             company_id: Company identifier
+            context: M5 context from get_context_snapshot, fetched if omitted
             
         Returns:
             Alert data if opportunity detected, None otherwise
         """
-        # Get latest analytics data from M5 agent
-        context = await self.context_manager.get_synchronized_context(
-            company_id=company_id,
-            agent_id="M5",
-            context_keys=["analytics_data", "traffic_sources"]
-        )
-        
-        if "data" not in context or not context["data"]:
-            return None
-            
-        analytics_data = context["data"].get("analytics_data", {})
-        traffic_sources = context["data"].get("traffic_sources", {})
-        
-        # Check if we have enough data
-        if not analytics_data or not traffic_sources:
-            return None
-            
-        # Check for traffic spikes by source
-        thresholds = self.alert_thresholds["traffic_spike"]
-        opportunities = []
-        
-        for source, data in traffic_sources.items():
-            if "current" in data and "previous" in data:
-                current_traffic = data["current"]
-                previous_traffic = data["previous"]
-                
-                if previous_traffic > 0 and current_traffic >= thresholds["minimum_volume"]:
-                    percentage_change = ((current_traffic - previous_traffic) / previous_traffic) * 100
-                    
-                    if percentage_change >= thresholds["percentage_change"]:
-                        opportunities.append({
-                            "source": source,
-                            "current_traffic": current_traffic,
-                            "previous_traffic": previous_traffic,
-                            "percentage_change": round(percentage_change, 1),
-                            "opportunity_score": min(100, int(percentage_change))
-                        })
-        
-        if not opportunities:
-            return None
-            
-        # Sort by opportunity score (highest first)
-        opportunities.sort(key=lambda x: x["opportunity_score"], reverse=True)
-        
-        # Create alert data
-        alert_data = {
+        # Get latest analytics data from M5 agent (unless a snapshot was passed in)
+        if context is None:
+            context = await self.context_manager.get_synchronized_context(
+                company_id=company_id,
+                agent_id="M5",
+                context_keys=self.CHECK_CONTEXT_KEYS["M5"]
+            )
+        
+        opportunities = alert_rules.traffic_opportunities(
+            [context], self.alert_thresholds["traffic_spike"]
+        ).get(0)
+        
+        return self._traffic_alert(company_id, opportunities) if opportunities else None
+    
+    def _traffic_alert(self, company_id: str, opportunities: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the traffic alert from opportunities sorted by score"""
+        return {
             "alert_type": "traffic_opportunity",
             "alert_priority": "medium",
             "timestamp": datetime.utcnow().isoformat(),
@@ -124,8 +122,6 @@ class SmartAlertSystem:
             "recommended_actions": self._get_traffic_recommendations(opportunities[0]["source"]),
             "expires_at": (datetime.utcnow() + timedelta(hours=24)).isoformat()
         }
-        
-        return alert_data
     
     def _get_traffic_recommendations(self, traffic_source: str) -> List[Dict[str, str]]:
         """Generate recommendations based on traffic source"""
@@ -166,79 +162,38 @@ class SmartAlertSystem:
             
         return recommendations
     
-    async def check_keyword_opportunity(self, company_id: str) -> Optional[Dict[str, Any]]:
+    async def check_keyword_opportunity(self, company_id: str,
+                                        context: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Check for keyword ranking opportunities
         
         Args:
             company_id: Company identifier
+            context: M1 context from get_context_snapshot, fetched if omitted
             
         Returns:
             Alert data if opportunity detected, None otherwise
         """
-        # Get latest SEO data from M1 agent
-        context = await self.context_manager.get_synchronized_context(
-            company_id=company_id,
-            agent_id="M1",
-            context_keys=["seo_data", "keyword_rankings"]
-        )
-        
-        if "data" not in context or not context["data"]:
-            return None
-            
-        seo_data = context["data"].get("seo_data", {})
-        keyword_rankings = context["data"].get("keyword_rankings", {})
-        
-        # Check if we have enough data
-        if not seo_data or not keyword_rankings:
-            return None
-            
-        # Check for keyword opportunities
-        thresholds = self.alert_thresholds["keyword_opportunity"]
-        opportunities = []
-        
-        for keyword, data in keyword_rankings.items():
-            if all(k in data for k in ["current_volume", "previous_volume", "competition", "relevance"]):
-                current_volume = data["current_volume"]
-                previous_volume = data["previous_volume"]
-                competition = data["competition"]  # 0-1 scale
-                relevance = data["relevance"]      # 0-1 scale
-                current_rank = data.get("current_rank", 100)
-                
-                if (previous_volume > 0 and 
-                    competition <= thresholds["competition_max"] and
-                    relevance >= thresholds["relevance_min"]):
-                    
-                    volume_increase = ((current_volume - previous_volume) / previous_volume) * 100
-                    
-                    if volume_increase >= thresholds["search_volume_increase"]:
-                        opportunity_score = min(100, int(
-                            (volume_increase * 0.4) + 
-                            ((1 - competition) * 30) + 
-                            (relevance * 30)
-                        ))
-                        
-                        opportunities.append({
-                            "keyword": keyword,
-                            "current_volume": current_volume,
-                            "volume_increase": round(volume_increase, 1),
-                            "competition": competition,
-                            "relevance": relevance,
-                            "current_rank": current_rank,
-                            "opportunity_score": opportunity_score
-                        })
-        
-        if not opportunities:
-            return None
-            
-        # Sort by opportunity score (highest first)
-        opportunities.sort(key=lambda x: x["opportunity_score"], reverse=True)
-        
+        # Get latest SEO data from M1 agent (unless a snapshot was passed in)
+        if context is None:
+            context = await self.context_manager.get_synchronized_context(
+                company_id=company_id,
+                agent_id="M1",
+                context_keys=self.CHECK_CONTEXT_KEYS["M1"]
+            )
+        
+        opportunities = alert_rules.keyword_opportunities(
+            [context], self.alert_thresholds["keyword_opportunity"]
+        ).get(0)
+        
+        return self._keyword_alert(company_id, opportunities) if opportunities else None
+    
+    def _keyword_alert(self, company_id: str, opportunities: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the keyword alert from opportunities sorted by score"""
         # Limit to top 5 opportunities
         top_opportunities = opportunities[:5]
         
-        # Create alert data
-        alert_data = {
+        return {
             "alert_type": "keyword_opportunity",
             "alert_priority": "high",
             "timestamp": datetime.utcnow().isoformat(),
@@ -247,8 +202,6 @@ class SmartAlertSystem:
             "recommended_actions": self._get_keyword_recommendations(top_opportunities),
             "expires_at": (datetime.utcnow() + timedelta(hours=72)).isoformat()
         }
-        
-        return alert_data
     
     def _get_keyword_recommendations(self, opportunities: List[Dict[str, Any]]) -> List[Dict[str, str]]:
         """Generate keyword-specific recommendations"""
@@ -293,74 +246,35 @@ class SmartAlertSystem:
             
         return recommendations
     
-    async def check_social_engagement_opportunity(self, company_id: str) -> Optional[Dict[str, Any]]:
+    async def check_social_engagement_opportunity(self, company_id: str,
+                                                  context: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Check for social media engagement spikes that represent opportunities
         
         Args:
             company_id: Company identifier
+            context: M2 context from get_context_snapshot, fetched if omitted
             
         Returns:
             Alert data if opportunity detected, None otherwise
         """
-        # Get latest social media data from M2 agent
-        context = await self.context_manager.get_synchronized_context(
-            company_id=company_id,
-            agent_id="M2",
-            context_keys=["social_analytics", "engagement_metrics"]
-        )
-        
-        if "data" not in context or not context["data"]:
-            return None
-            
-        social_analytics = context["data"].get("social_analytics", {})
-        engagement_metrics = context["data"].get("engagement_metrics", {})
-        
-        # Check if we have enough data
-        if not social_analytics or not engagement_metrics:
-            return None
-            
-        # Check for engagement spikes by platform and content
-        thresholds = self.alert_thresholds["engagement_spike"]
-        opportunities = []
-        
-        # Check each platform
-        platforms = social_analytics.get("platforms", {})
-        for platform, data in platforms.items():
-            recent_posts = data.get("recent_posts", [])
-            
-            for post in recent_posts:
-                if all(k in post for k in ["post_id", "engagement_rate", "average_engagement_rate", "total_engagements"]):
-                    current_rate = post["engagement_rate"]
-                    average_rate = post["average_engagement_rate"]
-                    total_engagements = post["total_engagements"]
-                    
-                    if (average_rate > 0 and 
-                        total_engagements >= thresholds["minimum_engagements"]):
-                        
-                        percentage_increase = ((current_rate - average_rate) / average_rate) * 100
-                        
-                        if percentage_increase >= thresholds["percentage_increase"]:
-                            opportunities.append({
-                                "platform": platform,
-                                "post_id": post["post_id"],
-                                "post_type": post.get("type", "unknown"),
-                                "content_snippet": post.get("content_snippet", ""),
-                                "current_engagement_rate": round(current_rate, 2),
-                                "average_engagement_rate": round(average_rate, 2),
-                                "total_engagements": total_engagements,
-                                "percentage_increase": round(percentage_increase, 1),
-                                "opportunity_score": min(100, int(percentage_increase))
-                            })
-        
-        if not opportunities:
-            return None
-            
-        # Sort by opportunity score (highest first)
-        opportunities.sort(key=lambda x: x["opportunity_score"], reverse=True)
-        
-        # Create alert data
-        alert_data = {
+        # Get latest social media data from M2 agent (unless a snapshot was passed in)
+        if context is None:
+            context = await self.context_manager.get_synchronized_context(
+                company_id=company_id,
+                agent_id="M2",
+                context_keys=self.CHECK_CONTEXT_KEYS["M2"]
+            )
+        
+        opportunities = alert_rules.engagement_opportunities(
+            [context], self.alert_thresholds["engagement_spike"]
+        ).get(0)
+        
+        return self._social_alert(company_id, opportunities) if opportunities else None
+    
+    def _social_alert(self, company_id: str, opportunities: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the social engagement alert from opportunities sorted by score"""
+        return {
             "alert_type": "social_engagement_opportunity",
             "alert_priority": "high",
             "timestamp": datetime.utcnow().isoformat(),
@@ -369,8 +283,6 @@ class SmartAlertSystem:
             "recommended_actions": self._get_social_recommendations(opportunities[0]),
             "expires_at": (datetime.utcnow() + timedelta(hours=6)).isoformat()  # Time-sensitive
         }
-        
-        return alert_data
     
     def _get_social_recommendations(self, opportunity: Dict[str, Any]) -> List[Dict[str, str]]:
         """Generate social-specific recommendations"""
@@ -446,11 +358,14 @@ class SmartAlertSystem:
         """
         opportunities = []
         
+        # One batched context fetch for the company, shared by every check
+        snapshot = await self.context_manager.get_context_snapshot(company_id, self.CHECK_CONTEXT_KEYS)
+        
         # Run all opportunity checks in parallel
         results = await asyncio.gather(
-            self.check_traffic_opportunity(company_id),
-            self.check_keyword_opportunity(company_id),
-            self.check_social_engagement_opportunity(company_id),
+            self.check_traffic_opportunity(company_id, snapshot["M5"]),
+            self.check_keyword_opportunity(company_id, snapshot["M1"]),
+            self.check_social_engagement_opportunity(company_id, snapshot["M2"]),
             return_exceptions=True
         )
         
@@ -463,9 +378,200 @@ class SmartAlertSystem:
                 
         return opportunities
     
+    # Rule -> (agent whose context it reads, vectorized evaluator, threshold set, alert builder)
+    BATCH_RULES = [
+        ("M5", alert_rules.traffic_opportunities, "traffic_spike", "_traffic_alert"),
+        ("M1", alert_rules.keyword_opportunities, "keyword_opportunity", "_keyword_alert"),
+        ("M2", alert_rules.engagement_opportunities, "engagement_spike", "_social_alert")
+    ]
+    
+    def rules_for_context(self, context_keys: List[str]) -> List[str]:
+        """Batch rules reading any of these context keys"""
+        keys = set(context_keys)
+        return [rule for agent_id, _, rule, _ in self.BATCH_RULES if keys & set(self.CHECK_CONTEXT_KEYS[agent_id])]
+    
+    async def check_opportunities_batch(self,
+                                        company_ids: List[str],
+                                        max_concurrent_fetches: int = 32,
+                                        rules: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Check all opportunity types for many companies in one evaluation pass
+        
+        Context snapshots are fetched concurrently, then every rule runs once as NumPy
+        masks over the metrics of all companies instead of once per company.
+        
+        Args:
+            company_ids: Company identifiers
+            max_concurrent_fetches: Snapshot fetches in flight at once
+            rules: Threshold keys of the rules to run (e.g. after a context update); all when None
+            
+        Returns:
+            Company identifier -> list of alert data (only companies with alerts)
+        """
+        batch_rules = [rule for rule in self.BATCH_RULES if rules is None or rule[2] in rules]
+        # Only the context of the agents whose rules run
+        agent_keys = {agent_id: self.CHECK_CONTEXT_KEYS[agent_id] for agent_id, _, _, _ in batch_rules}
+        if not batch_rules or not company_ids:
+            return {}
+        semaphore = asyncio.Semaphore(max_concurrent_fetches)
+        
+        async def fetch(company_id: str) -> Dict[str, Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    return await self.context_manager.get_context_snapshot(company_id, agent_keys)
+                except Exception as e:
+                    logger.error(f"Error fetching alert context for company {company_id}: {e}")
+                    return {}
+        
+        snapshots = await asyncio.gather(*(fetch(company_id) for company_id in company_ids))
+        
+        alerts: Dict[str, List[Dict[str, Any]]] = {}
+        for agent_id, evaluate, threshold_key, build in batch_rules:
+            contexts = [snapshot.get(agent_id) for snapshot in snapshots]
+            try:
+                found = evaluate(contexts, self.alert_thresholds[threshold_key])
+            except Exception as e:
+                logger.error(f"Error evaluating {threshold_key} rule: {e}")
+                continue
+            for index, opportunities in found.items():
+                company_id = company_ids[index]
+                alerts.setdefault(company_id, []).append(getattr(self, build)(company_id, opportunities))
+                
+        return alerts
+    
+    @staticmethod
+    def _alert_identity(alert_data: Dict[str, Any]) -> Tuple[str, float]:
+        """Key entity of an alert (top opportunity or anomalous metric) and the magnitude compared on repeats"""
+        if "metric" in alert_data:
+            return alert_data["metric"], abs(alert_data.get("z_score") or 0)
+        opportunities = alert_data.get("opportunities") or [{}]
+        top = opportunities[0]
+        entity = top.get("source") or top.get("keyword") or top.get("post_id") or ""
+        return entity, float(top.get("opportunity_score") or 0)
+    
+    def _admit(self, alert_data: Dict[str, Any]) -> Tuple[bool, str, Tuple[int, int, float, float, float]]:
+        """
+        Check an alert against the fingerprint index
+        
+        An alert is suppressed while an earlier one with the same type, company and key entity
+        is still live, unless its priority rose or its magnitude grew materially. Admitted alerts
+        get an id derived from the fingerprint, so a re-emitted alert replaces its predecessor.
+        Nothing is recorded here: the caller records the fingerprint once the alert is stored.
+        
+        Returns:
+            Whether to store the alert, the fingerprint decision and the record for record_many
+        """
+        company_id, alert_type = alert_data["company_id"], alert_data["alert_type"]
+        entity, magnitude = self._alert_identity(alert_data)
+        key = fingerprint(alert_type, company_id, entity)
+        priority = PRIORITY_RANK.get(alert_data.get("alert_priority", "low"), 0)
+        
+        created_at = to_epoch(alert_data.get("timestamp")) or time.time()
+        expires_at = to_epoch(alert_data.get("expires_at"), created_at + self.alert_store.default_ttl_seconds)
+        decision = self.fingerprints.check(key, priority, magnitude, now=created_at)
+        alert_data["alert_id"] = f"{company_id}_{alert_type}_{key & 0xFFFFFFFFFFFFFFFF:016x}"
+        return decision != SUPPRESSED, decision, (key, priority, magnitude, max(expires_at - created_at, 0), created_at)
+    
+    def _admit_many(self, alerts: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Tuple]]:
+        """Alerts that pass the fingerprint index (one per fingerprint, the last wins) and their records"""
+        admitted = {}
+        for alert in alerts:
+            passed, _, record = self._admit(alert)
+            if passed:
+                admitted[record[0]] = (alert, record)
+        return [alert for alert, _ in admitted.values()], [record for _, record in admitted.values()]
+    
+    async def store_alerts(self, alerts: List[Dict[str, Any]]) -> int:
+        """
+        Store many alerts in one transaction, skipping repeats of alerts that are still live
+        
+        Args:
+            alerts: Alert data as produced by the checks
+            
+        Returns:
+            Number of alerts stored
+        """
+        valid = [alert for alert in alerts if "company_id" in alert and "alert_type" in alert]
+        if not valid:
+            return 0
+        try:
+            admitted, records = await asyncio.to_thread(self._admit_many, valid)
+            if not admitted:
+                return 0
+            stored = await asyncio.to_thread(
+                self.alert_store.add_many,
+                [(alert, self.ALERT_AGENTS.get(alert["alert_type"], ["M5"])) for alert in admitted]
+            )
+            # Only alerts that were stored start suppressing their repeats
+            await asyncio.to_thread(self.fingerprints.record_many, records)
+            await asyncio.to_thread(self.alert_store.sweep)
+            return stored
+        except Exception as e:
+            logger.error(f"Error storing {len(valid)} alerts: {e}")
+            return 0
+    
+    async def observe_external_data(self, company_id: str, result: Any) -> List[Dict[str, Any]]:
+        """
+        Feed a freshly fetched external data result to the streaming anomaly detector
+        
+        Registered as an ExternalDataManager result listener; only points newer than the
+        last one seen per metric update the detector, and anomalies are stored as alerts.
+        
+        Args:
+            company_id: Company the data belongs to
+            result: ExternalDataResult
+            
+        Returns:
+            List of alert data for detected anomalies
+        """
+        points = extract_points(company_id, result.source, result.data_type, result.data)
+        if not points:
+            return []
+            
+        anomalies = await asyncio.to_thread(self.anomaly_detector.observe_many, points)
+        alerts = [self._anomaly_alert(result.source, anomaly) for anomaly in anomalies]
+        if alerts:
+            stored = await self.store_alerts(alerts)
+            logger.info(f"{len(alerts)} anomalies in {result.source}/{result.data_type} for company {company_id} "
+                        f"({stored} new)")
+        return alerts
+    
+    def _anomaly_alert(self, source: str, anomaly: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the alert for an anomaly reported by the detector"""
+        metric = anomaly["metric"]
+        observed_at = datetime.utcfromtimestamp(anomaly["observed_at"])
+        strong = abs(anomaly["z_score"]) >= 2 * self.anomaly_detector.z_threshold
+        
+        if anomaly["direction"] == "spike":
+            recommended_actions = [
+                {"action": "investigate_source", "description": "تحديد مصدر الارتفاع المفاجئ والاستفادة منه"},
+                {"action": "capitalize", "description": "تعزيز المحتوى أو الحملة المرتبطة بالارتفاع"}
+            ]
+        else:
+            recommended_actions = [
+                {"action": "check_tracking", "description": "التحقق من سلامة التتبع وجمع البيانات"},
+                {"action": "investigate_drop", "description": "مراجعة التغييرات الأخيرة في الموقع أو الحملات"}
+            ]
+        
+        return {
+            "alert_type": METRIC_ALERT_TYPES.get(metric, "traffic_anomaly"),
+            "alert_priority": "high" if strong else "medium",
+            "timestamp": datetime.utcnow().isoformat(),
+            "company_id": anomaly["company_id"],
+            "source": source,
+            "metric": metric,
+            "value": anomaly["value"],
+            "expected": anomaly["expected"],
+            "z_score": anomaly["z_score"],
+            "direction": anomaly["direction"],
+            "observed_at": observed_at.isoformat(),
+            "recommended_actions": recommended_actions,
+            "expires_at": (datetime.utcnow() + timedelta(hours=24)).isoformat()
+        }
+    
     async def store_alert(self, alert_data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Store alert in the system and notify relevant agents
+        Store alert once in the alert store, tagged with the agents it concerns
         
         Args:
             alert_data: Alert data to store
@@ -476,55 +582,34 @@ class SmartAlertSystem:
         if "company_id" not in alert_data or "alert_type" not in alert_data:
             return {"status": "error", "message": "Missing required alert data"}
             
-        company_id = alert_data["company_id"]
         alert_type = alert_data["alert_type"]
         
-        # Map alert types to relevant agents
-        alert_agent_mapping = {
-            "traffic_opportunity": ["M5", "M1", "M3"],
-            "keyword_opportunity": ["M1", "M4", "M3"],
-            "social_engagement_opportunity": ["M2", "M4", "M3"],
-            "sentiment_shift": ["M2", "M4", "M3"],
-            "conversion_opportunity": ["M3", "M5", "M1"]
-        }
-        
         # Get relevant agents
-        relevant_agents = alert_agent_mapping.get(alert_type, ["M5"])
-        
-        # Store alert in memory system for relevant agents
-        results = {}
-        for agent_id in relevant_agents:
-            try:
-                # Store as memory
-                result = await self.memory_manager.store_memory(
-                    agent_id=agent_id,
-                    company_id=company_id,
-                    memory_data={
-                        "alert_data": alert_data,
-                        "alert_timestamp": datetime.utcnow().isoformat(),
-                        "alert_type": alert_type,
-                        "is_alert": True
-                    }
-                )
-                results[agent_id] = result
-                
-            except Exception as e:
-                logger.error(f"Error storing alert for agent {agent_id}: {e}")
-                results[agent_id] = {"status": "error", "message": str(e)}
-                
-        # Track in alert history
-        alert_id = f"{company_id}_{alert_type}_{datetime.utcnow().isoformat()}"
-        self.alert_history[alert_id] = {
-            "alert_data": alert_data,
-            "notified_agents": relevant_agents,
-            "created_at": datetime.utcnow().isoformat()
-        }
+        relevant_agents = self.ALERT_AGENTS.get(alert_type, ["M5"])
+        
+        try:
+            admitted, decision, record = await asyncio.to_thread(self._admit, alert_data)
+            if not admitted:
+                return {
+                    "status": "suppressed",
+                    "message": "Same alert is still active",
+                    "alert_id": alert_data["alert_id"],
+                    "notified_agents": []
+                }
+            alert_id = await asyncio.to_thread(self.alert_store.add, alert_data, relevant_agents)
+            await asyncio.to_thread(self.fingerprints.record_many, [record])
+            # Drop whatever expired meanwhile (only pops due heap entries)
+            await asyncio.to_thread(self.alert_store.sweep)
+        except Exception as e:
+            logger.error(f"Error storing alert {alert_type}: {e}")
+            return {"status": "error", "message": str(e)}
         
         return {
             "status": "success",
             "message": f"Alert stored and shared with {len(relevant_agents)} agents",
             "alert_id": alert_id,
-            "results": results
+            "notified_agents": relevant_agents,
+            "decision": decision
         }
     
     async def get_active_alerts(self, company_id: str) -> List[Dict[str, Any]]:
@@ -535,57 +620,10 @@ class SmartAlertSystem:
             company_id: Company identifier
             
         Returns:
-            List of active alerts
+            List of active alerts, highest priority and newest first
         """
-        active_alerts = []
-        current_time = datetime.utcnow()
-        
-        # Check all agents for alerts
-        all_agents = ["M1", "M2", "M3", "M4", "M5"]
-        
-        for agent_id in all_agents:
-            try:
-                # Get memories that contain alerts
-                memories = await self.memory_manager.get_memories(
-                    agent_id=agent_id,
-                    company_id=company_id,
-                    limit=20  # Get a reasonable number of recent memories
-                )
-                
-                # Filter for alert data
-                for memory in memories:
-                    if "is_alert" in memory and memory["is_alert"]:
-                        alert_data = memory.get("alert_data", {})
-                        
-                        # Check if alert is still active
-                        if "expires_at" in alert_data:
-                            expires_at = datetime.fromisoformat(alert_data["expires_at"].replace("Z", "+00:00"))
-                            if expires_at > current_time:
-                                # Add agent_id to alert data
-                                alert_data["source_agent"] = agent_id
-                                active_alerts.append(alert_data)
-            
-            except Exception as e:
-                logger.error(f"Error getting alerts from agent {agent_id}: {e}")
-                
-        # Remove duplicates (same alert type and content)
-        unique_alerts = []
-        alert_keys = set()
-        
-        for alert in active_alerts:
-            key = f"{alert['alert_type']}_{alert.get('timestamp', '')}"
-            if key not in alert_keys:
-                alert_keys.add(key)
-                unique_alerts.append(alert)
-                
-        # Sort by priority and timestamp
-        priority_values = {"high": 3, "medium": 2, "low": 1}
-        unique_alerts.sort(
-            key=lambda x: (
-                priority_values.get(x.get("alert_priority", "low"), 0),
-                x.get("timestamp", "")
-            ),
-            reverse=True
-        )
-        
-        return unique_alerts
+        try:
+            return await asyncio.to_thread(self.alert_store.get_active, company_id)
+        except Exception as e:
+            logger.error(f"Error getting alerts for company {company_id}: {e}")
+            return []
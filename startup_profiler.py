@@ -0,0 +1,198 @@
+"""
+Startup Profiler for Morvo AI Marketing Platform
+Import-time profiling, deferred imports, lazy component materialization and a startup budget report
+"""
+
+from typing import Dict, List, Any, Callable, Optional
+import builtins
+import importlib
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_import_times: Dict[str, float] = {}
+_materialized: Dict[str, float] = {}
+
+# Per-module [cumulative, self] seconds while import profiling is on
+_module_times: Dict[str, List[float]] = {}
+_profile_stack = threading.local()
+_original_import = builtins.__import__
+
+def record_import(module: str, seconds: float) -> None:
+    """Record how long importing a module took"""
+    with _lock:
+        _import_times[module] = seconds
+
+def record_materialization(component: str, seconds: float) -> None:
+    """Record how long the first build of a lazy component took"""
+    with _lock:
+        _materialized[component] = seconds
+    logger.info(f"Materialized {component} in {seconds * 1000:.1f}ms")
+
+def _profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """builtins.__import__ replacement that times modules imported for the first time"""
+    if level:
+        package = (globals or {}).get("__package__") or ""
+        key = f"{package}.{name}" if name else package
+    else:
+        key = name
+    if key in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    stack = getattr(_profile_stack, "children", None)
+    if stack is None:
+        stack = _profile_stack.children = []
+    stack.append(0.0)
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - started
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        with _lock:
+            _module_times[key] = [elapsed, elapsed - children]
+
+def enable_import_profiling(force: bool = False) -> bool:
+    """
+    Time every module imported from now on, like python -X importtime
+
+    Only active when MORVO_IMPORT_PROFILE=true (or force=True), since it wraps every import.
+    Call it before the heavy imports of a server module.
+    """
+    if not force and os.getenv("MORVO_IMPORT_PROFILE", "false").lower() != "true":
+        return False
+    if builtins.__import__ is not _profiled_import:
+        builtins.__import__ = _profiled_import
+        logger.info("Import profiling enabled")
+    return True
+
+def import_profile(limit: int = 30) -> List[Dict[str, Any]]:
+    """Slowest modules by self time recorded by the import profiler"""
+    with _lock:
+        rows = sorted(_module_times.items(), key=lambda kv: -kv[1][1])[:limit]
+    return [
+        {"module": name, "self_ms": round(own * 1000, 2), "cumulative_ms": round(total * 1000, 2)}
+        for name, (total, own) in rows
+    ]
+
+def module_available(name: str) -> bool:
+    """Whether a top-level module can be imported, without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+class DeferredModule:
+    """
+    Stand-in for a heavy module that is imported on first attribute access
+    Use it for modules only some requests need (crewai, crewai_tools, aiohttp, ...)
+    """
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with self.__dict__["_lock"]:
+                module = self.__dict__["_module"]
+                if module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    self.__dict__["_module"] = module
+                    record_materialization(f"import {self._name}", time.perf_counter() - started)
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "deferred"
+        return f"<DeferredModule {self._name} ({state})>"
+
+def deferred_import(name: str) -> DeferredModule:
+    """Return a module proxy that imports `name` the first time it is used"""
+    return DeferredModule(name)
+
+class lazy_component:
+    """
+    Build an expensive attribute (agent, tool) on first access and cache it on the instance
+    Like functools.cached_property, but thread-safe and timed for the budget report
+    """
+
+    def __init__(self, builder: Callable[[Any], Any]):
+        self.builder = builder
+        self.name = builder.__name__
+        self.label = builder.__qualname__
+        self.__doc__ = builder.__doc__
+        self._lock = threading.RLock()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.label = f"{owner.__name__}.{name}"
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        cache = instance.__dict__
+        if self.name not in cache:
+            with self._lock:
+                if self.name not in cache:
+                    started = time.perf_counter()
+                    cache[self.name] = self.builder(instance)
+                    record_materialization(self.label, time.perf_counter() - started)
+        return cache[self.name]
+
+def is_materialized(instance: Any, name: str) -> bool:
+    """Whether a lazy component was already built on an instance"""
+    return name in instance.__dict__
+
+def budget_report(budget_seconds: Optional[float] = None, verbose: bool = False) -> Dict[str, Any]:
+    """
+    Summarize import and lazy-build times against the startup budget
+
+    Args:
+        budget_seconds: Allowed import time, defaults to STARTUP_BUDGET_SECONDS
+        verbose: Include the per-module import profile (when profiling is enabled)
+
+    Returns:
+        Dictionary with per-module import times, materialized components and budget status
+    """
+    budget = budget_seconds or float(os.getenv("STARTUP_BUDGET_SECONDS", "3.0"))
+    with _lock:
+        imports = dict(_import_times)
+        materialized = dict(_materialized)
+    total_import = sum(imports.values())
+    report = {
+        "budget_seconds": budget,
+        "import_seconds": round(total_import, 3),
+        "within_budget": total_import <= budget,
+        "imports": {name: round(seconds, 3) for name, seconds in sorted(imports.items(), key=lambda kv: -kv[1])},
+        "materialized": {name: round(seconds, 3) for name, seconds in materialized.items()}
+    }
+    if verbose:
+        report["import_profiling"] = builtins.__import__ is _profiled_import
+        report["import_profile"] = import_profile()
+    return report
+
+def log_budget_report() -> Dict[str, Any]:
+    """Log the startup budget report and return it"""
+    report = budget_report()
+    message = (f"Startup imports took {report['import_seconds']}s "
+               f"(budget {report['budget_seconds']}s): {report['imports']}")
+    if report["within_budget"]:
+        logger.info(message)
+    else:
+        logger.warning(message)
+    return report
@@ -0,0 +1,170 @@
+"""
+Task Graph Executor for Morvo AI Marketing Platform
+Runs independent agent tasks concurrently and joins results for the tasks that depend on them
+"""
+
+from typing import Dict, List, Any, Callable, Optional
+import asyncio
+import logging
+import os
+import time
+
+from crew_executor import get_crew_executor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Node states
+NODE_COMPLETED = "completed"
+NODE_FAILED = "failed"
+NODE_SKIPPED = "skipped"
+
+class TaskGraphError(Exception):
+    """Raised when one or more nodes of a task graph failed"""
+
+    def __init__(self, message: str, results: Dict[str, Dict[str, Any]]):
+        super().__init__(message)
+        self.results = results
+
+class TaskGraph:
+    """
+    Dependency graph of blocking tasks (usually single-task crew kickoffs)
+    A node starts as soon as all of its dependencies completed, up to a concurrency limit
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        """
+        Initialize an empty graph
+
+        Args:
+            max_concurrency: How many nodes may run at the same time
+        """
+        self.max_concurrency = max_concurrency or int(os.getenv("CREW_GRAPH_CONCURRENCY", "3"))
+        self._nodes: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._dependencies: Dict[str, List[str]] = {}
+
+    def add(self, name: str, run: Callable[[Dict[str, Any]], Any], depends_on: Optional[List[str]] = None) -> None:
+        """
+        Add a node to the graph
+
+        Args:
+            name: Unique node name
+            run: Blocking callable receiving the results of its dependencies by name
+            depends_on: Names of nodes that must complete first
+        """
+        if name in self._nodes:
+            raise ValueError(f"Duplicate task graph node: {name}")
+        self._nodes[name] = run
+        self._dependencies[name] = list(depends_on or [])
+
+    def order(self) -> List[str]:
+        """Return the nodes in a valid execution order, rejecting unknown dependencies and cycles"""
+        for name, dependencies in self._dependencies.items():
+            for dependency in dependencies:
+                if dependency not in self._nodes:
+                    raise ValueError(f"Node {name} depends on unknown node {dependency}")
+
+        ordered: List[str] = []
+        visiting: set = set()
+        done: set = set()
+
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Task graph has a cycle through {name}")
+            visiting.add(name)
+            for dependency in self._dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            ordered.append(name)
+
+        for name in self._nodes:
+            visit(name)
+        return ordered
+
+    def critical_path(self, durations: Dict[str, float]) -> float:
+        """Return the longest chain of dependent node durations"""
+        finish: Dict[str, float] = {}
+        for name in self.order():
+            start = max((finish[d] for d in self._dependencies[name]), default=0.0)
+            finish[name] = start + durations.get(name, 0.0)
+        return max(finish.values(), default=0.0)
+
+    async def execute(self, runner: Optional[Callable] = None, raise_on_failure: bool = True) -> Dict[str, Any]:
+        """
+        Run the graph
+
+        Args:
+            runner: Async callable used to run blocking nodes, defaults to the shared crew executor
+            raise_on_failure: Raise TaskGraphError if any node failed or was skipped
+
+        Returns:
+            Dictionary with per-node results, wall time and critical path time
+        """
+        runner = runner or get_crew_executor().run
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results: Dict[str, Dict[str, Any]] = {}
+        pending: Dict[str, asyncio.Task] = {}
+
+        async def run_node(name: str) -> None:
+            dependencies = self._dependencies[name]
+            if dependencies:
+                await asyncio.gather(*(pending[d] for d in dependencies))
+
+            blocked = [d for d in dependencies if results[d]["status"] != NODE_COMPLETED]
+            if blocked:
+                results[name] = {
+                    "status": NODE_SKIPPED,
+                    "error": f"Dependencies did not complete: {', '.join(blocked)}",
+                    "duration": 0.0
+                }
+                return
+
+            upstream = {d: results[d]["result"] for d in dependencies}
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    result = await runner(self._nodes[name], upstream)
+                    results[name] = {
+                        "status": NODE_COMPLETED,
+                        "result": result,
+                        "duration": time.monotonic() - started
+                    }
+                except Exception as e:
+                    logger.error(f"Task graph node {name} failed: {e}")
+                    results[name] = {
+                        "status": NODE_FAILED,
+                        "error": str(e),
+                        "duration": time.monotonic() - started
+                    }
+
+        started = time.monotonic()
+        # Dependencies are scheduled before their dependents so every awaited task exists
+        for name in self.order():
+            pending[name] = asyncio.create_task(run_node(name))
+        await asyncio.gather(*pending.values())
+        wall_seconds = time.monotonic() - started
+
+        durations = {name: result["duration"] for name, result in results.items()}
+        summary = {
+            "results": results,
+            "wall_seconds": round(wall_seconds, 3),
+            "critical_path_seconds": round(self.critical_path(durations), 3)
+        }
+        logger.info(
+            f"Task graph finished {len(results)} nodes in {summary['wall_seconds']}s "
+            f"(critical path {summary['critical_path_seconds']}s)"
+        )
+
+        if raise_on_failure:
+            unfinished = [name for name, result in results.items() if result["status"] != NODE_COMPLETED]
+            if unfinished:
+                raise TaskGraphError(f"Task graph nodes did not complete: {', '.join(unfinished)}", results)
+
+        return summary
+
+    def run_sync(self, raise_on_failure: bool = True) -> Dict[str, Any]:
+        """Run the graph from synchronous code that has no event loop of its own"""
+        return asyncio.run(self.execute(raise_on_failure=raise_on_failure))
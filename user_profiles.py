@@ -0,0 +1,319 @@
+"""
+User Profiles for Morvo AI Marketing Platform
+Bounded LRU of user profiles over a SQLite or Postgres field table, written behind in batches
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# (user_id, field, JSON value, updated_at)
+FieldRow = Tuple[str, str, str, float]
+
+class SQLiteProfileBackend:
+    """Profile fields in a local SQLite table (one row per user and field)"""
+
+    backend = "sqlite"
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("USER_PROFILE_DB", "user_profiles.db")
+        self._local = threading.local()
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS user_profile_fields (
+                user_id TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (user_id, field)
+            ) WITHOUT ROWID
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get a connection for the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, user_id: str) -> List[Tuple[str, str]]:
+        return self._connect().execute(
+            "SELECT field, value FROM user_profile_fields WHERE user_id = ?", (user_id,)
+        ).fetchall()
+
+    def _write(self, rows: List[FieldRow]):
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO user_profile_fields (user_id, field, value, updated_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def start(self) -> None:
+        pass
+
+    async def load(self, user_id: str) -> List[Tuple[str, str]]:
+        """(field, JSON value) pairs of a user"""
+        return await asyncio.to_thread(self._load, user_id)
+
+    async def write(self, rows: List[FieldRow]) -> None:
+        """Upsert field rows in one transaction"""
+        await asyncio.to_thread(self._write, rows)
+
+    async def close(self) -> None:
+        pass
+
+class PostgresProfileBackend:
+    """Profile fields in a Postgres table shared by all workers (needs asyncpg and DATABASE_URL)"""
+
+    backend = "postgres"
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.dsn = dsn or os.getenv("DATABASE_URL")
+        self._pool = None
+
+    async def start(self) -> None:
+        if self._pool is not None:
+            return
+        if not self.dsn:
+            raise ValueError("PostgresProfileBackend needs DATABASE_URL")
+        import asyncpg
+
+        self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+        await self._pool.execute("""
+            CREATE TABLE IF NOT EXISTS user_profile_fields (
+                user_id TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value JSONB NOT NULL,
+                updated_at DOUBLE PRECISION NOT NULL,
+                PRIMARY KEY (user_id, field)
+            )
+        """)
+
+    async def load(self, user_id: str) -> List[Tuple[str, str]]:
+        await self.start()
+        rows = await self._pool.fetch(
+            "SELECT field, value::text AS value FROM user_profile_fields WHERE user_id = $1", user_id
+        )
+        return [(row["field"], row["value"]) for row in rows]
+
+    async def write(self, rows: List[FieldRow]) -> None:
+        await self.start()
+        # A field written by another worker in the meantime is only overwritten by a newer value
+        await self._pool.executemany("""
+            INSERT INTO user_profile_fields (user_id, field, value, updated_at) VALUES ($1, $2, $3::jsonb, $4)
+            ON CONFLICT (user_id, field) DO UPDATE SET value = EXCLUDED.value, updated_at = EXCLUDED.updated_at
+            WHERE user_profile_fields.updated_at <= EXCLUDED.updated_at
+        """, rows)
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+PROFILE_BACKENDS = {
+    "sqlite": SQLiteProfileBackend,
+    "postgres": PostgresProfileBackend
+}
+
+class UserProfileStore:
+    """
+    User profiles (company name, industry, ...) kept per field
+    Reads are served from a bounded LRU of decoded profiles; writes update it at once and
+    reach the backend in batches from a background flusher. Entries older than the TTL are
+    re-read so a profile changed by another worker is picked up.
+    """
+
+    def __init__(self,
+                 backend: Optional[Any] = None,
+                 cache_size: Optional[int] = None,
+                 cache_ttl_seconds: Optional[float] = None,
+                 flush_interval: Optional[float] = None,
+                 max_pending: Optional[int] = None):
+        """
+        Initialize the store
+
+        Args:
+            backend: Backing tier; chosen by USER_PROFILE_BACKEND (sqlite or postgres) when None
+            cache_size: Profiles kept in memory
+            cache_ttl_seconds: Age after which a cached profile is re-read from the backend
+            flush_interval: Seconds between write-behind flushes
+            max_pending: Users with unflushed changes after which a write waits for a flush
+        """
+        if backend is None:
+            name = os.getenv("USER_PROFILE_BACKEND", "sqlite")
+            if name not in PROFILE_BACKENDS:
+                raise ValueError(f"Unknown user profile backend: {name}")
+            backend = PROFILE_BACKENDS[name]()
+        self.backend = backend
+        self.cache_size = cache_size or int(os.getenv("USER_PROFILE_CACHE_SIZE", "10000"))
+        self.cache_ttl_seconds = cache_ttl_seconds or float(os.getenv("USER_PROFILE_CACHE_TTL_SECONDS", "300"))
+        self.flush_interval = flush_interval or float(os.getenv("USER_PROFILE_FLUSH_SECONDS", "1.0"))
+        self.max_pending = max_pending or int(os.getenv("USER_PROFILE_MAX_PENDING", "5000"))
+        # user_id -> (loaded_at, {field: value})
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # user_id -> {field: (JSON value, updated_at)} not yet written to the backend
+        self._pending: Dict[str, Dict[str, Tuple[str, float]]] = {}
+        # The batch a flush is writing, same shape; visible to loads until the write commits
+        self._flushing: Dict[str, Dict[str, Tuple[str, float]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "flushes": 0, "evictions": 0}
+
+    def _remember(self, user_id: str, profile: Dict[str, Any], loaded_at: float):
+        self._cache[user_id] = (loaded_at, profile)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    async def _profile(self, user_id: str) -> Dict[str, Any]:
+        """Decoded profile from the hot tier, loading it on a miss or once stale"""
+        now = time.monotonic()
+        entry = self._cache.get(user_id)
+        if entry is not None and now - entry[0] < self.cache_ttl_seconds:
+            self._cache.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return entry[1]
+
+        self.stats["misses"] += 1
+        profile = {field: json.loads(value) for field, value in await self.backend.load(user_id)}
+        # Writes of this worker not flushed (or still being flushed) win over what the backend has
+        for fields in (self._flushing.get(user_id, {}), self._pending.get(user_id, {})):
+            for field, (value, _) in fields.items():
+                profile[field] = json.loads(value)
+        self._remember(user_id, profile, now)
+        return profile
+
+    async def get(self, user_id: str, field: Optional[str] = None) -> Any:
+        """
+        Read a user's profile
+
+        Args:
+            user_id: User identifier
+            field: Single field to read; the whole profile when None
+
+        Returns:
+            The field value (None if unset), or a copy of the profile (None if the user has none)
+        """
+        profile = await self._profile(user_id)
+        if field is not None:
+            return profile.get(field)
+        return dict(profile) if profile else None
+
+    async def update(self, user_id: str, data: Dict[str, Any]) -> None:
+        """
+        Set fields of a user's profile
+
+        The hot tier is updated immediately; the backend write happens on the next flush.
+
+        Args:
+            user_id: User identifier
+            data: Field -> JSON-serializable value
+        """
+        if not data:
+            return
+        encoded = {field: json.dumps(value, ensure_ascii=False, default=str) for field, value in data.items()}
+        profile = await self._profile(user_id)
+        now = time.time()
+        pending = self._pending.setdefault(user_id, {})
+        for field, value in encoded.items():
+            profile[field] = json.loads(value)
+            pending[field] = (value, now)
+        self.stats["writes"] += 1
+
+        if len(self._pending) >= self.max_pending:
+            await self.flush()
+        else:
+            self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """Write pending fields every flush_interval until nothing is left"""
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error flushing profile changes of {len(self._pending)} users: {e}")
+
+    async def flush(self) -> int:
+        """
+        Write all pending fields to the backend in one batch
+
+        Returns:
+            Number of fields written
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+            rows = [(user_id, field, value, updated_at)
+                    for user_id, fields in batch.items()
+                    for field, (value, updated_at) in fields.items()]
+            try:
+                await self.backend.write(rows)
+            except Exception:
+                # Keep them for the next flush, unless overwritten meanwhile
+                for user_id, fields in batch.items():
+                    pending = self._pending.setdefault(user_id, {})
+                    for field, value in fields.items():
+                        pending.setdefault(field, value)
+                raise
+            finally:
+                self._flushing = {}
+            self.stats["flushes"] += 1
+            return len(rows)
+
+    async def close(self):
+        """Flush what is pending and release the backend"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+        await self.backend.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Profiles in memory, users with unflushed changes and counters"""
+        return {
+            "backend": self.backend.backend,
+            "cached": len(self._cache),
+            "pending": len(self._pending),
+            **self.stats
+        }
+
+_user_profiles: Optional[UserProfileStore] = None
+_user_profiles_lock = threading.Lock()
+
+def get_user_profiles() -> UserProfileStore:
+    """Get the process-wide user profile store, creating it on first use"""
+    global _user_profiles
+    if _user_profiles is None:
+        with _user_profiles_lock:
+            if _user_profiles is None:
+                _user_profiles = UserProfileStore()
+                logger.info(f"User profiles on {_user_profiles.backend.backend}")
+    return _user_profiles